@@ -0,0 +1,355 @@
+import argparse
+import os
+from parallel import EXECUTOR_KINDS
+
+# Environment variable naming the serve socket, so hooks need no --connect.
+SOCKET_ENV = "SAFE_TOOLKIT_SOCKET"
+# Subcommands a batch job or a serve request may run.
+JOB_COMMANDS = ("read", "grep", "checksum", "json-pretty", "replace", "index")
+
+
+class JobArgumentParser(argparse.ArgumentParser):
+    """Parser for argument lists that do not come from the command line.
+
+    Errors raise ValueError instead of printing usage and exiting, and help
+    is never printed.
+    """
+
+    def error(self, message: str):
+        raise ValueError(message)
+
+    def exit(self, status: int = 0, message: str | None = None):
+        raise ValueError(message or "--help is not available here")
+
+    def print_help(self, file=None) -> None:
+        pass
+
+    def print_usage(self, file=None) -> None:
+        pass
+
+
+def build_parser(
+    parser_class: type[argparse.ArgumentParser] = argparse.ArgumentParser,
+) -> argparse.ArgumentParser:
+    """Build the parser for every subcommand.
+
+    The subcommand parsers are also available as parser.subcommands.
+    """
+    parser = parser_class(
+        prog="safe-toolkit",
+        description="Safe file operations toolkit",
+    )
+
+    parser.add_argument(
+        "--timing",
+        action="store_true",
+        help="Show execution time with a per-phase breakdown and counters",
+    )
+    parser.add_argument(
+        "--timing-json", metavar="FILE", help="Write per-phase times and counters"
+    )
+    parser.add_argument(
+        "--trace",
+        metavar="FILE",
+        help="Write every phase as a Chrome trace (chrome://tracing, Perfetto)",
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="FILE",
+        help="Profile the main thread with cProfile and save the pstats to FILE",
+    )
+    parser.add_argument(
+        "--connect",
+        metavar="SOCKET",
+        default=os.environ.get(SOCKET_ENV),
+        help="Send the command to the serve daemon listening on SOCKET, or run it "
+        f"here if none is (default: ${SOCKET_ENV})",
+    )
+    parser.add_argument("--debug", action="store_true", help="Show tracebacks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    walk_options = argparse.ArgumentParser(add_help=False)
+    walk_options.add_argument(
+        "--exclude",
+        action="append",
+        default=[],
+        metavar="GLOB",
+        help="Skip paths matching a .gitignore-style glob (repeatable)",
+    )
+    walk_options.add_argument(
+        "--gitignore",
+        action="store_true",
+        help="Skip paths listed in .gitignore files and .git directories, "
+        "unless the glob names them literally",
+    )
+
+    read_parser = subparsers.add_parser("read", help="Read a text file safely")
+    read_parser.add_argument("file", help="File to read")
+    read_parser.add_argument(
+        "--offset",
+        type=int,
+        default=0,
+        metavar="BYTES",
+        help="Start reading at this byte offset",
+    )
+    read_parser.add_argument(
+        "--length",
+        type=int,
+        metavar="BYTES",
+        help="Read at most this many bytes",
+    )
+    read_lines = read_parser.add_mutually_exclusive_group()
+    read_lines.add_argument(
+        "--head", type=int, metavar="N", help="Print only the first N lines"
+    )
+    read_lines.add_argument(
+        "--tail",
+        type=int,
+        metavar="N",
+        help="Print only the last N lines (reads backwards from the end)",
+    )
+
+    grep_parser = subparsers.add_parser(
+        "grep",
+        parents=[walk_options],
+        help="Search for a pattern in text files safely",
+    )
+    grep_parser.add_argument("pattern", help="Pattern to search for")
+    grep_parser.add_argument(
+        "glob",
+        nargs="?",
+        help="File pattern (e.g., *.txt, **/*.py); the only argument with -f",
+    )
+    grep_parser.add_argument(
+        "-E",
+        "--regex",
+        action="store_true",
+        help="Treat patterns as regular expressions",
+    )
+    grep_parser.add_argument(
+        "-f",
+        "--file",
+        dest="patterns_file",
+        help="Read patterns from a file, one per line",
+    )
+    grep_parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of files to search in parallel (0 = one per CPU, default: 1)",
+    )
+    grep_parser.add_argument(
+        "--executor",
+        default="auto",
+        choices=EXECUTOR_KINDS,
+        help="Worker pool for --jobs (default: auto)",
+    )
+    grep_parser.add_argument(
+        "-n",
+        "--line-number",
+        action="store_true",
+        help="Prefix matches with line numbers",
+    )
+    grep_parser.add_argument(
+        "--split-size",
+        type=int,
+        default=32,
+        metavar="MB",
+        help="With --jobs, split files larger than this into ranges (default: 32)",
+    )
+    grep_parser.add_argument(
+        "--no-index",
+        action="store_true",
+        help="Ignore the trigram index and read every matched file",
+    )
+
+    checksum_parser = subparsers.add_parser(
+        "checksum", parents=[walk_options], help="Calculate file checksum"
+    )
+    checksum_parser.add_argument(
+        "file", help="File or glob to checksum (e.g., disk.img, **/*.tar)"
+    )
+    checksum_parser.add_argument(
+        "--algorithm",
+        action="append",
+        choices=["md5", "sha256", "sha512"],
+        help="Hash algorithm, repeat for several (default: sha256)",
+    )
+    checksum_parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        help="Number of files to hash in parallel (default: CPU count)",
+    )
+    checksum_parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Neither read nor update the workspace checksum cache",
+    )
+    checksum_parser.add_argument(
+        "--verify",
+        action="store_true",
+        help="Rehash every file and refresh the checksum cache",
+    )
+    checksum_parser.add_argument(
+        "--write-manifest",
+        metavar="MANIFEST",
+        help="Write digests for the matched files to a manifest",
+    )
+    checksum_parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Treat FILE as a manifest and verify the tree against it",
+    )
+    checksum_parser.add_argument(
+        "--mmap",
+        action="store_true",
+        help="Read the file through a memory map instead of a reusable buffer",
+    )
+
+    json_parser = subparsers.add_parser(
+        "json-pretty", help="Format JSON with proper indentation"
+    )
+    json_parser.add_argument("file", help="JSON file to format")
+    json_parser.add_argument(
+        "--lines",
+        action="store_true",
+        help="Treat the file as JSON Lines: format each line as its own record",
+    )
+    json_parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Worker processes for --lines (0 = one per CPU)",
+    )
+    json_parser.add_argument(
+        "--path",
+        metavar="EXPR",
+        help="Only print the nodes at EXPR, e.g. .company.departments[3]",
+    )
+
+    index_parser = subparsers.add_parser(
+        "index",
+        parents=[walk_options],
+        help="Build or update the trigram index used by grep",
+    )
+    index_parser.add_argument(
+        "glob", nargs="?", default="**/*", help="Files to index (default: **/*)"
+    )
+
+    replace_parser = subparsers.add_parser(
+        "replace", parents=[walk_options], help="Search and replace text in files"
+    )
+    replace_parser.add_argument("search", nargs="?", help="Text to search for")
+    replace_parser.add_argument("replace", nargs="?", help="Text to replace with")
+    replace_parser.add_argument("glob", nargs="?", help="File pattern (e.g., *.txt)")
+    replace_parser.add_argument(
+        "--apply",
+        action="store_true",
+        help="Apply changes (default is dry-run preview)",
+    )
+    replace_parser.add_argument(
+        "--transaction",
+        action="store_true",
+        help="With --apply, stage every file first and commit all or nothing",
+    )
+    replace_parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Files to stage in parallel with --transaction (0 = one per CPU)",
+    )
+    replace_parser.add_argument(
+        "-E",
+        "--regex",
+        action="store_true",
+        help="Treat SEARCH as a regular expression; REPLACE may use \\1 or \\g<name>",
+    )
+    replace_parser.add_argument(
+        "-w", "--word", action="store_true", help="Only replace whole words"
+    )
+    replace_parser.add_argument(
+        "-i", "--ignore-case", action="store_true", help="Match case-insensitively"
+    )
+    replace_parser.add_argument(
+        "--rules",
+        dest="rules_file",
+        metavar="FILE",
+        help="Apply every SEARCH<TAB>REPLACE line of FILE in one pass (then only GLOB)",
+    )
+    replace_parser.add_argument(
+        "--rollback",
+        action="store_true",
+        help="Restore the files changed by the last --transaction run",
+    )
+
+    batch_parser = subparsers.add_parser(
+        "batch",
+        parents=[walk_options],
+        help="Run JSONL jobs in one process and write JSONL results",
+    )
+    batch_parser.add_argument(
+        "file",
+        nargs="?",
+        default="-",
+        help='Job file, one {"command": ..., "args": [...]} per line (default: stdin)',
+    )
+    batch_parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=0,
+        help="Jobs to run concurrently (default: 0 = one per CPU)",
+    )
+
+    serve_parser = subparsers.add_parser(
+        "serve",
+        parents=[walk_options],
+        help="Keep caches warm and answer --connect clients over a Unix socket",
+    )
+    serve_parser.add_argument(
+        "--socket",
+        metavar="PATH",
+        help="Socket to listen on (default: .safe-toolkit/serve.sock)",
+    )
+    serve_parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=0,
+        help="Requests to run concurrently (default: 0 = one per CPU)",
+    )
+
+    parser.subcommands = subparsers.choices
+    return parser
+
+
+def parse_args(
+    parser: argparse.ArgumentParser, argv: list[str] | None = None
+) -> argparse.Namespace:
+    """Parse argv and check the combinations argparse cannot express."""
+    args = parser.parse_args(argv)
+    subcommand = parser.subcommands.get(args.command)
+    if args.command == "read":
+        limits = (args.offset, args.length, args.head, args.tail)
+        if any(value is not None and value < 0 for value in limits):
+            subcommand.error("byte counts and line counts must not be negative")
+        lines = args.head is not None or args.tail is not None
+        if lines and (args.offset or args.length is not None):
+            subcommand.error("--head/--tail cannot be used with --offset/--length")
+    if args.command == "grep":
+        if args.patterns_file and args.glob is None:
+            args.pattern, args.glob = None, args.pattern
+        elif args.patterns_file or args.glob is None:
+            subcommand.error("use either PATTERN GLOB or -f FILE GLOB")
+    if args.command == "json-pretty" and args.lines and args.path is not None:
+        subcommand.error("--path cannot be combined with --lines")
+    if args.command == "replace" and not args.rollback:
+        if args.rules_file and args.replace is None:
+            args.search, args.glob = None, args.search
+        if args.glob is None or (args.rules_file and args.search is not None):
+            subcommand.error("use either SEARCH REPLACE GLOB or --rules FILE GLOB")
+    return args
@@ -1,232 +1,690 @@
-import time
+import argparse
+import fnmatch
 import json
+import math
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
 import tempfile
+import time
+from collections import deque
 from pathlib import Path
-import sys
+from typing import Callable, Iterable, NamedTuple
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
 
-sys.path.insert(0, str(Path(__file__).parent / "src"))
+sys.path.insert(0, str(Path(__file__).parent))
 
 from filesystem import SafeFileSystem
-from commands.read import read_command
-from commands.grep import grep_command
-from commands.checksum import checksum_command
-from commands.json_pretty import json_pretty_command
-from commands.replace import replace_command
+from commands.read import iter_read
+from commands.grep import iter_grep
+from commands.checksum import iter_checksum
+from commands.json_pretty import iter_json_lines, iter_json_path, iter_json_pretty
+from commands.replace import iter_replace
+
+RESULTS_VERSION = 1
+
+# Fixture sizes per tier. Every case runs in every tier; only the data grows.
+TIERS = {
+    "smoke": {"file_mb": 1, "tree_files": 100, "line_mb": 1, "json_depth": 100},
+    "standard": {
+        "file_mb": 100,
+        "tree_files": 10_000,
+        "line_mb": 16,
+        "json_depth": 1_000,
+    },
+    "scale": {
+        "file_mb": 1024,
+        "tree_files": 100_000,
+        "line_mb": 256,
+        "json_depth": 5_000,
+    },
+}
+DEFAULT_ITERATIONS = {"smoke": 10, "standard": 5, "scale": 3}
+# Median time a one-shot CLI run may spend importing modules (interpreter
+# startup included), as reported by python -X importtime.
+IMPORT_BUDGET_MS = 100.0
+CLI_PATH = Path(__file__).parent / "cli.py"
+# Runs cli.py as __main__ with the given argv, then writes its own
+# /proc/self/status to the given fd so the parent can read VmHWM.
+CLI_RUNNER = """
+import os, sys
+fd = int(sys.argv.pop(2))
+sys.argv[0] = cli = sys.argv.pop(1)
+sys.path[0] = os.path.dirname(cli)
+try:
+    with open(cli, "rb") as f:
+        code = compile(f.read(), cli, "exec")
+    exec(code, {"__name__": "__main__", "__file__": cli})
+finally:
+    try:
+        with open("/proc/self/status", "rb") as f:
+            os.write(fd, f.read())
+    except OSError:
+        pass
+"""
+
+LOG_LINE = b"2024-01-01T00:00:00Z INFO request handled path=/api/v1/items status=200\n"
+LOG_ERROR = b"2024-01-01T00:00:00Z ERROR upstream timeout path=/api/v1/items\n"
+FILES_PER_DIR = 1000
+# Patterns for grep-50-literals: one found in the log, 49 that never are.
+MANY_LITERALS = ["ERROR"] + [f"missing-{i}" for i in range(49)]
+FIXTURES = ["app.log", "scratch.log", "long-line.txt", "tree", "data.json"]
+FIXTURES += ["data.ndjson", "deep.json", "small.json", ".safe-toolkit"]
+
+
+class Case(NamedTuple):
+    name: str
+    description: str
+    run: Callable[[SafeFileSystem], object]
+    # Untimed work before each iteration, e.g. restoring files a run modified.
+    reset: Callable[[Path], None] | None = None
+
+
+def drain(output: Iterable) -> None:
+    """Consume a command's output without keeping it."""
+    deque(output, maxlen=0)
+
+
+def restore_log(workdir: Path) -> None:
+    shutil.copyfile(workdir / "app.log", workdir / "scratch.log")
+
+
+CASES = [
+    Case("read", "Whole log file", lambda fs: drain(iter_read(fs, "app.log"))),
+    Case(
+        "read-tail",
+        "Last 10 lines of the log",
+        lambda fs: drain(iter_read(fs, "app.log", tail=10)),
+    ),
+    Case(
+        "read-long-line",
+        "One line without newlines",
+        lambda fs: drain(iter_read(fs, "long-line.txt")),
+    ),
+    Case(
+        "grep-literal",
+        "Literal search of the log",
+        lambda fs: drain(iter_grep(fs, "ERROR", "app.log", use_index=False)),
+    ),
+    Case(
+        "grep-50-literals",
+        "50 literals at once, to compare with grep-literal",
+        lambda fs: drain(iter_grep(fs, MANY_LITERALS, "app.log", use_index=False)),
+    ),
+    Case(
+        "grep-regex",
+        "Regex search of the log",
+        lambda fs: drain(
+            iter_grep(fs, r"status=5\d\d", "app.log", regex=True, use_index=False)
+        ),
+    ),
+    Case(
+        "grep-tree",
+        "Literal search of the file tree",
+        lambda fs: drain(iter_grep(fs, "TODO", "tree/**/*.txt", use_index=False)),
+    ),
+    Case(
+        "grep-long-line",
+        "Missing pattern in one long line",
+        lambda fs: drain(iter_grep(fs, "NEEDLE", "long-line.txt", use_index=False)),
+    ),
+    Case(
+        "checksum",
+        "SHA-256 of the log",
+        lambda fs: drain(iter_checksum(fs, "app.log", "sha256")),
+    ),
+    Case(
+        "checksum-tree",
+        "SHA-256 of every file in the tree",
+        lambda fs: drain(iter_checksum(fs, "tree/**/*.txt", "sha256")),
+    ),
+    Case(
+        "json-pretty",
+        "Re-indent a large document",
+        lambda fs: drain(iter_json_pretty(fs, "data.json")),
+    ),
+    Case(
+        "json-path",
+        "Select one field from a large document",
+        lambda fs: drain(iter_json_path(fs, "data.json", ".items[0].name")),
+    ),
+    Case(
+        "json-lines",
+        "Format JSON Lines records",
+        lambda fs: drain(iter_json_lines(fs, "data.ndjson")),
+    ),
+    Case(
+        "json-deep",
+        "Re-indent deeply nested arrays",
+        lambda fs: drain(iter_json_pretty(fs, "deep.json")),
+    ),
+    Case(
+        "replace-preview",
+        "Dry-run diff over the file tree",
+        lambda fs: drain(iter_replace(fs, "TODO", "DONE", "tree/**/*.txt")),
+    ),
+    Case(
+        "replace-apply",
+        "Rewrite the log in place",
+        lambda fs: drain(
+            iter_replace(fs, "ERROR", "FAULT", "scratch.log", dry_run=False)
+        ),
+        reset=restore_log,
+    ),
+]
+
+# Whole CLI processes on a tiny file: what a script calling the CLI pays.
+STARTUP_CASES = [
+    ("startup-help", "cli.py --help", ["--help"]),
+    ("startup-read", "cli.py read", ["read", "small.json"]),
+    ("startup-grep", "cli.py grep", ["grep", "NEEDLE", "small.json", "--no-index"]),
+    ("startup-checksum", "cli.py checksum", ["checksum", "small.json", "--no-cache"]),
+    ("startup-json-pretty", "cli.py json-pretty", ["json-pretty", "small.json"]),
+    ("startup-replace", "cli.py replace", ["replace", "NEEDLE", "x", "small.json"]),
+    (
+        "startup-grep-tree",
+        "cli.py grep over the tree",
+        ["grep", "TODO", "tree/**/*.txt", "--no-index"],
+    ),
+]
+# The same runs answered by a warm serve daemon started for the benchmark.
+SERVE_SOCKET = ".safe-toolkit/serve.sock"
+CONNECT_CASES = [
+    (
+        name.replace("startup-", "connect-"),
+        description.replace("cli.py", "cli.py --connect"),
+        ["--connect", SERVE_SOCKET, *argv],
+    )
+    for name, description, argv in STARTUP_CASES
+    if name != "startup-help"
+]
+
+
+def write_fixtures(workdir: Path, sizes: dict) -> None:
+    """Create the benchmark data once; a matching marker file means it exists."""
+    marker = workdir / "fixtures.json"
+    if marker.exists() and json.loads(marker.read_text()) == sizes:
+        return
+    for name in FIXTURES:
+        entry = workdir / name
+        if entry.is_dir():
+            shutil.rmtree(entry)
+        elif entry.exists():
+            entry.unlink()
+
+    target = sizes["file_mb"] * 1024 * 1024
+    block = LOG_LINE * 999 + LOG_ERROR
+    with open(workdir / "app.log", "wb") as f:
+        for _ in range(max(1, target // len(block))):
+            f.write(block)
+    restore_log(workdir)
+
+    with open(workdir / "long-line.txt", "wb") as f:
+        chunk = b"x" * (1024 * 1024)
+        for _ in range(sizes["line_mb"]):
+            f.write(chunk)
+
+    write_tree(workdir / "tree", sizes["tree_files"])
+    write_json(workdir, target)
+    depth = sizes["json_depth"]
+    (workdir / "deep.json").write_text("[" * depth + "1" + "]" * depth)
+    (workdir / "small.json").write_text('{"name": "small", "values": [1, 2, 3]}\n')
+    marker.write_text(json.dumps(sizes))
+
+
+def write_tree(root: Path, count: int) -> None:
+    """Write count small text files, FILES_PER_DIR to a directory."""
+    for i in range(count):
+        directory = root / f"d{i // FILES_PER_DIR:04d}"
+        if not i % FILES_PER_DIR:
+            directory.mkdir(parents=True)
+        body = f"module {i}\nvalue = {i * 7}\n"
+        if not i % 50:
+            body += "# TODO: remove\n"
+        (directory / f"f{i % FILES_PER_DIR:04d}.txt").write_text(body)
+
+
+def write_json(workdir: Path, target: int) -> None:
+    """Write a large JSON document and JSON Lines file of the same records."""
+    record = {
+        "id": 0,
+        "name": "Employee",
+        "skills": ["python", "sql"],
+        "active": True,
+        "score": 0.5,
+    }
+    with open(workdir / "data.json", "w") as doc, open(
+        workdir / "data.ndjson", "w"
+    ) as lines:
+        doc.write('{"items": [')
+        written = i = 0
+        while written < target:
+            record["id"] = i
+            line = json.dumps(record)
+            doc.write(("," if i else "") + line)
+            lines.write(line + "\n")
+            written += len(line) + 1
+            i += 1
+        doc.write("]}")
+
+
+def peak_rss_mb() -> float | None:
+    """Peak resident set size of this process so far.
+
+    On Linux this is VmHWM, the high-water mark of this process's own
+    memory since it was exec'd. ru_maxrss is not used there: it keeps the
+    peak of the process that forked it, so every case would report at
+    least the benchmark parent's size. Elsewhere ru_maxrss is the best
+    available and may overstate the peak the same way.
+    """
+    try:
+        with open("/proc/self/status", "rb") as f:
+            return vm_hwm_mb(f.read())
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(peak / scale, 1)
+
+
+def vm_hwm_mb(status: bytes) -> float | None:
+    """Peak RSS from the text of a /proc/PID/status file."""
+    for line in status.splitlines():
+        if line.startswith(b"VmHWM:"):
+            return round(int(line.split()[1]) / 1024, 1)
+    return None
+
 
+def run_case(case: Case, workdir: Path, warmup: int, iterations: int) -> dict:
+    """Time one case in this process; setup and reset are not timed.
 
-def benchmark(func, *args, iterations=10, **kwargs):
-    """Run function multiple times and return average time in ms."""
+    A failing iteration stops the case and is reported, never dropped.
+    """
+    fs = SafeFileSystem(workdir)
     times = []
-    for _ in range(iterations):
+    result = {"status": "ok", "error": None}
+    for i in range(warmup + iterations):
+        if case.reset is not None:
+            case.reset(workdir)
         start = time.perf_counter()
         try:
-            func(*args, **kwargs)  # ← Add **kwargs here
+            case.run(fs)
         except Exception as e:
-            print(f"Warning: {e}")
-            continue
-        end = time.perf_counter()
-        times.append((end - start) * 1000)
-    
+            result["status"] = "error"
+            result["error"] = f"{type(e).__name__}: {e}"
+            break
+        elapsed = (time.perf_counter() - start) * 1000
+        if i >= warmup:
+            times.append(elapsed)
+    result["times_ms"] = [round(t, 3) for t in times]
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+
+def summarize(times: list[float]) -> dict:
+    """Median, p95 (nearest rank), mean, stddev, min and max of the samples."""
     if not times:
-        return 0.0
-    return sum(times) / len(times)
-
-
-def benchmark_read(tmp_path, fs):
-    """Benchmark read command with different file sizes."""
-    print("\n📖 READ BENCHMARKS")
-    print("-" * 60)
-    
-    # Small file (1KB)
-    small = tmp_path / "small.txt"
-    small.write_text("x" * 1024)
-    time_1kb = benchmark(read_command, fs, "small.txt")
-    print(f"  1KB file:    {time_1kb:>8.2f}ms")
-    
-    # Medium file (100KB)
-    medium = tmp_path / "medium.txt"
-    medium.write_text("x" * (100 * 1024))
-    time_100kb = benchmark(read_command, fs, "medium.txt", iterations=5)
-    print(f"  100KB file:  {time_100kb:>8.2f}ms")
-    
-    # Large file (1MB)
-    large = tmp_path / "large.txt"
-    large.write_text("x" * (1024 * 1024))
-    time_1mb = benchmark(read_command, fs, "large.txt", iterations=5)
-    print(f"  1MB file:    {time_1mb:>8.2f}ms")
-    
-    return [
-        ("read", "1KB file", time_1kb, "Text file"),
-        ("read", "100KB file", time_100kb, "Text file"),
-        ("read", "1MB file", time_1mb, "Text file"),
-    ]
+        return {}
+    ordered = sorted(times)
+    p95 = ordered[math.ceil(0.95 * len(ordered)) - 1]
+    return {
+        "median_ms": round(statistics.median(ordered), 3),
+        "p95_ms": round(p95, 3),
+        "mean_ms": round(statistics.fmean(ordered), 3),
+        "stddev_ms": round(statistics.stdev(ordered), 3) if len(ordered) > 1 else 0.0,
+        "min_ms": round(ordered[0], 3),
+        "max_ms": round(ordered[-1], 3),
+    }
 
 
-def benchmark_grep(tmp_path, fs):
-    """Benchmark grep with different numbers of files."""
-    print("\n🔍 GREP BENCHMARKS")
-    print("-" * 60)
-    
-    # Create files with pattern
-    for i in range(100):
-        content = f"Line 1\nLine 2\n"
-        if i % 5 == 0:  # 20% of files have the pattern
-            content += "TODO: Fix this\n"
-        content += f"Line 4\nLine 5\n"
-        (tmp_path / f"file{i}.txt").write_text(content)
-    
-    # Search in 10 files
-    time_10 = benchmark(grep_command, fs, "TODO", "file[0-9].txt")
-    print(f"  10 files:    {time_10:>8.2f}ms  (pattern in 2 files)")
-    
-    # Search in 100 files
-    time_100 = benchmark(grep_command, fs, "TODO", "*.txt", iterations=5)
-    print(f"  100 files:   {time_100:>8.2f}ms  (pattern in 20 files)")
-    
-    return [
-        ("grep", "10 files", time_10, "Pattern in 2 files"),
-        ("grep", "100 files", time_100, "Pattern in 20 files"),
+def measure(
+    case: Case, workdir: Path, warmup: int, iterations: int, timeout: float | None
+) -> dict:
+    """Run a case in a fresh interpreter so its peak RSS is its own."""
+    command = [
+        sys.executable,
+        __file__,
+        "--run-case",
+        case.name,
+        "--workdir",
+        str(workdir),
+        "--warmup",
+        str(warmup),
+        "--iterations",
+        str(iterations),
     ]
+    result = {"name": case.name, "description": case.description}
+    try:
+        child = subprocess.run(command, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        result.update(status="error", error=f"timed out after {timeout}s")
+        return result
 
+    lines = child.stdout.strip().splitlines()
+    if child.returncode or not lines:
+        stderr = child.stderr.strip().splitlines()
+        detail = stderr[-1] if stderr else f"exit status {child.returncode}"
+        result.update(status="error", error=f"benchmark process failed: {detail}")
+        return result
 
-def benchmark_checksum(tmp_path, fs):
-    """Benchmark checksum with different algorithms."""
-    print("\n🔐 CHECKSUM BENCHMARKS")
-    print("-" * 60)
-    
-    # Create 1MB file
-    test_file = tmp_path / "checksum_test.bin"
-    test_file.write_bytes(b"x" * (1024 * 1024))
-    
-    time_md5 = benchmark(checksum_command, fs, "checksum_test.bin", "md5", iterations=5)
-    print(f"  MD5 (1MB):    {time_md5:>8.2f}ms")
-    
-    time_sha256 = benchmark(checksum_command, fs, "checksum_test.bin", "sha256", iterations=5)
-    print(f"  SHA256 (1MB): {time_sha256:>8.2f}ms")
-    
-    time_sha512 = benchmark(checksum_command, fs, "checksum_test.bin", "sha512", iterations=5)
-    print(f"  SHA512 (1MB): {time_sha512:>8.2f}ms")
-    
-    return [
-        ("checksum", "1MB file (MD5)", time_md5, "Fast, less secure"),
-        ("checksum", "1MB file (SHA256)", time_sha256, "Recommended"),
-        ("checksum", "1MB file (SHA512)", time_sha512, "Most secure"),
-    ]
+    result.update(json.loads(lines[-1]))
+    result.update(summarize(result["times_ms"]))
+    return result
 
 
-def benchmark_json_pretty(tmp_path, fs):
-    """Benchmark JSON formatting with different sizes."""
-    print("\n📄 JSON-PRETTY BENCHMARKS")
-    print("-" * 60)
-    
-    # Small JSON (1KB)
-    small_json = {"users": [{"name": f"User{i}", "age": 20+i} for i in range(10)]}
-    small_file = tmp_path / "small.json"
-    small_file.write_text(json.dumps(small_json))
-    time_small = benchmark(json_pretty_command, fs, "small.json")
-    print(f"  Small (1KB):  {time_small:>8.2f}ms  (10 objects)")
-    
-    # Large nested JSON (50KB)
-    large_json = {
-        "company": {
-            "departments": [
-                {
-                    "name": f"Dept{i}",
-                    "employees": [
-                        {"id": j, "name": f"Employee{j}", "skills": ["skill1", "skill2"]}
-                        for j in range(20)
-                    ]
-                }
-                for i in range(10)
-            ]
-        }
-    }
-    large_file = tmp_path / "large.json"
-    large_file.write_text(json.dumps(large_json))
-    time_large = benchmark(json_pretty_command, fs, "large.json", iterations=5)
-    print(f"  Large (50KB): {time_large:>8.2f}ms  (nested structure)")
-    
-    return [
-        ("json-pretty", "1KB JSON", time_small, "Simple array"),
-        ("json-pretty", "50KB JSON", time_large, "Nested structure"),
-    ]
+def run_cli(argv: list[str], workdir: Path) -> tuple[float, float, float | None]:
+    """Run the CLI once; return wall time and import time in ms, and peak RSS.
 
+    The peak RSS is measured inside the child, as in peak_rss_mb(): cli.py
+    runs under CLI_RUNNER, which reports the child's VmHWM on a pipe.
+    Without /proc it falls back to the child's ru_maxrss from wait4.
+    """
+    read_fd, write_fd = os.pipe()
+    command = [sys.executable, "-X", "importtime", "-c", CLI_RUNNER]
+    command += [str(CLI_PATH), str(write_fd), *argv]
+    with tempfile.TemporaryFile() as stderr, open(read_fd, "rb") as status:
+        try:
+            start = time.perf_counter()
+            child = subprocess.Popen(
+                command,
+                cwd=workdir,
+                stdout=subprocess.DEVNULL,
+                stderr=stderr,
+                pass_fds=(write_fd,),
+            )
+        finally:
+            os.close(write_fd)
+        usage = None
+        if hasattr(os, "wait4"):
+            _, exit_status, usage = os.wait4(child.pid, 0)
+            child.returncode = os.waitstatus_to_exitcode(exit_status)
+        else:
+            child.wait()
+        elapsed = (time.perf_counter() - start) * 1000
+        rss = vm_hwm_mb(status.read())
+        if rss is None and usage is not None:
+            scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+            rss = round(usage.ru_maxrss / scale, 1)
+        stderr.seek(0)
+        report = stderr.read().decode("utf-8", errors="replace").splitlines()
 
-def benchmark_replace(tmp_path, fs):
-    """Benchmark replace with dry-run vs apply."""
-    print("\n🔄 REPLACE BENCHMARKS")
-    print("-" * 60)
-    
-    # Create files with text to replace
-    for i in range(20):
-        content = f"This is old_text in file {i}\n" * 10
-        (tmp_path / f"replace{i}.txt").write_text(content)
-    
-    # Dry-run (preview)
-    time_dry = benchmark(replace_command, fs, "old_text", "new_text", "replace*.txt", 
-                        dry_run=True, iterations=5)
-    print(f"  Dry-run (20 files):  {time_dry:>8.2f}ms  (preview only)")
-    
-    # Apply (actually modify)
-    # Need fresh files each iteration
-    def apply_with_setup():
-        # Create fresh files
-        test_tmp = Path(tempfile.mkdtemp())
-        test_fs = SafeFileSystem(test_tmp)
-        for i in range(20):
-            content = f"This is old_text in file {i}\n" * 10
-            (test_tmp / f"apply{i}.txt").write_text(content)
-        replace_command(test_fs, "old_text", "new_text", "apply*.txt", dry_run=False)
-        # Cleanup
-        import shutil
-        shutil.rmtree(test_tmp)
-    
-    time_apply = benchmark(apply_with_setup, iterations=3)
-    print(f"  Apply (20 files):    {time_apply:>8.2f}ms  (modifies files)")
-    
-    return [
-        ("replace", "20 files (dry-run)", time_dry, "Preview changes"),
-        ("replace", "20 files (apply)", time_apply, "Modify files"),
-    ]
+    imports = [line for line in report if line.startswith("import time:")]
+    if child.returncode:
+        errors = [line for line in report if line not in imports]
+        detail = errors[-1] if errors else f"exit status {child.returncode}"
+        raise RuntimeError(f"cli.py {' '.join(argv)} failed: {detail}")
+
+    import_us = 0
+    for line in imports:
+        own = line.split(":", 1)[1].split("|")[0].strip()
+        if own.isdigit():
+            import_us += int(own)
+    return elapsed, import_us / 1000, rss
+
+
+def start_daemon(workdir: Path, timeout: float = 30) -> subprocess.Popen:
+    """Start cli.py serve in workdir and wait until it accepts connections."""
+    daemon = subprocess.Popen(
+        [sys.executable, str(CLI_PATH), "serve"],
+        cwd=workdir,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + timeout
+    while not (workdir / SERVE_SOCKET).exists():
+        if daemon.poll() is not None or time.monotonic() > deadline:
+            daemon.kill()
+            raise RuntimeError("cli.py serve did not start")
+        time.sleep(0.01)
+    return daemon
 
 
-def generate_markdown_table(results):
-    """Generate markdown table from results."""
-    print("\n" + "=" * 60)
-    print("MARKDOWN TABLE FOR README:")
-    print("=" * 60)
-    print()
-    print("| Command | Operation | Time | Notes |")
-    print("|---------|-----------|------|-------|")
-    for cmd, operation, time_ms, notes in results:
-        print(f"| {cmd} | {operation} | {time_ms:.2f}ms | {notes} |")
-    print()
+def measure_startup(
+    name: str,
+    description: str,
+    argv: list[str],
+    workdir: Path,
+    warmup: int,
+    iterations: int,
+    budget: float,
+) -> dict:
+    """Time whole CLI runs and fail the case if imports exceed the budget."""
+    result = {"name": name, "description": description, "status": "ok", "error": None}
+    times, imports, peaks = [], [], []
+    try:
+        for i in range(warmup + iterations):
+            elapsed, import_ms, rss = run_cli(argv, workdir)
+            if i >= warmup:
+                times.append(elapsed)
+                imports.append(import_ms)
+                peaks.append(rss)
+    except (OSError, RuntimeError) as e:
+        result.update(status="error", error=str(e))
+
+    result["times_ms"] = [round(t, 3) for t in times]
+    result.update(summarize(times))
+    result["peak_rss_mb"] = None if None in peaks else max(peaks, default=None)
+    if imports:
+        result["import_ms"] = round(statistics.median(imports), 3)
+        result["import_budget_ms"] = budget
+        if result["status"] == "ok" and result["import_ms"] > budget:
+            result.update(
+                status="error",
+                error=f"imports took {result['import_ms']:.1f}ms "
+                f"(budget {budget:.1f}ms)",
+            )
+    return result
+
+
+def compare_results(current: dict, baseline: dict, threshold: float) -> list[str]:
+    """Return a message for every case that regressed against the baseline.
+
+    A case regresses when its median time, import time (startup cases) or
+    peak RSS grows by more than
+    threshold (0.1 = 10%), or when it fails but passed in the baseline.
+    Cases missing from the baseline are not compared.
+    """
+    if current["sizes"] != baseline["sizes"]:
+        raise ValueError(
+            f"Baseline sizes {baseline['sizes']} differ from {current['sizes']}"
+        )
+    previous = {case["name"]: case for case in baseline["cases"]}
+    regressions = []
+    for case in current["cases"]:
+        old = previous.get(case["name"])
+        if old is None or old["status"] != "ok":
+            continue
+        if case["status"] != "ok":
+            regressions.append(f"{case['name']}: failed ({case['error']})")
+            continue
+        metrics = (("median_ms", "ms"), ("import_ms", "ms"), ("peak_rss_mb", "MB"))
+        for metric, unit in metrics:
+            before, after = old.get(metric), case.get(metric)
+            if before and after and after > before * (1 + threshold):
+                regressions.append(
+                    f"{case['name']}: {metric} {before:.2f}{unit} -> "
+                    f"{after:.2f}{unit} (+{(after / before - 1) * 100:.0f}%)"
+                )
+    return regressions
+
+
+def format_row(case: dict) -> str:
+    if case["status"] != "ok":
+        return f"| {case['name']} | FAILED: {case['error']} | | | | |"
+    rss = case["peak_rss_mb"]
+    notes = case["description"]
+    if "import_ms" in case:
+        notes += f" (imports {case['import_ms']:.1f}ms)"
+    return (
+        f"| {case['name']} | {case['median_ms']:.2f}ms | {case['p95_ms']:.2f}ms"
+        f" | {case['stddev_ms']:.2f}ms | {'-' if rss is None else f'{rss:.1f}MB'}"
+        f" | {notes} |"
+    )
 
 
 def main():
-    """Run all benchmarks."""
-    print("=" * 60)
-    print("SAFE-TOOLKIT PERFORMANCE BENCHMARKS")
-    print("=" * 60)
-    
+    parser = argparse.ArgumentParser(description="Run safe-toolkit benchmarks")
+    parser.add_argument(
+        "--tier",
+        choices=TIERS,
+        default="smoke",
+        help="Fixture scale: smoke (MBs), standard (100MB, 10^4 files) or "
+        "scale (1GB, 10^5 files, 256MB lines)",
+    )
+    parser.add_argument(
+        "--case",
+        action="append",
+        dest="cases",
+        metavar="GLOB",
+        help="Only run cases whose name matches (repeatable)",
+    )
+    parser.add_argument("--warmup", type=int, default=1, help="Untimed runs per case")
+    parser.add_argument(
+        "--iterations",
+        type=int,
+        help="Timed runs per case (default: 10, 5 or 3 depending on tier)",
+    )
+    parser.add_argument("--file-mb", type=int, help="Override the log/JSON size")
+    parser.add_argument(
+        "--tree-files", type=int, help="Override the file count (e.g. 1000000)"
+    )
+    parser.add_argument("--line-mb", type=int, help="Override the long line size")
+    parser.add_argument(
+        "--workdir",
+        help="Keep fixtures in this directory and reuse them on the next run",
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=3600, help="Seconds allowed per case"
+    )
+    parser.add_argument(
+        "--import-budget-ms",
+        type=float,
+        default=IMPORT_BUDGET_MS,
+        help="Fail startup cases whose median import time exceeds this "
+        f"(default: {IMPORT_BUDGET_MS:.0f})",
+    )
+    parser.add_argument("--json", metavar="FILE", help="Write the results as JSON")
+    parser.add_argument(
+        "--compare",
+        metavar="BASELINE",
+        help="Exit with status 1 if a case regressed against this JSON file",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.10,
+        help="Allowed slowdown or memory growth for --compare (default: 0.10)",
+    )
+    parser.add_argument("--run-case", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case:
+        case = next(case for case in CASES if case.name == args.run_case)
+        result = run_case(case, Path(args.workdir), args.warmup, args.iterations)
+        print(json.dumps(result))
+        return
+
+    sizes = dict(TIERS[args.tier])
+    for key in ("file_mb", "tree_files", "line_mb"):
+        if getattr(args, key) is not None:
+            sizes[key] = getattr(args, key)
+    iterations = args.iterations or DEFAULT_ITERATIONS[args.tier]
+
+    def selected(name: str) -> bool:
+        return not args.cases or any(
+            fnmatch.fnmatchcase(name, glob) for glob in args.cases
+        )
+
+    startup_cases = [case for case in STARTUP_CASES if selected(case[0])]
+    connect_cases = [case for case in CONNECT_CASES if selected(case[0])]
+    cases = [case for case in CASES if selected(case.name)]
+
     with tempfile.TemporaryDirectory() as tmp_dir:
-        tmp_path = Path(tmp_dir)
-        fs = SafeFileSystem(tmp_path)
-        
+        workdir = Path(args.workdir or tmp_dir).resolve()
+        workdir.mkdir(parents=True, exist_ok=True)
+        print(f"Preparing {args.tier} fixtures in {workdir} ...", file=sys.stderr)
+        write_fixtures(workdir, sizes)
+
+        print("| Case | Median | p95 | Stddev | Peak RSS | Notes |")
+        print("|------|--------|-----|--------|----------|-------|")
         results = []
-        
-        results.extend(benchmark_read(tmp_path, fs))
-        results.extend(benchmark_grep(tmp_path, fs))
-        results.extend(benchmark_checksum(tmp_path, fs))
-        results.extend(benchmark_json_pretty(tmp_path, fs))
-        results.extend(benchmark_replace(tmp_path, fs))
-        
-        generate_markdown_table(results)
-        
-        print("=" * 60)
-        print("✅ Benchmarks complete!")
-        print("=" * 60)
+        for name, description, argv in startup_cases:
+            result = measure_startup(
+                name,
+                description,
+                argv,
+                workdir,
+                args.warmup,
+                iterations,
+                args.import_budget_ms,
+            )
+            print(format_row(result), flush=True)
+            results.append(result)
+        if connect_cases:
+            daemon = start_daemon(workdir)
+            try:
+                for name, description, argv in connect_cases:
+                    result = measure_startup(
+                        name,
+                        description,
+                        argv,
+                        workdir,
+                        args.warmup,
+                        iterations,
+                        args.import_budget_ms,
+                    )
+                    print(format_row(result), flush=True)
+                    results.append(result)
+            finally:
+                daemon.terminate()
+                daemon.wait()
+        for case in cases:
+            result = measure(case, workdir, args.warmup, iterations, args.timeout)
+            print(format_row(result), flush=True)
+            results.append(result)
+
+    report = {
+        "version": RESULTS_VERSION,
+        "tier": args.tier,
+        "sizes": sizes,
+        "warmup": args.warmup,
+        "iterations": iterations,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "cases": results,
+    }
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2) + "\n")
+
+    failed = [case["name"] for case in results if case["status"] != "ok"]
+    if failed:
+        print(f"\nFailed: {', '.join(failed)}", file=sys.stderr)
+
+    regressions = []
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        try:
+            regressions = compare_results(report, baseline, args.threshold)
+        except ValueError as e:
+            parser.error(str(e))
+        for message in regressions:
+            print(f"Regression: {message}", file=sys.stderr)
+        if not regressions:
+            print(f"\nNo regressions beyond {args.threshold:.0%}.", file=sys.stderr)
+
+    if failed or regressions:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,170 @@
+import os
+import sqlite3
+import threading
+import time
+from filesystem import SafeFileSystem
+from instrumentation import count
+from walker import RACY_WINDOW_NS
+
+CACHE_FILE = "checksums.sqlite"
+DEFAULT_MAX_ENTRIES = 2_000_000
+# The cache is best-effort and may be shared by concurrent runs: stores are
+# committed in batches so no run holds the write lock for long, and a run
+# that still finds the database locked after BUSY_TIMEOUT seconds treats it
+# as a cache miss instead of failing.
+COMMIT_BATCH = 64
+BUSY_TIMEOUT = 1.0
+
+
+class ChecksumCache:
+    """Digest cache keyed by (device, inode, size, mtime_ns, algorithm).
+
+    One instance may be shared by several threads, e.g. in a serve daemon.
+    """
+
+    def __init__(self, path: str, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._touched = []
+        self._pending = 0
+        # Whether the table may have grown past max_entries since the last
+        # eviction; checked once per open in case max_entries was lowered.
+        self._grown = True
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path, timeout=BUSY_TIMEOUT, check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS digests (
+                device INTEGER NOT NULL,
+                inode INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                algorithm TEXT NOT NULL,
+                digest TEXT NOT NULL,
+                last_used INTEGER NOT NULL,
+                PRIMARY KEY (device, inode, size, mtime_ns, algorithm)
+            ) WITHOUT ROWID
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS digests_last_used ON digests (last_used)"
+        )
+
+    @staticmethod
+    def key(stat: os.stat_result) -> tuple[int, int, int, int]:
+        return (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+    def lookup(self, stat: os.stat_result, algorithm: str) -> str | None:
+        key = self.key(stat)
+        with self._lock:
+            try:
+                row = self._conn.execute(
+                    "SELECT digest FROM digests WHERE device = ? AND inode = ?"
+                    " AND size = ? AND mtime_ns = ? AND algorithm = ?",
+                    (*key, algorithm),
+                ).fetchone()
+            except sqlite3.OperationalError:
+                row = None
+
+            if row is None:
+                self.misses += 1
+                count("cache_misses")
+                return None
+
+            self.hits += 1
+            self._touched.append((*key, algorithm))
+        count("cache_hits")
+        return row[0]
+
+    def store(self, stat: os.stat_result, algorithm: str, digest: str) -> None:
+        now = time.time_ns()
+        if now - stat.st_mtime_ns < RACY_WINDOW_NS:
+            return
+
+        with self._lock:
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO digests VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (*self.key(stat), algorithm, digest, now),
+                )
+                self._pending += 1
+                self._grown = True
+                if self._pending >= COMMIT_BATCH:
+                    self._conn.commit()
+                    self._pending = 0
+            except sqlite3.OperationalError:
+                self._abandon()
+
+    def commit(self) -> None:
+        """Record LRU usage for hits, evict past the size bound, and commit.
+
+        The cache stays open, so a long-running daemon stays bounded too.
+        """
+        with self._lock:
+            try:
+                self._touch()
+                self._evict()
+                self._conn.commit()
+                self._pending = 0
+            except sqlite3.OperationalError:
+                self._abandon()
+
+    def close(self) -> None:
+        """Record LRU usage for hits, evict past the size bound, and commit."""
+        with self._lock:
+            try:
+                self._touch()
+                self._evict()
+                self._conn.commit()
+            except sqlite3.OperationalError:
+                self._abandon()
+            finally:
+                self._conn.close()
+
+    def _abandon(self) -> None:
+        """Drop uncommitted writes after another run held the lock too long."""
+        self._touched.clear()
+        self._pending = 0
+        try:
+            self._conn.rollback()
+        except sqlite3.OperationalError:
+            pass
+
+    def _evict(self) -> None:
+        # Counting scans an index, so it is skipped when nothing was added.
+        if not self._grown:
+            return
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM digests").fetchone()
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM digests WHERE"
+                " (device, inode, size, mtime_ns, algorithm) IN"
+                " (SELECT device, inode, size, mtime_ns, algorithm FROM digests"
+                " ORDER BY last_used LIMIT ?)",
+                (count - self.max_entries,),
+            )
+        self._grown = False
+
+    def _touch(self) -> None:
+        now = time.time_ns()
+        self._conn.executemany(
+            "UPDATE digests SET last_used = ? WHERE device = ? AND inode = ?"
+            " AND size = ? AND mtime_ns = ? AND algorithm = ?",
+            ((now, *entry) for entry in self._touched),
+        )
+        self._touched.clear()
+
+
+def open_cache(
+    fs: SafeFileSystem, max_entries: int = DEFAULT_MAX_ENTRIES
+) -> ChecksumCache | None:
+    """Open the workspace cache, or return None when the root is not writable."""
+    try:
+        return ChecksumCache(str(fs.state_path(CACHE_FILE)), max_entries)
+    except (OSError, sqlite3.Error):
+        return None
@@ -1,79 +1,120 @@
-import argparse
+import os
 import time
 import sys
-from pathlib import Path
-from exceptions import PathTraversalError, SymLinkNotAllowedError, BinaryFileError
-from command_router import execute_command
+import instrumentation
+from exceptions import (
+    PathTraversalError,
+    SymLinkNotAllowedError,
+    BinaryFileError,
+    ChecksumMismatchError,
+    TransactionError,
+    InvalidJSONError,
+    BatchError,
+    ServeError,
+)
+from arguments import JOB_COMMANDS, build_parser, parse_args
+from output import write_output
+
+# Functions listed on stderr after --profile; the full stats go to the file.
+PROFILE_LINES = 20
 
 
 def main():
-    parser = argparse.ArgumentParser(
-        prog="safe-toolkit",
-        description="Safe file operations toolkit",
-    )
-    
-    parser.add_argument('--timing', action='store_true', help='Show execution time')
-    parser.add_argument("--debug", action="store_true", help="Show tracebacks")
-    subparsers = parser.add_subparsers(dest="command", required=True)
-
-    read_parser = subparsers.add_parser("read", help="Read a text file safely")
-    read_parser.add_argument("file", help="File to read")
-
-    grep_parser = subparsers.add_parser(
-        "grep", help="Search for a pattern in text files safely"
-    )
-    grep_parser.add_argument("pattern", help="Pattern to search for")
-    grep_parser.add_argument("glob", help="File pattern (e.g., *.txt, **/*.py)")
-
-    checksum_parser = subparsers.add_parser("checksum", help="Calculate file checksum")
-    checksum_parser.add_argument("file", help="File to checksum")
-    checksum_parser.add_argument(
-        "--algorithm",
-        default="sha256",
-        choices=["md5", "sha256", "sha512"],
-        help="Hash algorithm (default: sha256)",
-    )
-
-    json_parser = subparsers.add_parser(
-        "json-pretty", help="Format JSON with proper indentation"
-    )
-    json_parser.add_argument("file", help="JSON file to format")
-
-    replace_parser = subparsers.add_parser(
-        "replace", help="Search and replace text in files"
-    )
-    replace_parser.add_argument("search", help="Text to search for")
-    replace_parser.add_argument("replace", help="Text to replace with")
-    replace_parser.add_argument("glob", help="File pattern (e.g., *.txt)")
-    replace_parser.add_argument(
-        "--apply",
-        action="store_true",
-        help="Apply changes (default is dry-run preview)",
-    )
-
-    args = parser.parse_args()
+    parser = build_parser()
+    args = parse_args(parser)
+
+    recorder = None
+    if args.timing or args.timing_json or args.trace:
+        recorder = instrumentation.enable(trace=args.trace is not None)
+    profiler = None
+    if args.profile:
+        import cProfile
+
+        profiler = cProfile.Profile()
 
     try:
         start = time.perf_counter()
-        result = execute_command(args)
-        
+        if profiler is not None:
+            profiler.enable()
+        write_output(command_output(args), sys.stdout)
+        sys.stdout.flush()
+        if profiler is not None:
+            profiler.disable()
         end = time.perf_counter()
-        elapsed_ms = (end - start) * 1000
-        
-        if result:
-            print(result)
-        if args.timing:
-            print(f"\nExecution time: {elapsed_ms:.2f}ms", file=sys.stderr)
-    except (PathTraversalError, SymLinkNotAllowedError, BinaryFileError) as e:
+        report_run(args, recorder, profiler, end - start)
+    except BrokenPipeError:
+        # The reader went away (e.g. piped into head); stop quietly.
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(1)
+    except (
+        PathTraversalError,
+        SymLinkNotAllowedError,
+        BinaryFileError,
+        ChecksumMismatchError,
+        TransactionError,
+        InvalidJSONError,
+        BatchError,
+        ServeError,
+    ) as e:
+        sys.stdout.flush()
         print(f"Error: {e}", file=sys.stderr)
         sys.exit(1)
     except Exception as e:
         if args.debug:
             raise
         else:
+            sys.stdout.flush()
             print(f"Unexpected error: {e}", file=sys.stderr)
             sys.exit(1)
 
 
+def command_output(args):
+    """Run the command in the serve daemon given by --connect, or here.
+
+    Commands also run here when no daemon is listening on the socket, or
+    when it serves another directory. The router is imported only to run
+    here, so a client stays small.
+    """
+    if args.connect and args.command in JOB_COMMANDS:
+        from client import connect, iter_remote
+
+        sock = connect(args.connect)
+        if sock is not None:
+            return iter_remote(sock, sys.argv[1:], lambda: local_output(args))
+    return local_output(args)
+
+
+def local_output(args):
+    from command_router import execute_command
+
+    return execute_command(args)
+
+
+def report_run(args, recorder, profiler, elapsed: float) -> None:
+    """Print or save the reports asked for by the timing and profile options."""
+    if args.timing:
+        print(f"\nExecution time: {elapsed * 1000:.2f}ms", file=sys.stderr)
+        if recorder.phases or recorder.counters:
+            print(instrumentation.format_table(recorder, elapsed), file=sys.stderr)
+    if args.timing_json:
+        import json
+
+        stats = instrumentation.stats_json(recorder, elapsed)
+        with open(args.timing_json, "w") as f:
+            f.write(json.dumps(stats, indent=2) + "\n")
+    if args.trace:
+        import json
+
+        trace = instrumentation.chrome_trace(recorder)
+        with open(args.trace, "w") as f:
+            f.write(json.dumps(trace))
+    if profiler is not None:
+        import pstats
+
+        profiler.dump_stats(args.profile)
+        stats = pstats.Stats(profiler, stream=sys.stderr)
+        stats.sort_stats("cumulative").print_stats(PROFILE_LINES)
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,55 @@
+import json
+import os
+import socket
+from typing import Callable, Iterable, Iterator
+from exceptions import ServeError, WrongRootError
+
+# Reply status of a daemon asked to run a command in another workspace.
+WRONG_ROOT = "wrong-root"
+
+
+def connect(socket_path: str) -> socket.socket | None:
+    """Connect to a serve daemon, or return None when none is listening."""
+    if not hasattr(socket, "AF_UNIX"):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except (FileNotFoundError, ConnectionRefusedError):
+        sock.close()
+        return None
+    return sock
+
+
+def iter_remote(
+    sock: socket.socket,
+    argv: list[str],
+    local: Callable[[], Iterable[str]] | None = None,
+) -> Iterator[str]:
+    """Run a command line in the daemon, yielding its output as it arrives.
+
+    Raises ServeError with the daemon's message if the command failed. If the
+    daemon serves another root, the output of local() is yielded instead, or
+    WrongRootError is raised when there is no local.
+    """
+    request = {"root": os.path.realpath(os.getcwd()), "argv": argv}
+    with sock, sock.makefile("rb") as replies:
+        sock.sendall(json.dumps(request).encode("utf-8") + b"\n")
+        for line in replies:
+            reply = json.loads(line)
+            if "output" in reply:
+                yield reply["output"]
+            elif reply["status"] == "ok":
+                return
+            elif reply["status"] == WRONG_ROOT and local is not None:
+                break
+            elif reply["status"] == WRONG_ROOT:
+                raise WrongRootError(reply["error"])
+            else:
+                raise ServeError(reply["error"])
+        else:
+            raise ServeError(
+                "The daemon closed the connection before the command finished"
+            )
+    # Sent before any output, so nothing has been yielded yet.
+    yield from local()
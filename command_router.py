@@ -1,29 +1,308 @@
+import codecs
+import sys
+import time
 from pathlib import Path
+from typing import TYPE_CHECKING, Iterable, Iterator
+from arguments import JOB_COMMANDS
 from filesystem import SafeFileSystem
-from commands.read import read_command
-from commands.grep import grep_command
-from commands.checksum import checksum_command
-from commands.json_pretty import json_pretty_command
-from commands.replace import replace_command
+from output import Output, lines_output
+from walker import ScanCache
 
+if TYPE_CHECKING:
+    from checksum_cache import ChecksumCache
 
-def execute_command(args):
-    """Routes and executes the given command with provided arguments."""
+
+def execute_command(args) -> Iterator[str]:
+    """Routes and executes the given command, yielding its output in chunks.
+
+    Nothing runs until the first chunk is requested, and the filesystem
+    stays open until the output has been consumed.
+    """
 
     root = Path.cwd()
-    fs = SafeFileSystem(root)
+    with SafeFileSystem(
+        root,
+        exclude=getattr(args, "exclude", ()),
+        use_ignore_files=getattr(args, "gitignore", False),
+        **shared_caches(args.command),
+    ) as fs:
+        output = dispatch_command(fs, args)
+        if isinstance(output, str):
+            yield output
+        else:
+            yield from output
+
+
+def shared_caches(command: str) -> dict:
+    """SafeFileSystem caches for commands that run many operations on it."""
+    if command in ("batch", "serve"):
+        from matcher import BinaryCache
+
+        return {"scan_cache": ScanCache(), "binary_cache": BinaryCache()}
+    return {}
+
+
+def dispatch_command(
+    fs: SafeFileSystem, args, checksum_cache: "ChecksumCache | None" = None
+) -> Output:
+    """Runs the command named by args against an existing SafeFileSystem.
+
+    Returns either the whole output or an iterator of output chunks. Each
+    command's module (and whatever it imports) is only loaded when that
+    command runs, which keeps startup short for one-shot invocations.
+    checksum_cache is an open cache to use instead of opening the
+    workspace cache for each checksum command.
+    """
 
     match args.command:
         case "read":
-            return read_command(fs, args.file)
+            from commands.read import iter_read
+
+            return iter_read(
+                fs, args.file, args.offset, args.length, args.head, args.tail
+            )
         case "grep":
-            return grep_command(fs, args.pattern, args.glob)
+            from commands.grep import iter_grep
+
+            if args.patterns_file:
+                lines = fs.read_file(args.patterns_file).decode("utf-8").splitlines()
+                patterns = [line for line in lines if line]
+            else:
+                patterns = [args.pattern]
+            return lines_output(
+                iter_grep(
+                    fs,
+                    patterns,
+                    args.glob,
+                    jobs=args.jobs,
+                    executor=args.executor,
+                    line_numbers=args.line_number,
+                    split_size=args.split_size * 1024 * 1024,
+                    regex=args.regex,
+                    use_index=not args.no_index,
+                )
+            )
 
         case "checksum":
-            return checksum_command(fs, args.file, args.algorithm)
+            return checksum_output(fs, args, checksum_cache)
         case "json-pretty":
-            return json_pretty_command(fs, args.file)
+            from commands.json_pretty import (
+                iter_json_lines,
+                iter_json_path,
+                iter_json_pretty,
+            )
+
+            if args.lines:
+                return iter_json_lines(fs, args.file, jobs=args.jobs)
+            if args.path is not None:
+                return iter_json_path(fs, args.file, args.path)
+            return iter_json_pretty(fs, args.file)
+        case "batch":
+            return batch_output(fs, args)
+        case "serve":
+            from server import serve
+
+            return serve(fs, args.socket, args.jobs)
+        case "index":
+            from commands.index import index_command
+
+            return index_command(fs, args.glob)
         case "replace":
-            return replace_command(
-                fs, args.search, args.replace, args.glob, dry_run=not args.apply
+            from commands.replace import iter_replace, rollback_command
+            from rewriter import parse_rules
+
+            if args.rollback:
+                return rollback_command(fs)
+            rules = None
+            if args.rules_file:
+                rules = parse_rules(fs.read_file(args.rules_file).decode("utf-8"))
+            return iter_replace(
+                fs,
+                args.search,
+                args.replace,
+                args.glob,
+                dry_run=not args.apply,
+                transaction=args.transaction,
+                jobs=args.jobs,
+                regex=args.regex,
+                word=args.word,
+                ignore_case=args.ignore_case,
+                rules=rules,
+            )
+
+
+def checksum_output(
+    fs: SafeFileSystem, args, shared_cache: "ChecksumCache | None" = None
+) -> Iterator[str]:
+    """Run a checksum subcommand, keeping the cache open while it streams.
+
+    A shared cache is used as is and left open.
+    """
+    cache = shared_cache
+    if args.no_cache:
+        cache = None
+    elif cache is None:
+        from checksum_cache import open_cache
+
+        cache = open_cache(fs)
+    try:
+        if args.check:
+            from commands.manifest import iter_check_manifest
+
+            yield from lines_output(
+                iter_check_manifest(
+                    fs, args.file, jobs=args.jobs, cache=cache, verify=args.verify
+                )
             )
+        elif args.write_manifest:
+            from commands.manifest import write_manifest_command
+
+            yield write_manifest_command(
+                fs,
+                args.file,
+                args.write_manifest,
+                (args.algorithm or ["sha256"])[0],
+                jobs=args.jobs,
+                cache=cache,
+            )
+        else:
+            from commands.checksum import iter_checksum
+
+            yield from lines_output(
+                iter_checksum(
+                    fs,
+                    args.file,
+                    args.algorithm or ["sha256"],
+                    use_mmap=args.mmap,
+                    jobs=args.jobs,
+                    cache=cache,
+                    verify=args.verify,
+                )
+            )
+    finally:
+        if cache is not None and cache is not shared_cache:
+            cache.close()
+
+
+def batch_output(fs: SafeFileSystem, args) -> Iterator[str]:
+    """Run JSONL jobs concurrently against one filesystem, yielding JSONL results.
+
+    Every job shares the filesystem's directory fds and listing cache, and
+    checksum jobs share one checksum cache. Results come back in job order, each as soon as it and every earlier
+    job have finished. BatchError is raised at the end if any job failed.
+    """
+    import json
+    from arguments import JobArgumentParser, build_parser
+    from checksum_cache import open_cache
+    from exceptions import BatchError
+    from parallel import ordered_map, worker_count
+
+    if args.file == "-":
+        lines: Iterable[str] = sys.stdin
+    else:
+        lines = fs.read_file(args.file).decode("utf-8").splitlines()
+
+    parser = build_parser(JobArgumentParser)
+    # Jobs are parsed lazily in this thread; only running them is concurrent.
+    jobs = (
+        parse_job(parser, number, line)
+        for number, line in enumerate(lines, 1)
+        if line.strip()
+    )
+    total = failed = 0
+    cache = open_cache(fs)
+    try:
+        for result in ordered_map(
+            lambda job: run_job(fs, *job, checksum_cache=cache),
+            jobs,
+            worker_count(args.jobs),
+        ):
+            total += 1
+            failed += result["status"] != "ok"
+            yield json.dumps(result) + "\n"
+    finally:
+        if cache is not None:
+            cache.close()
+
+    if failed:
+        raise BatchError(f"{failed} of {total} job(s) failed")
+
+
+def parse_job(parser, number: int, line: str) -> tuple:
+    """Turn one job line into (id, args, None), or (id, None, error).
+
+    A job is {"id": ..., "command": "grep", "args": ["TODO", "*.py"]}; the id
+    defaults to the line number and args are parsed like the command line.
+    """
+    import json
+    from arguments import parse_args
+
+    try:
+        job = json.loads(line)
+    except ValueError as e:
+        return number, None, ValueError(f"Invalid job: {e}")
+    if not isinstance(job, dict):
+        return number, None, ValueError("Invalid job: expected a JSON object")
+
+    job_id = job.get("id", number)
+    command, job_args = job.get("command"), job.get("args", [])
+    try:
+        if command not in JOB_COMMANDS:
+            raise ValueError(f"Unsupported batch command: {command!r}")
+        if not isinstance(job_args, list) or not all(
+            isinstance(arg, str) for arg in job_args
+        ):
+            raise ValueError("args must be a list of strings")
+        args = parse_args(parser, [command, *job_args])
+        if getattr(args, "exclude", None) or getattr(args, "gitignore", False):
+            raise ValueError("pass --exclude and --gitignore to batch itself")
+    except ValueError as e:
+        return job_id, None, e
+    return job_id, args, None
+
+
+def run_job(
+    fs: SafeFileSystem,
+    job_id,
+    args,
+    error: Exception | None,
+    checksum_cache: "ChecksumCache | None" = None,
+) -> dict:
+    """Run one parsed job, capturing its whole output, status and timing."""
+    start = time.perf_counter()
+    chunks: list[str] = []
+    if error is None:
+        try:
+            collect_output(dispatch_command(fs, args, checksum_cache), chunks)
+        except Exception as e:
+            error = e
+
+    result = {
+        "id": job_id,
+        "status": "ok" if error is None else "error",
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 3),
+        "output": "".join(chunks),
+    }
+    if error is not None:
+        result["error"] = str(error)
+        result["error_type"] = type(error).__name__
+    return result
+
+
+def collect_output(output: Output, chunks: list[str]) -> None:
+    """Append output to chunks as text; bytes chunks are decoded as UTF-8."""
+    chunks.extend(text_chunks(output))
+
+
+def text_chunks(output: Output) -> Iterator[str]:
+    """Yield output as text, decoding bytes chunks as UTF-8 across boundaries."""
+    if isinstance(output, str):
+        yield output
+        return
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    for chunk in output:
+        if isinstance(chunk, str):
+            yield chunk
+        else:
+            yield decoder.decode(chunk)
+    yield decoder.decode(b"", final=True)
@@ -1,16 +1,149 @@
 import hashlib
+import os
+from typing import TYPE_CHECKING, Iterator
 from filesystem import SafeFileSystem
+from instrumentation import phase
+from parallel import ordered_map
+
+if TYPE_CHECKING:
+    from checksum_cache import ChecksumCache
+
+SUPPORTED_ALGORITHMS = ["sha256", "md5", "sha512"]
+GLOB_CHARS = frozenset("*?[")
 
 
 def checksum_command(
-    fs: SafeFileSystem, file_name: str, algorithm: str = "sha256"
+    fs: SafeFileSystem,
+    file_name: str,
+    algorithm: str | list[str] = "sha256",
+    use_mmap: bool = False,
+    jobs: int | None = None,
+    cache: "ChecksumCache | None" = None,
+    verify: bool = False,
 ) -> str:
-    SUPPORTED_ALGORITHMS = ["sha256", "md5", "sha512"]
-    if algorithm not in SUPPORTED_ALGORITHMS:
-        raise ValueError(f"Unsupported algorithm: {algorithm}")
+    return "\n".join(
+        iter_checksum(fs, file_name, algorithm, use_mmap, jobs, cache, verify)
+    )
+
+
+def iter_checksum(
+    fs: SafeFileSystem,
+    file_name: str,
+    algorithm: str | list[str] = "sha256",
+    use_mmap: bool = False,
+    jobs: int | None = None,
+    cache: "ChecksumCache | None" = None,
+    verify: bool = False,
+) -> Iterator[str]:
+    """Yield digest lines in file order as soon as each file is hashed."""
+    algorithms = [algorithm] if isinstance(algorithm, str) else list(algorithm)
+    algorithms = list(dict.fromkeys(algorithms))
+    for name in algorithms:
+        if name not in SUPPORTED_ALGORITHMS:
+            raise ValueError(f"Unsupported algorithm: {name}")
+
+    files = resolve_files(fs, file_name)
+    if cache is None:
+        digests = hash_files(fs, files, algorithms, use_mmap=use_mmap, jobs=jobs)
     else:
-        content = fs.read_file(file_name)
-        hash_function = getattr(hashlib, algorithm)
-        hash_value = hash_function(content).hexdigest()
+        digests = cached_hash_files(
+            fs, files, algorithms, cache, use_mmap=use_mmap, jobs=jobs, verify=verify
+        )
+
+    for file, file_digests in zip(files, digests):
+        for name in algorithms:
+            yield format_digest(file, name, file_digests[name], algorithms)
+
+
+def resolve_files(fs: SafeFileSystem, file_name: str) -> list[str]:
+    """Expand a glob through the filesystem, or pass a plain path through."""
+    if not GLOB_CHARS.intersection(file_name):
+        return [file_name]
+
+    files = sorted(fs.list_files(file_name))
+    if not files:
+        raise FileNotFoundError(f"No files match: {file_name}")
+    return files
+
+
+def hash_file(
+    fs: SafeFileSystem, file_name: str, algorithms: list[str], use_mmap: bool = False
+) -> dict[str, str]:
+    """Feed every requested hasher from a single read of the file."""
+    hashers = [hashlib.new(name) for name in algorithms]
+    for chunk in fs.iter_chunks(file_name, use_mmap=use_mmap):
+        with phase("hash"):
+            for hasher in hashers:
+                hasher.update(chunk)
+    return {name: hasher.hexdigest() for name, hasher in zip(algorithms, hashers)}
 
-    return f"{hash_value} {file_name}"
+
+def hash_files(
+    fs: SafeFileSystem,
+    files: list[str],
+    algorithms: list[str],
+    use_mmap: bool = False,
+    jobs: int | None = None,
+) -> Iterator[dict[str, str]]:
+    """Yield each file's digests in order, hashing a bounded window ahead."""
+    # hashlib releases the GIL on large updates, so threads scale until the
+    # disk is saturated.
+    workers = min(jobs or os.cpu_count() or 1, len(files))
+    return ordered_map(
+        lambda file: hash_file(fs, file, algorithms, use_mmap), files, workers
+    )
+
+
+def cached_hash_files(
+    fs: SafeFileSystem,
+    files: list[str],
+    algorithms: list[str],
+    cache: "ChecksumCache",
+    use_mmap: bool = False,
+    jobs: int | None = None,
+    verify: bool = False,
+) -> Iterator[dict[str, str]]:
+    """Serve digests from the cache and only read files that missed.
+
+    With verify=True every file is rehashed and the cache refreshed. The cache
+    is only touched from the calling thread.
+    """
+    stats = [fs.stat(file) for file in files]
+    digests = []
+    stale = []
+
+    for index, (file, stat) in enumerate(zip(files, stats)):
+        cached = {}
+        if not verify:
+            for name in algorithms:
+                digest = cache.lookup(stat, name)
+                if digest is None:
+                    break
+                cached[name] = digest
+
+        if len(cached) != len(algorithms):
+            stale.append(index)
+        digests.append(cached)
+
+    fresh = hash_files(
+        fs, [files[i] for i in stale], algorithms, use_mmap=use_mmap, jobs=jobs
+    )
+    stale_set = set(stale)
+    for index, stat in enumerate(stats):
+        if index not in stale_set:
+            yield digests[index]
+            continue
+        file_digests = next(fresh)
+        # Only cache digests for files that did not change while being read.
+        if cache.key(fs.stat(files[index])) == cache.key(stat):
+            for name, digest in file_digests.items():
+                cache.store(stat, name, digest)
+        yield file_digests
+
+
+def format_digest(
+    file_name: str, algorithm: str, digest: str, algorithms: list[str]
+) -> str:
+    if len(algorithms) == 1:
+        return f"{digest} {file_name}"
+    return f"{algorithm.upper()} ({file_name}) = {digest}"
@@ -1,23 +1,250 @@
-from filesystem import SafeFileSystem
+import sys
+from functools import partial
+from typing import Iterator
+from exceptions import BinaryFileError
+from filesystem import CHUNK_SIZE, SafeFileSystem
+from instrumentation import count, phase
+from matcher import Matcher, is_binary
+from parallel import ordered_map, worker_count
+from trigram_index import TrigramIndex
 
+# Process pools pay for startup and pickling, so they are only picked
+# automatically when there are enough files to amortise that cost.
+PROCESS_MIN_FILES = 256
+PROCESS_BATCH_SIZE = 32
+# With several workers, files larger than this are split into newline-aligned
+# ranges of about this size and searched concurrently.
+SPLIT_SIZE = 32 * 1024 * 1024
+BOUNDARY_PROBE_SIZE = 64 * 1024
+# A single worker streams each file in chunks of this size.
+STREAM_CHUNK_SIZE = CHUNK_SIZE
 
-def grep_command(fs: SafeFileSystem, pattern: str, file_pattern: str) -> list[str]:
-    files = sorted(fs.list_files(file_pattern))
-    results = []
-    for file in files:
-        raw = fs.read_file(file)
 
-        if is_binary(raw):
-            print(f"Skipping binary file: {file}")
-            continue
+def grep_command(
+    fs: SafeFileSystem,
+    pattern: str | list[str],
+    file_pattern: str,
+    jobs: int = 1,
+    executor: str = "auto",
+    line_numbers: bool = False,
+    split_size: int = SPLIT_SIZE,
+    regex: bool = False,
+    use_index: bool = True,
+) -> str:
+    return "\n".join(
+        iter_grep(
+            fs,
+            pattern,
+            file_pattern,
+            jobs,
+            executor,
+            line_numbers,
+            split_size,
+            regex,
+            use_index,
+        )
+    )
+
+
+def iter_grep(
+    fs: SafeFileSystem,
+    pattern: str | list[str],
+    file_pattern: str,
+    jobs: int = 1,
+    executor: str = "auto",
+    line_numbers: bool = False,
+    split_size: int = SPLIT_SIZE,
+    regex: bool = False,
+    use_index: bool = True,
+) -> Iterator[str]:
+    """Yield matches in sorted file order, one file's matches at a time.
+
+    With one worker, each file is streamed and its matches are yielded as
+    they are found. With several workers, each file's matches are emitted as
+    soon as every
+    earlier file has finished, and files above split_size are cut into
+    newline-aligned ranges that are searched concurrently. Line numbers are
+    stitched back together from each range's newline count. When a trigram
+    index exists, files it proves cannot match are dropped before reading,
+    and so are files the filesystem's binary cache already knows about.
+    """
+    patterns = [pattern] if isinstance(pattern, str) else pattern
+    matcher = Matcher(patterns, regex=regex)
+    entries = dict(fs.walk_files(file_pattern))
+    files = sorted(entries)
+    index = TrigramIndex.open(fs) if use_index else None
+    if index is not None:
+        candidates = index.filter_files(fs, files, matcher.literals)
+        count("files_skipped_index", len(files) - len(candidates))
+        files = candidates
+        index.close()
+
+    workers = worker_count(jobs)
+    binary_cache = fs.binary_cache
+    # Taken before any file is read, so a binary result is never remembered
+    # for a stat that describes newer contents.
+    stats = {}
+    if workers > 1 or binary_cache is not None:
+        stats = {file: entries[file].stat(follow_symlinks=False) for file in files}
+    if binary_cache is not None:
+        unread = []
+        for file in files:
+            if binary_cache.is_binary(file, stats[file]):
+                print(f"Skipping binary file: {file}", file=sys.stderr)
+                count("files_skipped_binary")
+            else:
+                unread.append(file)
+        files = unread
+
+    if workers == 1:
+        for file in files:
+            try:
+                for matches in iter_file_matches(fs, matcher, file):
+                    for line_number, line in matches:
+                        if line_numbers:
+                            yield f"{file}:{line_number}: {line}"
+                        else:
+                            yield f"{file}: {line}"
+            except BinaryFileError:
+                print(f"Skipping binary file: {file}", file=sys.stderr)
+                count("files_skipped_binary")
+                if binary_cache is not None:
+                    binary_cache.add(file, stats[file])
+        return
+
+    units = []
+    for file in files:
+        size = stats[file].st_size if workers > 1 else 0
+        if size > split_size:
+            units.extend(split_ranges(fs, file, size, split_size))
         else:
-            content = fs.read_file(file).decode("utf-8")
-            for line in content.splitlines():
-                if pattern in line:
-                    results.append(f"{file}: {line}")
-    return "\n".join(results)
+            units.append((file, 0, None))
+
+    has_ranges = len(units) > len(files)
+    kind = choose_executor(executor, len(files), has_ranges)
+    batch_size = PROCESS_BATCH_SIZE if kind == "process" and not has_ranges else 1
+    batches = [units[i : i + batch_size] for i in range(0, len(units), batch_size)]
+
+    search = partial(grep_units, fs, matcher)
+    results = ordered_map(search, batches, min(workers, len(batches)), kind)
+
+    skipped = None
+    line_base = 0
+    for batch, batch_results in zip(batches, results):
+        for (file, offset, _), (matches, newline_count) in zip(batch, batch_results):
+            if offset == 0:
+                line_base = 0
+                skipped = None
+            if file == skipped:
+                continue
+            if matches is None:
+                print(f"Skipping binary file: {file}", file=sys.stderr)
+                count("files_skipped_binary")
+                if binary_cache is not None:
+                    binary_cache.add(file, stats[file])
+                skipped = file
+                continue
+
+            for line_number, line in matches:
+                if line_numbers:
+                    yield f"{file}:{line_base + line_number}: {line}"
+                else:
+                    yield f"{file}: {line}"
+            line_base += newline_count
+
+
+def choose_executor(executor: str, file_count: int, has_ranges: bool = False) -> str:
+    if executor != "auto":
+        return executor
+    if has_ranges or file_count >= PROCESS_MIN_FILES:
+        return "process"
+    return "thread"
+
+
+def split_ranges(
+    fs: SafeFileSystem, file: str, size: int, split_size: int
+) -> list[tuple[str, int, int]]:
+    """Cut a file into (file, offset, length) ranges that end after a newline."""
+    ranges = []
+    start = 0
+
+    while start < size:
+        end = start + split_size
+        while end < size:
+            probe = fs.read_range(file, end, BOUNDARY_PROBE_SIZE)
+            newline = probe.find(b"\n")
+            if newline != -1:
+                end += newline + 1
+                break
+            end += len(probe)
+        end = min(end, size)
+        ranges.append((file, start, end - start))
+        start = end
+
+    return ranges
+
+
+def iter_file_matches(
+    fs: SafeFileSystem, matcher: Matcher, file: str
+) -> Iterator[list[tuple[int, str]]]:
+    """Yield a file's (line number, line) matches chunk by chunk as it is read.
+
+    Chunks are searched up to their last newline, so memory stays at about
+    one chunk plus the longest line. BinaryFileError is raised before
+    anything is yielded if the file is binary.
+    """
+    line_base = 0
+    carry = b""
+    checked = False
+    chunks = fs.iter_chunks(file, STREAM_CHUNK_SIZE)
+    for chunk in chunks:
+        block = carry + chunk
+        if not checked:
+            if is_binary(block):
+                chunks.close()
+                raise BinaryFileError(f"Binary file: {file}")
+            checked = True
+        cut = block.rfind(b"\n") + 1
+        carry = block[cut:]
+        if cut:
+            text = block[:cut]
+            yield match_lines(matcher, text, line_base)
+            line_base += text.count(b"\n")
+    if carry:
+        yield match_lines(matcher, carry, line_base)
+
+
+def match_lines(
+    matcher: Matcher, data: bytes, line_base: int = 0
+) -> list[tuple[int, str]]:
+    with phase("match"):
+        return [
+            (line_base + line_number, line.decode("utf-8", errors="replace"))
+            for line_number, line in matcher.iter_lines(data)
+        ]
+
+
+def grep_units(
+    fs: SafeFileSystem, matcher: Matcher, units: list[tuple[str, int, int | None]]
+) -> list[tuple[list[tuple[int, str]] | None, int]]:
+    return [grep_unit(fs, matcher, *unit) for unit in units]
+
+
+def grep_unit(
+    fs: SafeFileSystem, matcher: Matcher, file: str, offset: int, length: int | None
+) -> tuple[list[tuple[int, str]] | None, int]:
+    """Search a whole file (length None) or one range of it.
+
+    Returns the (line number, line) matches relative to the start of the
+    range, or None if the file is binary, plus the range's newline count.
+    """
+    if length is None:
+        raw = fs.read_file(file)
+    else:
+        raw = fs.read_range(file, offset, length)
 
+    if offset == 0 and is_binary(raw):
+        return None, 0
 
-def is_binary(data: bytes) -> bool:
-    textchars = bytearray({7, 8, 9, 10, 12, 13, 27} | set(range(0x20, 0x100)))
-    return bool(data.translate(None, textchars))
+    matches = match_lines(matcher, raw)
+    return matches, raw.count(b"\n") if length is not None else 0
@@ -0,0 +1,10 @@
+from filesystem import SafeFileSystem
+from trigram_index import build_index
+
+
+def index_command(fs: SafeFileSystem, file_pattern: str = "**/*") -> str:
+    stats = build_index(fs, file_pattern)
+    return (
+        f"Indexed {stats['files']} file(s): {stats['updated']} read, "
+        f"{stats['trigrams']} trigrams"
+    )
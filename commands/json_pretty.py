@@ -1,16 +1,121 @@
 import json
-from filesystem import SafeFileSystem
+import sys
+from typing import Iterator
 from exceptions import InvalidJSONError
+from filesystem import SafeFileSystem
+from instrumentation import timed_iter
+from json_stream import (
+    JSONTokenizer,
+    batched_text,
+    iter_events,
+    iter_path,
+    iter_pretty,
+    parse_path,
+)
+from parallel import ordered_map, worker_count
+
+
+def json_pretty_command(
+    fs: SafeFileSystem,
+    filename: str,
+    lines: bool = False,
+    jobs: int = 1,
+    path: str | None = None,
+) -> str:
+    if lines:
+        return "".join(iter_json_lines(fs, filename, jobs))
+    if path is not None:
+        return "".join(iter_json_path(fs, filename, path))
+    return "".join(iter_json_pretty(fs, filename))
+
+
+def iter_json_pretty(fs: SafeFileSystem, filename: str) -> Iterator[str]:
+    """Reformat a JSON file as it is read, in pieces of bounded size.
+
+    Output matches json.dumps(indent=2), except that duplicate keys are all
+    kept instead of the last one winning. Invalid input raises
+    InvalidJSONError once the error is reached, so earlier pieces may
+    already have been produced.
+    """
+    tokens = JSONTokenizer(fs.iter_chunks(filename))
+    yield from timed_iter("parse", batched_text(iter_pretty(iter_events(tokens))))
+
 
+def iter_json_path(fs: SafeFileSystem, filename: str, expr: str) -> Iterator[str]:
+    """Pretty-print only the nodes selected by a path such as .a.b[3].
 
-def json_pretty_command(fs: SafeFileSystem, filename: str) -> str:
-    content = fs.read_file(filename)
+    Several matches (from wildcards) are separated by newlines. Reading
+    stops as soon as nothing later in the file can match.
+    """
+    steps = parse_path(expr)
+    tokens = JSONTokenizer(fs.iter_chunks(filename))
+    selected = iter_path(iter_events(tokens), steps, tokens.skip_container)
+    for count, subtree in enumerate(selected):
+        if count:
+            yield "\n"
+        yield from timed_iter("parse", batched_text(iter_pretty(subtree)))
 
-    try:
-        data = json.loads(content.decode("utf-8"))
-    except json.JSONDecodeError as e:
+
+def iter_json_lines(fs: SafeFileSystem, filename: str, jobs: int = 1) -> Iterator[str]:
+    """Format newline-delimited JSON, one record at a time.
+
+    Batches of whole lines are formatted across a process pool and written
+    in input order. Invalid records are reported on stderr by line number
+    and skipped; InvalidJSONError is raised at the end if there were any.
+    """
+    workers = worker_count(jobs)
+    results = ordered_map(
+        format_records, iter_line_batches(fs, filename), workers, "process"
+    )
+    # Records are parsed in worker processes; this is the time spent waiting.
+    results = timed_iter("parse", results)
+
+    records = invalid = 0
+    for text, count, errors in results:
+        for number, message in errors:
+            print(f"{filename}:{number}: {message}", file=sys.stderr)
+        if text:
+            yield "\n" + text if records else text
+        records += count
+        invalid += len(errors)
+
+    if invalid:
         raise InvalidJSONError(
-            f"Invalid JSON: {e.msg} at line {e.lineno}, column {e.colno}"
+            f"{invalid} of {records + invalid} record(s) in {filename} are invalid"
         )
 
-    return json.dumps(data, indent=2)
+
+def iter_line_batches(fs: SafeFileSystem, filename: str) -> Iterator[tuple[int, bytes]]:
+    """Yield (first line number, bytes) runs of whole lines, about a chunk each."""
+    line_number = 1
+    carry = b""
+    for chunk in fs.iter_chunks(filename):
+        data = carry + bytes(chunk)
+        cut = data.rfind(b"\n") + 1
+        if cut:
+            yield line_number, data[:cut]
+            line_number += data.count(b"\n", 0, cut)
+        carry = data[cut:]
+    if carry:
+        yield line_number, carry
+
+
+def format_records(batch: tuple[int, bytes]) -> tuple[str, int, list[tuple[int, str]]]:
+    """Format each line of a batch; returns (text, records, errors).
+
+    Runs in worker processes, so it only takes and returns plain data.
+    Blank lines are skipped.
+    """
+    first_line, data = batch
+    formatted = []
+    errors = []
+    for number, line in enumerate(data.split(b"\n"), first_line):
+        if not line.strip():
+            continue
+        try:
+            formatted.append(json.dumps(json.loads(line), indent=2))
+        except json.JSONDecodeError as e:
+            errors.append((number, f"Invalid JSON: {e.msg} at column {e.colno}"))
+        except UnicodeDecodeError:
+            errors.append((number, "Invalid JSON: record is not valid UTF-8"))
+    return "\n".join(formatted), len(formatted), errors
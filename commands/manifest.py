@@ -0,0 +1,196 @@
+import hashlib
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Iterator
+from checksum_cache import ChecksumCache
+from commands.checksum import (
+    SUPPORTED_ALGORITHMS,
+    cached_hash_files,
+    hash_file,
+    hash_files,
+    resolve_files,
+)
+from exceptions import ChecksumMismatchError
+from filesystem import SafeFileSystem
+
+MANIFEST_HEADER = "# safe-toolkit manifest v1 algorithm="
+ROOT_PREFIX = "# root "
+
+
+def write_manifest_command(
+    fs: SafeFileSystem,
+    file_pattern: str,
+    manifest_name: str,
+    algorithm: str = "sha256",
+    jobs: int | None = None,
+    cache: ChecksumCache | None = None,
+) -> str:
+    if algorithm not in SUPPORTED_ALGORITHMS:
+        raise ValueError(f"Unsupported algorithm: {algorithm}")
+
+    files = [f for f in resolve_files(fs, file_pattern) if f != manifest_name]
+    if cache is None:
+        digests = hash_files(fs, files, [algorithm], jobs=jobs)
+    else:
+        digests = cached_hash_files(fs, files, [algorithm], cache, jobs=jobs)
+
+    entries = [
+        (file, fs.stat(file).st_size, file_digests[algorithm])
+        for file, file_digests in zip(files, digests)
+    ]
+    root = merkle_root(algorithm, [(file, digest) for file, _, digest in entries])
+
+    lines = [f"{MANIFEST_HEADER}{algorithm}"]
+    lines.extend(f"{digest}  {size}  {file}" for file, size, digest in entries)
+    lines.append(f"{ROOT_PREFIX}{root}")
+    fs.write_file(manifest_name, ("\n".join(lines) + "\n").encode("utf-8"))
+
+    return f"Wrote {len(entries)} entries to {manifest_name}\nRoot: {root}"
+
+
+def check_manifest_command(
+    fs: SafeFileSystem,
+    manifest_name: str,
+    jobs: int | None = None,
+    cache: ChecksumCache | None = None,
+    verify: bool = False,
+) -> str:
+    lines = []
+    try:
+        for line in iter_check_manifest(fs, manifest_name, jobs, cache, verify):
+            lines.append(line)
+    except ChecksumMismatchError as e:
+        raise ChecksumMismatchError("\n".join(lines + [str(e)])) from None
+    return "\n".join(lines)
+
+
+def iter_check_manifest(
+    fs: SafeFileSystem,
+    manifest_name: str,
+    jobs: int | None = None,
+    cache: ChecksumCache | None = None,
+    verify: bool = False,
+) -> Iterator[str]:
+    """Verify a manifest, yielding each mismatch as soon as it is found.
+
+    Files are stat'ed first: missing files and size changes are reported
+    without reading anything, and cached digests are used when available.
+    Only the remaining files are rehashed, by a bounded pool of workers.
+    """
+    algorithm, entries, recorded_root = parse_manifest(fs, manifest_name)
+    failed = 0
+    to_hash = []
+
+    for file, size, expected in entries:
+        try:
+            stat = fs.stat(file)
+        except FileNotFoundError:
+            failed += 1
+            yield f"MISSING: {file}"
+            continue
+
+        if stat.st_size != size:
+            failed += 1
+            yield f"FAILED: {file} (size {stat.st_size} != {size})"
+            continue
+
+        cached = None if cache is None or verify else cache.lookup(stat, algorithm)
+        if cached is not None:
+            if cached != expected:
+                failed += 1
+                yield f"FAILED: {file}"
+            continue
+
+        to_hash.append((file, stat, expected))
+
+    workers = max(1, min(jobs or os.cpu_count() or 1, len(to_hash)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {}
+        queue = iter(to_hash)
+        exhausted = False
+
+        while pending or not exhausted:
+            while not exhausted and len(pending) < workers * 2:
+                item = next(queue, None)
+                if item is None:
+                    exhausted = True
+                    break
+                future = executor.submit(hash_file, fs, item[0], [algorithm])
+                pending[future] = item
+
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                file, stat, expected = pending.pop(future)
+                digest = future.result()[algorithm]
+                if digest != expected:
+                    failed += 1
+                    yield f"FAILED: {file}"
+                elif cache is not None:
+                    cache.store(stat, algorithm, digest)
+
+    root = merkle_root(algorithm, [(file, digest) for file, _, digest in entries])
+    if recorded_root is not None and root != recorded_root:
+        raise ChecksumMismatchError(
+            f"Manifest root {recorded_root} does not match its entries ({root})"
+        )
+    if failed:
+        raise ChecksumMismatchError(
+            f"{failed} of {len(entries)} file(s) did not match {manifest_name}"
+        )
+
+    yield f"{len(entries)} file(s) OK"
+    yield f"Root: {root}"
+
+
+def parse_manifest(
+    fs: SafeFileSystem, manifest_name: str
+) -> tuple[str, list[tuple[str, int, str]], str | None]:
+    lines = fs.read_file(manifest_name).decode("utf-8").splitlines()
+    if not lines or not lines[0].startswith(MANIFEST_HEADER):
+        raise ValueError(f"Not a checksum manifest: {manifest_name}")
+
+    algorithm = lines[0][len(MANIFEST_HEADER) :]
+    if algorithm not in SUPPORTED_ALGORITHMS:
+        raise ValueError(f"Unsupported algorithm: {algorithm}")
+
+    entries = []
+    root = None
+    for number, line in enumerate(lines[1:], start=2):
+        if line.startswith(ROOT_PREFIX):
+            root = line[len(ROOT_PREFIX) :]
+            continue
+        if not line or line.startswith("#"):
+            continue
+
+        parts = line.split("  ", 2)
+        if len(parts) != 3 or not parts[1].isdigit():
+            raise ValueError(f"Malformed manifest line {number}: {line}")
+        digest, size, file = parts
+        entries.append((file, int(size), digest))
+
+    return algorithm, entries, root
+
+
+def merkle_root(algorithm: str, entries: list[tuple[str, str]]) -> str:
+    """Combine (path, digest) leaves, sorted by path, into a single root digest."""
+    level = [
+        hashlib.new(
+            algorithm, b"\x00" + file.encode("utf-8") + b"\x00" + bytes.fromhex(digest)
+        ).digest()
+        for file, digest in sorted(entries)
+    ]
+    if not level:
+        return hashlib.new(algorithm).hexdigest()
+
+    while len(level) > 1:
+        paired = []
+        for i in range(0, len(level) - 1, 2):
+            node = hashlib.new(algorithm, b"\x01" + level[i] + level[i + 1])
+            paired.append(node.digest())
+        if len(level) % 2:
+            paired.append(level[-1])
+        level = paired
+
+    return level[0].hex()
@@ -1,12 +1,128 @@
+import codecs
+from typing import Iterator
 from filesystem import SafeFileSystem
 from exceptions import BinaryFileError
+from instrumentation import phase
 
+# Block size used to find line boundaries for --head and --tail.
+LINE_SCAN_SIZE = 64 * 1024
 
-def read_command(fs: SafeFileSystem, filename: str) -> str:
-    file_path = fs.read_file(filename)
+
+def read_command(
+    fs: SafeFileSystem,
+    filename: str,
+    offset: int = 0,
+    length: int | None = None,
+    head: int | None = None,
+    tail: int | None = None,
+) -> str:
+    chunks = iter_read(fs, filename, offset, length, head, tail)
+    data = b"".join(bytes(chunk) for chunk in chunks)
+    # A byte range may cut a character in two at either end.
+    return data.decode("utf-8", errors="replace")
+
+
+def iter_read(
+    fs: SafeFileSystem,
+    filename: str,
+    offset: int = 0,
+    length: int | None = None,
+    head: int | None = None,
+    tail: int | None = None,
+) -> Iterator[memoryview]:
+    """Yield the raw bytes of a file, or of part of it, without decoding.
+
+    head and tail select whole lines; offset and length select bytes. Only
+    the selected range is read (tail seeks backwards from EOF), and each
+    chunk is checked as valid UTF-8 before it is handed out. Chunks are
+    views into a memory map and are only valid until the next one.
+    """
+    size = fs.stat(filename).st_size
+    if head is not None:
+        offset, length = 0, head_length(fs, filename, head)
+    elif tail is not None:
+        offset = tail_offset(fs, filename, size, tail)
+        length = None
+    end = size if length is None else min(size, offset + length)
+
+    chunks = fs.iter_chunks(filename, use_mmap=True, offset=offset, length=length)
+    yield from validate_utf8(chunks, filename, offset > 0, end < size)
+
+
+def head_length(fs: SafeFileSystem, filename: str, lines: int) -> int:
+    """Return the byte length of the first lines of a file."""
+    length = 0
+    if lines <= 0:
+        return 0
+    for chunk in fs.iter_chunks(filename, chunk_size=LINE_SCAN_SIZE):
+        data = bytes(chunk)
+        pos = -1
+        for _ in range(lines):
+            pos = data.find(b"\n", pos + 1)
+            if pos == -1:
+                break
+            lines -= 1
+        if pos != -1:
+            return length + pos + 1
+        length += len(data)
+    return length
+
+
+def tail_offset(fs: SafeFileSystem, filename: str, size: int, lines: int) -> int:
+    """Return where the last lines of a file start, reading backwards from EOF.
+
+    A newline at the very end terminates the last line, as in tail(1).
+    """
+    if lines <= 0:
+        return size
+    end = size
+    if size and fs.read_range(filename, size - 1, 1) == b"\n":
+        end -= 1
+
+    while end > 0:
+        start = max(0, end - LINE_SCAN_SIZE)
+        block = fs.read_range(filename, start, end - start)
+        pos = len(block)
+        while pos > 0:
+            pos = block.rfind(b"\n", 0, pos)
+            if pos == -1:
+                break
+            lines -= 1
+            if not lines:
+                return start + pos + 1
+        end = start
+    return 0
+
+
+def validate_utf8(
+    chunks: Iterator[memoryview], filename: str, cut_start: bool, cut_end: bool
+) -> Iterator[memoryview]:
+    """Pass chunks through, raising BinaryFileError at the first invalid one.
+
+    cut_start and cut_end say whether the range may begin or end inside a
+    character; those partial characters are not treated as errors.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
     try:
-        return file_path.decode("utf-8")
+        for chunk in chunks:
+            with phase("decode"):
+                if cut_start:
+                    decoder.decode(chunk[continuation_bytes(chunk) :])
+                    cut_start = False
+                else:
+                    decoder.decode(chunk)
+            yield chunk
+        if not cut_end:
+            decoder.decode(b"", final=True)
     except UnicodeDecodeError:
         raise BinaryFileError(
             f"{filename} appears to be binary. Use checksum command instead"
-        )
+        ) from None
+
+
+def continuation_bytes(data: memoryview) -> int:
+    """Count the UTF-8 continuation bytes at the start of data (at most 3)."""
+    count = 0
+    while count < min(3, len(data)) and 0x80 <= data[count] <= 0xBF:
+        count += 1
+    return count
@@ -1,38 +1,422 @@
-import difflib
-from filesystem import SafeFileSystem
+from itertools import chain
+from typing import Callable, Iterable, Iterator
+from filesystem import AtomicWriter, SafeFileSystem
+from instrumentation import count, phase, timed_iter
+from journal import commit_transaction, rollback_transaction
+from matcher import BINARY_SAMPLE_SIZE, is_binary
+from parallel import ordered_map, worker_count
+from rewriter import Rewriter
+
+DIFF_CONTEXT = 3
 
 
 def replace_command(
-    fs: SafeFileSystem, search: str, replace: str, glob: str = "*", dry_run: bool = True
+    fs: SafeFileSystem,
+    search: str | None,
+    replace: str | None,
+    glob: str = "*",
+    dry_run: bool = True,
+    transaction: bool = False,
+    jobs: int = 1,
+    regex: bool = False,
+    word: bool = False,
+    ignore_case: bool = False,
+    rules: list[tuple[str, str]] | None = None,
 ) -> str:
+    return "".join(
+        iter_replace(
+            fs,
+            search,
+            replace,
+            glob,
+            dry_run,
+            transaction,
+            jobs,
+            regex,
+            word,
+            ignore_case,
+            rules,
+        )
+    )
+
+
+def iter_replace(
+    fs: SafeFileSystem,
+    search: str | None,
+    replace: str | None,
+    glob: str = "*",
+    dry_run: bool = True,
+    transaction: bool = False,
+    jobs: int = 1,
+    regex: bool = False,
+    word: bool = False,
+    ignore_case: bool = False,
+    rules: list[tuple[str, str]] | None = None,
+) -> Iterator[str]:
+    """Yield the preview, or each modified file as it is written."""
+    rewriter = Rewriter(
+        [(search, replace)] if rules is None else rules, regex, word, ignore_case
+    )
+    label = f"'{search}'" if rules is None else f"{len(rules)} rule(s)"
+
     files = sorted(fs.list_files(glob))
-    modified_files = []
-    diffs = []
+    if dry_run:
+        yield from iter_preview(fs, files, rewriter, f"{label} in {glob}")
+        return
+
+    if transaction:
+        staged = stage_replacements(fs, files, rewriter, jobs)
+        commit_transaction(fs, staged)
+        modified = [file for file, _ in staged]
+        yield "".join(f"Modified: {file}\n" for file in modified)
+        count = len(modified)
+    else:
+        count = 0
+        for file in files:
+            if stream_replace_file(fs, file, rewriter):
+                count += 1
+                yield f"Modified: {file}\n"
+
+    if not count:
+        yield f"No matches found for {label} in {glob}"
+    else:
+        yield f"{count} file(s) updated."
+
+
+def iter_preview(
+    fs: SafeFileSystem, files: list[str], rewriter: Rewriter, label: str
+) -> Iterator[str]:
+    """Yield the dry-run diff piece by piece, followed by the summary.
+
+    Files are rejected with a bytes search before anything is decoded.
+    """
+    count = 0
 
     for file in files:
-        og_content = fs.read_file(file).decode("utf-8")
-        new_content = og_content.replace(search, replace)
+        raw = fs.read_file(file)
+        if not rewriter.may_match(raw) or skip_binary(raw):
+            continue
+        with phase("decode"):
+            text = raw.decode("utf-8")
+        hunks = timed_iter("diff", iter_hunks(text, rewriter.matches))
+        first = next(hunks, None)
+        if first is None:
+            continue
+        if count:
+            yield "\n"
+        count += 1
+        yield f"--- {file}\n+++ {file}\n"
+        yield first
+        yield from hunks
+
+    if not count:
+        yield f"No matches found for {label}"
+    else:
+        yield f"\n\nWould modify {count} file(s). Use --apply to make changes."
+
 
-        if og_content == new_content:
+Change = tuple[int, int, int, int, str]
+
+
+def iter_changes(
+    text: str, matches: Iterable[tuple[int, int, str]]
+) -> Iterator[Change]:
+    """Yield (first_line, last_line, start, end, new) for each run of changed lines.
+
+    start and end are the offsets of the whole lines covered by the matches
+    and new is the replaced text of those lines. Matches on the same or
+    adjacent lines are merged into one change. A match that ends with a
+    newline joins the following line onto its replacement, unless that
+    replacement also ends a line, so the change covers that line too.
+    """
+    line = scanned = 0
+    current = None
+    pieces: list[str] = []
+    cursor = 0
+    # Whether the replaced text so far ends at a line boundary.
+    ends_line = True
+
+    for pos, match_end, replacement in matches:
+        line += text.count("\n", scanned, pos)
+        scanned = pos
+        first = line
+        last = first + text.count("\n", pos, match_end - 1)
+        newline = text.find("\n", max(pos, match_end - 1))
+        end = newline + 1 if newline != -1 else len(text)
+
+        if current is not None and first <= current[1] + 1:
+            current = (current[0], last, current[2], end)
+        else:
+            if current is not None:
+                pieces.append(text[cursor : current[3]])
+                yield *current, "".join(pieces)
+            current = (first, last, text.rfind("\n", 0, pos) + 1, end)
+            pieces = []
+            cursor = current[2]
+            ends_line = True
+        kept = text[cursor:pos]
+        pieces.append(kept)
+        pieces.append(replacement)
+        cursor = match_end
+        if replacement or kept:
+            ends_line = (replacement or kept).endswith("\n")
+
+        if end == match_end < len(text) and not ends_line:
+            newline = text.find("\n", end)
+            end = newline + 1 if newline != -1 else len(text)
+            current = (current[0], last + 1, current[2], end)
+
+    if current is not None:
+        pieces.append(text[cursor : current[3]])
+        yield *current, "".join(pieces)
+
+
+def iter_hunks(
+    text: str,
+    matches: Callable[[str], Iterable[tuple[int, int, str]]],
+    context: int = DIFF_CONTEXT,
+) -> Iterator[str]:
+    """Yield unified diff hunks built straight from the match offsets.
+
+    Changes separated by at most 2 * context unchanged lines share a hunk,
+    like difflib.unified_diff. Replacements that leave a line unchanged
+    produce no hunk.
+    """
+    delta = 0
+    hunk: list[Change] = []
+
+    for change in iter_changes(text, matches(text)):
+        if text[change[2] : change[3]] == change[4]:
             continue
+        if hunk and change[0] - hunk[-1][1] - 1 > 2 * context:
+            lines, delta = format_hunk(text, hunk, context, delta)
+            yield lines
+            hunk = []
+        hunk.append(change)
 
-        modified_files.append(file)
+    if hunk:
+        yield format_hunk(text, hunk, context, delta)[0]
 
-        old_lines = og_content.splitlines(keepends=True)
-        new_lines = new_content.splitlines(keepends=True)
 
-        diff = difflib.unified_diff(old_lines, new_lines, fromfile=file, tofile=file)
-        diffs.append("".join(diff))
+def format_hunk(
+    text: str, changes: list[Change], context: int, delta: int
+) -> tuple[str, int]:
+    """Format one hunk; returns it with the running line count delta."""
+    start = changes[0][2]
+    before = 0
+    while before < context and start > 0:
+        start = text.rfind("\n", 0, start - 1) + 1
+        before += 1
 
-        if not dry_run:
-            fs.write_file(file, new_content.encode("utf-8"))
+    end = changes[-1][3]
+    after = 0
+    while after < context and end < len(text):
+        newline = text.find("\n", end)
+        end = newline + 1 if newline != -1 else len(text)
+        after += 1
 
-    if not modified_files:
-        return f"No matches found for '{search}' in {glob}"
+    leading = split_lines(text[start : changes[0][2]])
+    body = [diff_line(" ", line) for line in leading]
+    old_count = new_count = before + after
+    for i, (_, _, block_start, block_end, replaced) in enumerate(changes):
+        if i:
+            gap = split_lines(text[changes[i - 1][3] : block_start])
+            body.extend(diff_line(" ", line) for line in gap)
+            old_count += len(gap)
+            new_count += len(gap)
+        old = split_lines(text[block_start:block_end])
+        new = split_lines(replaced)
+        body.extend(diff_line("-", line) for line in old)
+        body.extend(diff_line("+", line) for line in new)
+        old_count += len(old)
+        new_count += len(new)
+    trailing = split_lines(text[changes[-1][3] : end])
+    body.extend(diff_line(" ", line) for line in trailing)
 
-    if dry_run:
-        diff_output = "\n".join(diffs)
-        return f"{diff_output}\n\nWould modify {len(modified_files)} file(s). Use --apply to make changes."
-    else:
-        files_list = "\n".join(f"Modified: {f}" for f in modified_files)
-        return f"{files_list}\n{len(modified_files)} file(s) updated."
+    old_start = changes[0][0] - before
+    header = (
+        f"@@ -{format_range(old_start, old_count)}"
+        f" +{format_range(old_start + delta, new_count)} @@\n"
+    )
+    return header + "".join(body), delta + new_count - old_count
+
+
+def format_range(start: int, length: int) -> str:
+    """Format a hunk range the way difflib.unified_diff does."""
+    if length == 1:
+        return f"{start + 1}"
+    if not length:
+        return f"{start},0"
+    return f"{start + 1},{length}"
+
+
+def split_lines(text: str) -> list[str]:
+    """Split on newlines only, keeping them, so offsets and line counts agree."""
+    lines = [line + "\n" for line in text.split("\n")]
+    lines[-1] = lines[-1][:-1]
+    if not lines[-1]:
+        lines.pop()
+    return lines
+
+
+def diff_line(prefix: str, line: str) -> str:
+    if line.endswith("\n"):
+        return prefix + line
+    return f"{prefix}{line}\n\\ No newline at end of file\n"
+
+
+def rollback_command(fs: SafeFileSystem) -> str:
+    restored = rollback_transaction(fs)
+    files_list = "".join(f"Restored: {f}\n" for f in restored)
+    return f"{files_list}{len(restored)} file(s) restored."
+
+
+def stream_replace_file(fs: SafeFileSystem, file: str, rewriter: Rewriter) -> bool:
+    """Rewrite a file through an atomic temp file.
+
+    Returns whether the file was modified.
+    """
+    writer = stage_replacement(fs, file, rewriter)
+    if writer is None:
+        return False
+    writer.commit()
+    return True
+
+
+def stage_replacement(
+    fs: SafeFileSystem, file: str, rewriter: Rewriter
+) -> AtomicWriter | None:
+    """Write the replaced content of a file to a prepared, uncommitted temp file.
+
+    Files without a match (or binary files) get no temp file and None is
+    returned. A single literal rule is streamed in chunks; anything else
+    (regex, word or case-insensitive matching, several rules) rewrites the
+    decoded file in one pass.
+    """
+    if rewriter.plain is not None:
+        search, replace = (s.encode("utf-8") for s in rewriter.plain)
+        return stage_stream_replacement(fs, file, search, replace)
+
+    raw = fs.read_file(file)
+    if not rewriter.may_match(raw) or skip_binary(raw):
+        return None
+    with phase("decode"):
+        text = raw.decode("utf-8")
+    with phase("match"):
+        new_text, _ = rewriter.sub(text)
+    if new_text == text:
+        return None
+
+    writer = fs.atomic_writer(file)
+    try:
+        writer.write(new_text.encode("utf-8"))
+        writer.prepare()
+    except BaseException:
+        writer.abort()
+        raise
+    return writer
+
+
+def stage_stream_replacement(
+    fs: SafeFileSystem, file: str, search: bytes, replace: bytes
+) -> AtomicWriter | None:
+    """Stage a literal replacement in chunks, using constant memory.
+
+    A first streaming pass checks for a match, so files without one get no
+    temp file.
+    """
+    chunks = fs.iter_chunks(file)
+    first = next(chunks, None)
+    if first is None or skip_binary(bytes(first[:BINARY_SAMPLE_SIZE])):
+        chunks.close()
+        return None
+    with phase("match"):
+        found = stream_contains(chain([first], chunks), search)
+    if not found:
+        return None
+
+    writer = fs.atomic_writer(file)
+    try:
+        with phase("match"):
+            replace_chunks(fs.iter_chunks(file), search, replace, writer.write)
+        writer.prepare()
+    except BaseException:
+        writer.abort()
+        raise
+    return writer
+
+
+def skip_binary(data: bytes) -> bool:
+    """is_binary(), counting the files it rules out."""
+    if is_binary(data):
+        count("files_skipped_binary")
+        return True
+    return False
+
+
+def stage_replacements(
+    fs: SafeFileSystem, files: list[str], rewriter: Rewriter, jobs: int
+) -> list[tuple[str, AtomicWriter]]:
+    """Stage every file in parallel; on any failure remove all temp files."""
+
+    def stage(file: str) -> tuple[AtomicWriter | None, BaseException | None]:
+        try:
+            return stage_replacement(fs, file, rewriter), None
+        except Exception as e:
+            return None, e
+
+    results = list(ordered_map(stage, files, worker_count(jobs), "thread"))
+    staged = [(file, writer) for file, (writer, _) in zip(files, results) if writer]
+
+    errors = [error for _, error in results if error is not None]
+    if errors:
+        for _, writer in staged:
+            writer.abort()
+        raise errors[0]
+    return staged
+
+
+def stream_contains(chunks: Iterable[bytes], search: bytes) -> bool:
+    """Check for search in a chunk stream, including across chunk boundaries."""
+    carry = b""
+    for chunk in chunks:
+        data = carry + bytes(chunk)
+        if search in data:
+            return True
+        carry = data[max(0, len(data) - len(search) + 1) :]
+    return False
+
+
+def replace_chunks(
+    chunks: Iterable[bytes],
+    search: bytes,
+    replace: bytes,
+    write: Callable[[bytes], object],
+) -> int:
+    """Stream non-overlapping, left-to-right replacements (like str.replace).
+
+    The last len(search) - 1 bytes of each chunk are carried into the next
+    one, so matches straddling a chunk boundary are still replaced.
+    """
+    keep = len(search) - 1
+    count = 0
+    carry = b""
+
+    for chunk in chunks:
+        data = carry + bytes(chunk)
+        pos = 0
+        while True:
+            found = data.find(search, pos)
+            if found == -1:
+                break
+            write(data[pos:found])
+            write(replace)
+            count += 1
+            pos = found + len(search)
+
+        safe_end = max(pos, len(data) - keep)
+        write(data[pos:safe_end])
+        carry = data[safe_end:]
+
+    write(carry)
+    return count
@@ -12,3 +12,23 @@ class BinaryFileError(Exception):
 
 class InvalidJSONError(Exception):
     """Raised when JSON is invalid"""
+
+
+class ChecksumMismatchError(Exception):
+    """Raised when files do not match the digests recorded in a manifest"""
+
+
+class TransactionError(Exception):
+    """Raised when a replace transaction cannot be committed or rolled back"""
+
+
+class BatchError(Exception):
+    """Raised after a batch run in which some jobs failed"""
+
+
+class ServeError(Exception):
+    """Raised when a command sent to the serve daemon fails"""
+
+
+class WrongRootError(ServeError):
+    """Raised when the serve daemon serves a different workspace root"""
@@ -1,12 +1,124 @@
 from exceptions import PathTraversalError, SymLinkNotAllowedError
+from instrumentation import count, phase, timed_iter
+from collections import OrderedDict
 from pathlib import Path
-from typing import List
-import glob
+from typing import TYPE_CHECKING, Iterable, Iterator, List
+from walker import IgnoreRules, ScanCache, walk
+import errno
+import mmap
+import os
+import stat as stat_module
+import threading
+
+if TYPE_CHECKING:
+    from matcher import BinaryCache
+
+CHUNK_SIZE = 1024 * 1024
+STATE_DIR = ".safe-toolkit"
+
+# openat()-style resolution needs dir_fd support plus O_NOFOLLOW/O_DIRECTORY.
+SUPPORTS_DIR_FD = (
+    os.open in os.supports_dir_fd
+    and os.stat in os.supports_dir_fd
+    and hasattr(os, "O_NOFOLLOW")
+    and hasattr(os, "O_DIRECTORY")
+)
+O_CLOEXEC = getattr(os, "O_CLOEXEC", 0)
+# Most directory fds kept open per instance, least recently used first out.
+# Lowered to an eighth of RLIMIT_NOFILE, so files, sockets and worker pipes
+# still have room.
+MAX_DIR_FDS = 256
+
+
+def dir_fd_limit() -> int:
+    try:
+        import resource
+
+        soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    except (ImportError, OSError, ValueError):
+        return MAX_DIR_FDS
+    if soft == resource.RLIM_INFINITY:
+        return MAX_DIR_FDS
+    return max(4, min(MAX_DIR_FDS, soft // 8))
 
 
 class SafeFileSystem:
-    def __init__(self, root: str):
+    def __init__(
+        self,
+        root: str,
+        exclude: Iterable[str] = (),
+        use_ignore_files: bool = False,
+        scan_cache: ScanCache | None = None,
+        binary_cache: "BinaryCache | None" = None,
+    ):
         self.root = Path(root).resolve()
+        self.use_ignore_files = use_ignore_files
+        self.ignore_rules = IgnoreRules().extend("", list(exclude))
+        # Directory listings shared by every walk, for long-lived instances.
+        self.scan_cache = scan_cache
+        # Files already found to be binary, so grep can skip them unread.
+        self.binary_cache = binary_cache
+        self._init_fd_cache()
+
+    def _init_fd_cache(self) -> None:
+        # Ordered from least to most recently used. Opening a directory also
+        # marks its parents used, so eviction takes leaves before the parent
+        # chains that new directories are opened through.
+        self._dir_fds: OrderedDict[tuple[str, ...], int] = OrderedDict()
+        self._max_dir_fds = dir_fd_limit()
+        # Generation in which each cached fd was last found current.
+        self._checked: dict[tuple[str, ...], int] = {}
+        self._generation = 0
+        # Callers currently using each fd, which must not be closed under
+        # them; an evicted or stale fd is retired until its last release.
+        self._pins: dict[int, int] = {}
+        self._retired_fds: set[int] = set()
+        self._fd_lock = threading.Lock()
+
+    def __getstate__(self) -> dict:
+        # Directory fds are per-process; workers rebuild their own cache.
+        state = self.__dict__.copy()
+        for name in (
+            "_dir_fds",
+            "_max_dir_fds",
+            "_checked",
+            "_generation",
+            "_pins",
+            "_retired_fds",
+            "_fd_lock",
+        ):
+            del state[name]
+        state["scan_cache"] = state["binary_cache"] = None
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._init_fd_cache()
+
+    def __enter__(self) -> "SafeFileSystem":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Close the directory fds cached by open_fd()."""
+        with self._fd_lock:
+            for fd in [*self._dir_fds.values(), *self._retired_fds]:
+                os.close(fd)
+            self._dir_fds.clear()
+            self._checked.clear()
+            self._pins.clear()
+            self._retired_fds.clear()
+
+    def refresh(self) -> None:
+        """Check each cached directory fd against the tree before its next use.
+
+        Long-lived instances call this as each operation starts, so that a
+        directory renamed or replaced since then is opened again. Each fd
+        is checked once per refresh, with one stat and one fstat.
+        """
+        self._generation += 1
 
     def validate_path(self, target_path: str, must_exist: bool = True) -> str:
         target = self.root / target_path
@@ -24,26 +136,532 @@ class SafeFileSystem:
 
         return absolute_target
 
+    def _components(self, target_path: str) -> list[str]:
+        """Split a path into components below the root, resolving ".." lexically.
+
+        Symlinks are never followed, so lexical resolution matches what the
+        kernel would resolve.
+        """
+        path = os.fspath(target_path)
+        if os.path.isabs(path):
+            relative = os.path.relpath(os.path.normpath(path), self.root)
+            if relative == os.pardir or relative.startswith(os.pardir + os.sep):
+                raise PathTraversalError(f"Path traversal detected: {path}")
+            path = relative
+
+        parts = []
+        for part in path.replace(os.sep, "/").split("/"):
+            if part in ("", "."):
+                continue
+            if part == "..":
+                if not parts:
+                    raise PathTraversalError(
+                        f"Path traversal detected: {self.root / target_path}"
+                    )
+                parts.pop()
+            else:
+                parts.append(part)
+        return parts
+
+    def _dir_fd(self, parts: tuple[str, ...], target_path: str) -> int:
+        """Return an fd for a directory below the root, opening each level once.
+
+        The fd stays open until it is passed to _release().
+        """
+        generation = self._generation
+        with self._fd_lock:
+            cached = self._dir_fds.get(parts)
+            if cached is not None:
+                self._pin(cached)
+                if self._checked.get(parts) == generation:
+                    self._dir_fds.move_to_end(parts)
+                    return cached
+
+        try:
+            if cached is not None and self._is_current(parts, cached, target_path):
+                with self._fd_lock:
+                    self._checked[parts] = generation
+                    self._mark_used(parts)
+                return cached
+
+            if not parts:
+                fd = os.open(self.root, os.O_RDONLY | os.O_DIRECTORY | O_CLOEXEC)
+            else:
+                parent = self._dir_fd(parts[:-1], target_path)
+                flags = os.O_RDONLY | os.O_DIRECTORY | os.O_NOFOLLOW | O_CLOEXEC
+                try:
+                    fd = self._open_component(parts[-1], flags, parent, target_path)
+                finally:
+                    self._release(parent)
+        except BaseException:
+            if cached is not None:
+                self._release(cached)
+            raise
+
+        with self._fd_lock:
+            if cached is not None:
+                self._unpin(cached)
+            existing = self._dir_fds.get(parts)
+            if existing is not None and existing != cached:
+                self._pin(existing)
+                self._mark_used(parts)
+            else:
+                if existing is not None:
+                    self._retire(existing)
+                self._dir_fds[parts] = fd
+                self._checked[parts] = generation
+                self._pin(fd)
+                self._mark_used(parts)
+                while len(self._dir_fds) > self._max_dir_fds:
+                    evicted, old = self._dir_fds.popitem(last=False)
+                    del self._checked[evicted]
+                    self._retire(old)
+                return fd
+        os.close(fd)
+        return existing
+
+    def _release(self, fd: int) -> None:
+        """Give back an fd from _dir_fd(), closing it if it was retired."""
+        with self._fd_lock:
+            self._unpin(fd)
+
+    # The helpers below are called with _fd_lock held.
+
+    def _pin(self, fd: int) -> None:
+        self._pins[fd] = self._pins.get(fd, 0) + 1
+
+    def _unpin(self, fd: int) -> None:
+        pins = self._pins.pop(fd) - 1
+        if pins:
+            self._pins[fd] = pins
+        elif fd in self._retired_fds:
+            self._retired_fds.remove(fd)
+            os.close(fd)
+
+    def _retire(self, fd: int) -> None:
+        if fd in self._pins:
+            self._retired_fds.add(fd)
+        else:
+            os.close(fd)
+
+    def _mark_used(self, parts: tuple[str, ...]) -> None:
+        # Deepest first, so each directory ends up newer than its children.
+        for depth in range(len(parts), -1, -1):
+            if parts[:depth] in self._dir_fds:
+                self._dir_fds.move_to_end(parts[:depth])
+
+    def _is_current(self, parts: tuple[str, ...], fd: int, target_path: str) -> bool:
+        """Whether a cached directory fd is still the directory at its path."""
+        try:
+            if not parts:
+                current = os.stat(self.root)
+            else:
+                parent = self._dir_fd(parts[:-1], target_path)
+                try:
+                    current = os.stat(parts[-1], dir_fd=parent, follow_symlinks=False)
+                finally:
+                    self._release(parent)
+        except FileNotFoundError:
+            return False
+        opened = os.fstat(fd)
+        return (current.st_dev, current.st_ino) == (opened.st_dev, opened.st_ino)
+
+    def _open_component(
+        self, name: str, flags: int, dir_fd: int, target_path: str
+    ) -> int:
+        try:
+            return os.open(name, flags, 0o666, dir_fd=dir_fd)
+        except OSError as e:
+            # O_NOFOLLOW reports a symlink as ELOOP, or as ENOTDIR when
+            # combined with O_DIRECTORY.
+            if e.errno == errno.ELOOP or (
+                e.errno == errno.ENOTDIR and self._is_symlink(name, dir_fd)
+            ):
+                raise SymLinkNotAllowedError(
+                    f"Symbolic link not allowed: {target_path}"
+                ) from None
+            if e.errno == errno.ENOENT:
+                raise FileNotFoundError(f"Not found: {target_path}") from None
+            raise
+
+    def _is_symlink(self, name: str, dir_fd: int) -> bool:
+        try:
+            result = os.stat(name, dir_fd=dir_fd, follow_symlinks=False)
+        except OSError:
+            return False
+        return stat_module.S_ISLNK(result.st_mode)
+
+    def open_fd(self, target_path: str, flags: int = os.O_RDONLY) -> int:
+        """Open a file below the root without following any symlink.
+
+        The path is walked component by component from the root with
+        O_NOFOLLOW, so there is no window between validation and use. The
+        caller owns the returned fd.
+        """
+        if not SUPPORTS_DIR_FD:
+            with phase("validate"):
+                valid_path = self.validate_path(
+                    target_path, must_exist=not flags & os.O_CREAT
+                )
+            with phase("open"):
+                return os.open(valid_path, flags | O_CLOEXEC, 0o666)
+
+        with phase("validate"):
+            parts = self._components(target_path)
+            dir_fd = self._dir_fd(tuple(parts[:-1]), target_path)
+        try:
+            if not parts:
+                return os.dup(dir_fd)
+            flags |= os.O_NOFOLLOW | O_CLOEXEC
+            with phase("open"):
+                return self._open_component(parts[-1], flags, dir_fd, target_path)
+        finally:
+            self._release(dir_fd)
+
     def read_file(self, target_path: str) -> bytes:
-        valid_path = self.validate_path(target_path)
-        return valid_path.read_bytes()
+        with open(self.open_fd(target_path), "rb") as f, phase("read"):
+            data = f.read()
+        count("bytes_read", len(data))
+        return data
 
-    def list_files(self, pattern: str = "*") -> List[str]:
-        matched_paths = self.root.glob(pattern)
+    def read_range(self, target_path: str, offset: int, length: int) -> bytes:
+        """Read up to length bytes starting at offset (short only at EOF)."""
+        with open(self.open_fd(target_path), "rb") as f, phase("read"):
+            f.seek(offset)
+            data = f.read(length)
+        count("bytes_read", len(data))
+        return data
 
-        result = []
+    def stat(self, target_path: str) -> os.stat_result:
+        if not SUPPORTS_DIR_FD:
+            valid_path = self.validate_path(target_path)
+            return os.stat(valid_path, follow_symlinks=False)
 
-        for path in matched_paths:
-            resolved = path.resolve()
-            if not resolved.is_relative_to(self.root):
-                print(f"Skipping path outside root: {resolved}")
-                continue
+        parts = self._components(target_path)
+        if not parts:
+            return os.stat(self.root)
+
+        dir_fd = self._dir_fd(tuple(parts[:-1]), target_path)
+        try:
+            result = os.stat(parts[-1], dir_fd=dir_fd, follow_symlinks=False)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Not found: {target_path}") from None
+        finally:
+            self._release(dir_fd)
 
-            if path.is_file():
-                relative_path = path.relative_to(self.root)
-                result.append(str(relative_path))
+        if stat_module.S_ISLNK(result.st_mode):
+            raise SymLinkNotAllowedError(f"Symbolic link not allowed: {target_path}")
         return result
 
+    def state_path(self, name: str, create: bool = True) -> Path:
+        """Return a path inside the toolkit's state directory under the root."""
+        if create:
+            state_dir = self.validate_path(STATE_DIR, must_exist=False)
+            state_dir.mkdir(exist_ok=True)
+        return self.validate_path(f"{STATE_DIR}/{name}", must_exist=False)
+
+    def iter_chunks(
+        self,
+        target_path: str,
+        chunk_size: int = CHUNK_SIZE,
+        use_mmap: bool = False,
+        offset: int = 0,
+        length: int | None = None,
+    ) -> Iterator[memoryview]:
+        """Yield the file in chunks without loading it into memory.
+
+        Only the range starting at offset (up to length bytes, or to EOF) is
+        read. The default path reuses one preallocated buffer via readinto(),
+        so each yielded view is only valid until the next one is requested.
+        """
+        with open(self.open_fd(target_path), "rb", buffering=0) as f:
+            if use_mmap:
+                yield from self._iter_mmap_chunks(
+                    f.fileno(), chunk_size, offset, length
+                )
+                return
+
+            if offset:
+                f.seek(offset)
+            remaining = length
+            view = memoryview(bytearray(chunk_size))
+            while remaining is None or remaining > 0:
+                with phase("read"):
+                    read = f.readinto(view if remaining is None else view[:remaining])
+                if not read:
+                    break
+                count("bytes_read", read)
+                if remaining is not None:
+                    remaining -= read
+                yield view[:read]
+
+    def _iter_mmap_chunks(
+        self, fd: int, chunk_size: int, offset: int = 0, length: int | None = None
+    ) -> Iterator[memoryview]:
+        size = os.fstat(fd).st_size
+        end = size if length is None else min(size, offset + length)
+        if offset >= end:
+            return
+
+        with mmap.mmap(fd, 0, access=mmap.ACCESS_READ) as mapped:
+            for start in range(offset, end, chunk_size):
+                stop = min(start + chunk_size, end)
+                count("bytes_read", stop - start)
+                with memoryview(mapped)[start:stop] as chunk:
+                    yield chunk
+
+    def walk_files(self, pattern: str = "*") -> Iterator[tuple[str, os.DirEntry]]:
+        """Lazily yield (relative path, DirEntry) for files matching the glob."""
+        return timed_iter(
+            "enumerate",
+            walk(
+                str(self.root),
+                pattern,
+                self.ignore_rules,
+                self.use_ignore_files,
+                frozenset([STATE_DIR]),
+                self.scan_cache,
+            ),
+        )
+
+    def list_files(self, pattern: str = "*") -> List[str]:
+        return [path for path, _ in self.walk_files(pattern)]
+
     def write_file(self, target_path: str, content: bytes) -> None:
-        valid_path = self.validate_path(target_path, must_exist=False)
-        valid_path.write_bytes(content)
+        with self.atomic_writer(target_path) as writer:
+            writer.write(content)
+
+    def atomic_writer(self, target_path: str) -> "AtomicWriter":
+        """Write a file via a temp file in the same directory and os.replace().
+
+        An existing file's permission bits are kept. Readers see either the
+        old or the new content, never a partial write.
+        """
+        if not SUPPORTS_DIR_FD:
+            valid_path = self.validate_path(target_path, must_exist=False)
+            rel_dir = valid_path.parent.relative_to(self.root).as_posix()
+            return AtomicWriter(
+                None,
+                str(valid_path.parent),
+                valid_path.name,
+                "" if rel_dir == "." else rel_dir,
+            )
+
+        dir_fd, name = self._locate(target_path)
+        parts = self._components(target_path)
+        try:
+            return AtomicWriter(dir_fd, None, name, "/".join(parts[:-1]), fs=self)
+        except BaseException:
+            self._release(dir_fd)
+            raise
+
+    def _locate(self, target_path: str) -> tuple[int, str]:
+        """Return (directory fd, name) for a path that must not be a symlink.
+
+        The caller passes the fd to _release() when done with it.
+        """
+        parts = self._components(target_path)
+        if not parts:
+            raise IsADirectoryError(f"Is a directory: {target_path}")
+
+        dir_fd = self._dir_fd(tuple(parts[:-1]), target_path)
+        if self._is_symlink(parts[-1], dir_fd):
+            self._release(dir_fd)
+            raise SymLinkNotAllowedError(f"Symbolic link not allowed: {target_path}")
+        return dir_fd, parts[-1]
+
+    def link(self, source_path: str, link_path: str) -> None:
+        """Create a hard link to source_path at link_path."""
+        if not SUPPORTS_DIR_FD:
+            os.link(
+                self.validate_path(source_path),
+                self.validate_path(link_path, must_exist=False),
+            )
+            return
+
+        src_dir_fd, src_name = self._locate(source_path)
+        try:
+            dst_dir_fd, dst_name = self._locate(link_path)
+            try:
+                os.link(
+                    src_name,
+                    dst_name,
+                    src_dir_fd=src_dir_fd,
+                    dst_dir_fd=dst_dir_fd,
+                    follow_symlinks=False,
+                )
+            finally:
+                self._release(dst_dir_fd)
+        finally:
+            self._release(src_dir_fd)
+
+    def rename(self, source_path: str, target_path: str) -> None:
+        """Atomically move source_path over target_path."""
+        if not SUPPORTS_DIR_FD:
+            os.replace(
+                self.validate_path(source_path),
+                self.validate_path(target_path, must_exist=False),
+            )
+            return
+
+        src_dir_fd, src_name = self._locate(source_path)
+        try:
+            dst_dir_fd, dst_name = self._locate(target_path)
+            try:
+                os.replace(
+                    src_name, dst_name, src_dir_fd=src_dir_fd, dst_dir_fd=dst_dir_fd
+                )
+            finally:
+                self._release(dst_dir_fd)
+        finally:
+            self._release(src_dir_fd)
+
+    def unlink(self, target_path: str) -> None:
+        if not SUPPORTS_DIR_FD:
+            os.unlink(self.validate_path(target_path))
+            return
+
+        dir_fd, name = self._locate(target_path)
+        try:
+            os.unlink(name, dir_fd=dir_fd)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Not found: {target_path}") from None
+        finally:
+            self._release(dir_fd)
+
+
+class AtomicWriter:
+    """Temp file that replaces its target on commit() and is removed on abort().
+
+    Used as a context manager it commits on a clean exit and aborts when an
+    exception escapes, unless abort() was already called.
+
+    With fs, dir_fd is borrowed from that filesystem and given back once the
+    temp file is prepared; the temp file is then renamed or removed by path
+    through fs. Many writers can so be staged at once without keeping a
+    directory fd open for each.
+    """
+
+    def __init__(
+        self,
+        dir_fd: int | None,
+        dir_path: str | None,
+        name: str,
+        rel_dir: str = "",
+        fs: SafeFileSystem | None = None,
+    ):
+        self._dir_fd = dir_fd
+        self._fs = fs
+        self._dir_path = dir_path
+        self._name = name
+        self._rel_dir = rel_dir
+        # os.urandom rather than secrets, which would import hashlib and random.
+        self._temp_name = f".{name}.{os.urandom(6).hex()}.tmp"
+        self.temp_path = f"{rel_dir}/{self._temp_name}" if rel_dir else self._temp_name
+        self._prepared = False
+        self._done = False
+
+        try:
+            mode = stat_module.S_IMODE(self._stat(name).st_mode)
+        except FileNotFoundError:
+            mode = None
+
+        flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | O_CLOEXEC
+        flags |= getattr(os, "O_NOFOLLOW", 0)
+        fd = os.open(self._path(self._temp_name), flags, 0o666, **self._dir_kwargs())
+        if mode is not None:
+            os.fchmod(fd, mode)
+        self.file = open(fd, "wb")
+
+    def _dir_kwargs(self) -> dict:
+        return {} if self._dir_fd is None else {"dir_fd": self._dir_fd}
+
+    def _path(self, name: str) -> str:
+        return name if self._dir_path is None else os.path.join(self._dir_path, name)
+
+    def _stat(self, name: str) -> os.stat_result:
+        return os.stat(self._path(name), follow_symlinks=False, **self._dir_kwargs())
+
+    def write(self, data: bytes) -> int:
+        with phase("write"):
+            written = self.file.write(data)
+        count("bytes_written", written)
+        return written
+
+    def prepare(self) -> None:
+        """Flush, fsync and close the temp file without renaming it."""
+        if self._prepared:
+            return
+        try:
+            with phase("write"):
+                self.file.flush()
+                os.fsync(self.file.fileno())
+                self.file.close()
+        except BaseException:
+            self.abort()
+            raise
+        self._prepared = True
+        self._release_dir()
+
+    def commit(self) -> None:
+        """Prepare the temp file, then atomically rename it into place."""
+        if self._done:
+            return
+        self.prepare()
+        try:
+            with phase("write"):
+                self._replace()
+        except BaseException:
+            self.abort()
+            raise
+        self._done = True
+
+    def _replace(self) -> None:
+        if self._fs is not None:
+            target = f"{self._rel_dir}/{self._name}" if self._rel_dir else self._name
+            self._fs.rename(self.temp_path, target)
+            fd = self._fs.open_fd(self._rel_dir, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            return
+        if self._dir_fd is None:
+            os.replace(self._path(self._temp_name), self._path(self._name))
+            return
+        os.replace(
+            self._temp_name,
+            self._name,
+            src_dir_fd=self._dir_fd,
+            dst_dir_fd=self._dir_fd,
+        )
+        os.fsync(self._dir_fd)
+
+    def abort(self) -> None:
+        if self._done:
+            return
+        self._done = True
+        self.file.close()
+        try:
+            if self._fs is not None and self._dir_fd is None:
+                self._fs.unlink(self.temp_path)
+            else:
+                os.unlink(self._path(self._temp_name), **self._dir_kwargs())
+        except FileNotFoundError:
+            pass
+        finally:
+            self._release_dir()
+
+    def _release_dir(self) -> None:
+        if self._fs is not None and self._dir_fd is not None:
+            self._fs._release(self._dir_fd)
+            self._dir_fd = None
+
+    def __enter__(self) -> "AtomicWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
@@ -0,0 +1,176 @@
+import os
+import threading
+import time
+from contextlib import nullcontext
+from typing import Iterable, Iterator, TypeVar
+
+T = TypeVar("T")
+
+# Shared no-op context manager handed out while instrumentation is off, so
+# a disabled phase() costs one global lookup and a function call.
+NO_PHASE = nullcontext()
+
+_recorder: "Recorder | None" = None
+
+
+class Recorder:
+    """Per-phase times and counts plus named counters for one run.
+
+    Phases may nest (a read inside a parse); each phase is charged only its
+    own time, so the phase times add up to at most the wall time per thread.
+    With trace=True every span is also kept for a Chrome trace.
+    """
+
+    def __init__(self, trace: bool = False):
+        self.start = time.perf_counter()
+        self.phases: dict[str, list] = {}
+        self.counters: dict[str, int] = {}
+        self.events: list[tuple[str, float, float, int]] | None = [] if trace else None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def enter(self) -> None:
+        stack = self._local.__dict__.setdefault("stack", [])
+        stack.append(0.0)
+
+    def exit(self, name: str, start: float, end: float) -> None:
+        stack = self._local.stack
+        elapsed = end - start
+        own = elapsed - stack.pop()
+        if stack:
+            stack[-1] += elapsed
+        with self._lock:
+            stats = self.phases.setdefault(name, [0, 0.0])
+            stats[0] += 1
+            stats[1] += own
+            if self.events is not None:
+                self.events.append((name, start, end, threading.get_ident()))
+
+    def add(self, name: str, amount: int) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+
+class Span:
+    __slots__ = ("recorder", "name", "start")
+
+    def __init__(self, recorder: Recorder, name: str):
+        self.recorder = recorder
+        self.name = name
+
+    def __enter__(self) -> "Span":
+        self.recorder.enter()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.recorder.exit(self.name, self.start, time.perf_counter())
+
+
+def enable(trace: bool = False) -> Recorder:
+    """Start recording for this process and return the recorder."""
+    global _recorder
+    _recorder = Recorder(trace)
+    return _recorder
+
+
+def disable() -> None:
+    global _recorder
+    _recorder = None
+
+
+def phase(name: str) -> Span | nullcontext:
+    """Context manager timing a phase such as "read", "match" or "write"."""
+    recorder = _recorder
+    if recorder is None:
+        return NO_PHASE
+    return Span(recorder, name)
+
+
+def count(name: str, amount: int = 1) -> None:
+    """Add to a counter such as "bytes_read" or "cache_hits"."""
+    recorder = _recorder
+    if recorder is not None:
+        recorder.add(name, amount)
+
+
+def timed_iter(name: str, iterable: Iterable[T]) -> Iterable[T]:
+    """Charge the time spent producing each item of a lazy iterable to a phase.
+
+    When instrumentation is off the iterable is returned untouched.
+    """
+    recorder = _recorder
+    if recorder is None:
+        return iterable
+    return _timed_iter(recorder, name, iter(iterable))
+
+
+def _timed_iter(recorder: Recorder, name: str, iterator: Iterator[T]) -> Iterator[T]:
+    while True:
+        with Span(recorder, name):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+def format_table(recorder: Recorder, total: float) -> str:
+    """Render phases (slowest first) and counters as a plain text table."""
+    lines = [f"{'Phase':<12}{'Calls':>10}{'Time (ms)':>14}{'% of total':>12}"]
+    phases = sorted(recorder.phases.items(), key=lambda item: -item[1][1])
+    for name, (calls, seconds) in phases:
+        share = seconds / total * 100 if total else 0.0
+        lines.append(f"{name:<12}{calls:>10}{seconds * 1000:>14.2f}{share:>11.1f}%")
+    if recorder.counters:
+        lines.append("")
+        width = max(len(name) for name in recorder.counters)
+        for name, value in sorted(recorder.counters.items()):
+            lines.append(f"{name:<{width}}  {value:>12}")
+    return "\n".join(lines)
+
+
+def stats_json(recorder: Recorder, total: float) -> dict:
+    return {
+        "total_ms": round(total * 1000, 3),
+        "phases": {
+            name: {"calls": calls, "ms": round(seconds * 1000, 3)}
+            for name, (calls, seconds) in recorder.phases.items()
+        },
+        "counters": dict(recorder.counters),
+    }
+
+
+def chrome_trace(recorder: Recorder) -> dict:
+    """Build a Chrome trace (chrome://tracing, Perfetto) of the recorded spans.
+
+    Requires a recorder created with trace=True. Counters are attached as a
+    final counter event.
+    """
+    pid = os.getpid()
+    threads: dict[int, int] = {}
+    events = []
+    end = recorder.start
+    for name, start, stop, ident in recorder.events or ():
+        events.append(
+            {
+                "name": name,
+                "ph": "X",
+                "ts": round((start - recorder.start) * 1e6, 3),
+                "dur": round((stop - start) * 1e6, 3),
+                "pid": pid,
+                "tid": threads.setdefault(ident, len(threads)),
+            }
+        )
+        end = max(end, stop)
+    if recorder.counters:
+        events.append(
+            {
+                "name": "counters",
+                "ph": "C",
+                "ts": round((end - recorder.start) * 1e6, 3),
+                "pid": pid,
+                "args": dict(recorder.counters),
+            }
+        )
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
@@ -0,0 +1,100 @@
+import json
+from filesystem import STATE_DIR, AtomicWriter, SafeFileSystem
+from exceptions import TransactionError
+
+JOURNAL_DIR = f"{STATE_DIR}/journal"
+JOURNAL_FILE = f"{JOURNAL_DIR}/journal.json"
+BACKUP_DIR = f"{JOURNAL_DIR}/backups"
+
+
+def commit_transaction(
+    fs: SafeFileSystem, staged: list[tuple[str, AtomicWriter]]
+) -> None:
+    """Swap every staged temp file into place, or none of them.
+
+    The journal is written before anything is renamed. Each original is
+    hard-linked into the journal's backup directory before its replacement
+    is renamed over it, so a failure part-way through (or a later
+    rollback_transaction) can restore every file. Backups are kept until
+    the next transaction or rollback.
+    """
+    previous = read_journal(fs)
+    if previous is not None and previous["state"] == "staged":
+        for _, writer in staged:
+            writer.abort()
+        raise TransactionError(
+            "An interrupted replace transaction is pending; run replace --rollback"
+        )
+    discard_journal(fs, previous)
+
+    fs.state_path("journal/backups", create=True).mkdir(parents=True, exist_ok=True)
+    entries = [
+        {"path": file, "temp": writer.temp_path, "backup": f"{BACKUP_DIR}/{i}"}
+        for i, (file, writer) in enumerate(staged)
+    ]
+    write_journal(fs, "staged", entries)
+
+    try:
+        for entry, (_, writer) in zip(entries, staged):
+            fs.link(entry["path"], entry["backup"])
+            writer.commit()
+    except BaseException:
+        restore_entries(fs, entries)
+        for _, writer in staged:
+            writer.abort()
+        discard_journal(fs, {"entries": entries})
+        raise
+
+    write_journal(fs, "committed", entries)
+
+
+def rollback_transaction(fs: SafeFileSystem) -> list[str]:
+    """Restore the files changed by the last transaction from its backups."""
+    journal = read_journal(fs)
+    if journal is None:
+        raise TransactionError("No replace transaction to roll back")
+
+    restored = restore_entries(fs, journal["entries"])
+    discard_journal(fs, journal)
+    return restored
+
+
+def restore_entries(fs: SafeFileSystem, entries: list[dict]) -> list[str]:
+    restored = []
+    for entry in entries:
+        try:
+            fs.rename(entry["backup"], entry["path"])
+            restored.append(entry["path"])
+        except FileNotFoundError:
+            pass
+        try:
+            fs.unlink(entry["temp"])
+        except FileNotFoundError:
+            pass
+    return restored
+
+
+def read_journal(fs: SafeFileSystem) -> dict | None:
+    try:
+        return json.loads(fs.read_file(JOURNAL_FILE).decode("utf-8"))
+    except FileNotFoundError:
+        return None
+
+
+def write_journal(fs: SafeFileSystem, state: str, entries: list[dict]) -> None:
+    content = json.dumps({"state": state, "entries": entries}, indent=2)
+    fs.write_file(JOURNAL_FILE, content.encode("utf-8"))
+
+
+def discard_journal(fs: SafeFileSystem, journal: dict | None) -> None:
+    if journal is None:
+        return
+    for entry in journal["entries"]:
+        try:
+            fs.unlink(entry["backup"])
+        except FileNotFoundError:
+            pass
+    try:
+        fs.unlink(JOURNAL_FILE)
+    except FileNotFoundError:
+        pass
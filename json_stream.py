@@ -0,0 +1,467 @@
+import codecs
+import json
+import math
+import re
+from typing import Callable, Iterable, Iterator
+
+from exceptions import InvalidJSONError
+
+# Output pieces are handed out joined in groups of this many.
+OUTPUT_BATCH_SIZE = 4096
+# A number ending this close to the end of the buffer may continue ("1" "e+5").
+NUMBER_TAIL = 3
+
+TOKEN = re.compile(
+    r"""[ \t\n\r]*(?:
+        ([{}\[\]:,])
+      | ("(?:[^"\\\x00-\x1f]|\\(?:["\\/bfnrt]|u[0-9a-fA-F]{4}))*")
+      | (-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][-+]?[0-9]+)?)
+      | (true|false|null|NaN|Infinity|-Infinity)
+    )""",
+    re.VERBOSE,
+)
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+# Everything up to the next bracket, with strings taken whole.
+SKIPPABLE = re.compile(r'(?:[^"{}\[\]]+|"(?:[^"\\]|\\.)*")*')
+STRING_PREFIX = re.compile(r'"(?:[^"\\\x00-\x1f]|\\(?:["\\/bfnrt]|u[0-9a-fA-F]{4}))*')
+PARTIAL_ESCAPE = re.compile(r"\\(?:u[0-9a-fA-F]{0,3})?\Z")
+PARTIAL_NUMBER = re.compile(r"-?[0-9]*(?:\.[0-9]*)?(?:[eE][-+]?[0-9]*)?\Z")
+LITERALS = ("true", "false", "null", "NaN", "Infinity", "-Infinity")
+
+# Token groups: 0 is a character that cannot start a token, 1 punctuation.
+INVALID, PUNCTUATION, STRING, NUMBER, LITERAL = range(5)
+EVENT_KINDS = (None, None, "string", "number", "literal")
+
+
+class JSONTokenizer:
+    """Tokenize JSON from a stream of UTF-8 chunks in bounded memory.
+
+    Consumed text is dropped on every refill, so memory is bounded by the
+    chunk size plus the longest single token. Line and column numbers of the
+    dropped text are carried forward for error messages.
+    """
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._token = None
+        self._skip = False
+        self.buffer = ""
+        self.pos = 0
+        self.line = 1
+        self.column = 1
+        self.eof = False
+
+    def __iter__(self) -> Iterator[tuple[int, str]]:
+        """Yield (group, text) pairs; an INVALID token is always the last."""
+        while True:
+            buffer = self.buffer
+            limit = len(buffer) if self.eof else len(buffer) - NUMBER_TAIL
+            for match in iter(TOKEN.scanner(buffer, self.pos).match, None):
+                group = match.lastindex
+                if group == NUMBER and match.end() > limit:
+                    self.pos = match.start()
+                    self._refill()
+                    break
+                self._token = match
+                yield group, match[group]
+                if self._skip:
+                    self.pos = match.end()
+                    self._skip_to_close()
+                    break
+            else:
+                if self._token is not None:
+                    self.pos = self._token.end()
+                    self._token = None
+                self.pos = WHITESPACE.match(buffer, self.pos).end()
+                if not self.eof and self._incomplete():
+                    self._refill()
+                    continue
+                if self.pos == len(buffer):
+                    return
+                if buffer[self.pos] == '"':
+                    self._string_error()
+                yield INVALID, buffer[self.pos]
+                return
+
+    def skip_container(self) -> None:
+        """Skip the rest of the innermost open container without tokenizing it.
+
+        Call right after an opening bracket or a complete value was produced.
+        The next token is then the container's closing bracket. Skipped text
+        is only scanned for brackets and strings, not validated.
+        """
+        self._skip = True
+
+    def _skip_to_close(self) -> None:
+        self._skip = False
+        depth = 1
+        while True:
+            self.pos = SKIPPABLE.match(self.buffer, self.pos).end()
+            if self.pos == len(self.buffer) or self.buffer[self.pos] == '"':
+                # Out of text, or a string that continues in the next chunk.
+                if self.eof:
+                    return
+                self._refill()
+                continue
+            if self.buffer[self.pos] in "{[":
+                depth += 1
+            else:
+                depth -= 1
+                if not depth:
+                    return
+            self.pos += 1
+
+    def _incomplete(self) -> bool:
+        rest = self.buffer[self.pos :]
+        if not rest:
+            return True
+        if rest[0] == '"':
+            end = STRING_PREFIX.match(rest).end()
+            return end == len(rest) or PARTIAL_ESCAPE.match(rest, end) is not None
+        if rest[0] in "-0123456789" and PARTIAL_NUMBER.match(rest):
+            return True
+        return any(literal.startswith(rest) for literal in LITERALS)
+
+    def _refill(self) -> None:
+        newlines = self.buffer.count("\n", 0, self.pos)
+        if newlines:
+            self.line += newlines
+            self.column = self.pos - self.buffer.rfind("\n", 0, self.pos)
+        else:
+            self.column += self.pos
+        self.buffer = self.buffer[self.pos :]
+        self.pos = 0
+        self._token = None
+
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            self.buffer += self._decoder.decode(b"", final=True)
+            self.eof = True
+        else:
+            self.buffer += self._decoder.decode(chunk)
+
+    def _string_error(self) -> None:
+        end = STRING_PREFIX.match(self.buffer, self.pos).end()
+        if end == len(self.buffer):
+            self.fail("Unterminated string starting at")
+        self.pos = end
+        if self.buffer.startswith("\\u", end):
+            self.pos = end + 1
+            self.fail("Invalid \\uXXXX escape")
+        if self.buffer[end] == "\\":
+            self.fail("Invalid \\escape")
+        self.fail("Invalid control character at")
+
+    def fail(self, message: str) -> None:
+        """Raise InvalidJSONError at the last token, or where scanning stopped."""
+        if self._token is not None:
+            position = self._token.start(self._token.lastindex)
+        else:
+            position = self.pos
+        newline = self.buffer.rfind("\n", 0, position)
+        if newline == -1:
+            line, column = self.line, self.column + position
+        else:
+            line = self.line + self.buffer.count("\n", 0, position)
+            column = position - newline
+        raise InvalidJSONError(
+            f"Invalid JSON: {message} at line {line}, column {column}"
+        )
+
+
+def iter_events(tokens: JSONTokenizer) -> Iterator[tuple[str, str]]:
+    """Check the JSON grammar and yield (event, text) pairs.
+
+    Events are the brackets themselves, "key" (text is the raw JSON string)
+    and "string", "number" or "literal" for raw JSON scalars. Errors use the
+    same messages as json.loads.
+    """
+    stack: list[str] = []
+    expecting = "value"
+
+    for group, text in tokens:
+        kind = text if group == PUNCTUATION else EVENT_KINDS[group]
+
+        if expecting == "value" or expecting == "first value":
+            if kind == "{":
+                stack.append("}")
+                yield kind, text
+                expecting = "first key"
+                continue
+            if kind == "[":
+                stack.append("]")
+                yield kind, text
+                expecting = "first value"
+                continue
+            if group <= PUNCTUATION:
+                if kind != "]" or expecting == "value":
+                    tokens.fail("Expecting value")
+                stack.pop()
+        elif expecting == ",":
+            if kind == ",":
+                expecting = "key" if stack[-1] == "}" else "value"
+                continue
+            if kind != stack[-1]:
+                tokens.fail("Expecting ',' delimiter")
+            stack.pop()
+        elif expecting == "key" or expecting == "first key":
+            if group == STRING:
+                yield "key", text
+                expecting = ":"
+                continue
+            if kind != "}" or expecting == "key":
+                tokens.fail("Expecting property name enclosed in double quotes")
+            stack.pop()
+        elif expecting == ":":
+            if kind != ":":
+                tokens.fail("Expecting ':' delimiter")
+            expecting = "value"
+            continue
+        else:
+            tokens.fail("Extra data")
+
+        yield kind, text
+        expecting = "," if stack else "end"
+
+    if expecting != "end":
+        tokens.fail(EOF_MESSAGES[expecting])
+
+
+EOF_MESSAGES = {
+    "value": "Expecting value",
+    "first value": "Expecting value",
+    "key": "Expecting property name enclosed in double quotes",
+    "first key": "Expecting property name enclosed in double quotes",
+    ":": "Expecting ':' delimiter",
+    ",": "Expecting ',' delimiter",
+}
+
+
+def iter_pretty(events: Iterable[tuple[str, str]], indent: int = 2) -> Iterator[str]:
+    """Re-indent an event stream exactly like json.dumps(..., indent=indent)."""
+    depth = 0
+    opened = None
+    after_key = False
+    newlines = ["\n"]
+
+    for event, text in events:
+        if event == "}" or event == "]":
+            depth -= 1
+            if opened is not None:
+                yield opened + event
+                opened = None
+            else:
+                yield newlines[depth] + event
+            continue
+
+        if after_key:
+            prefix = ""
+            after_key = False
+        elif opened is not None:
+            if depth == len(newlines):
+                newlines.append("\n" + " " * (indent * depth))
+            prefix = opened + newlines[depth]
+            opened = None
+        elif depth:
+            prefix = "," + newlines[depth]
+        else:
+            prefix = ""
+
+        if event == "key":
+            yield prefix + format_scalar("string", text) + ": "
+            after_key = True
+        elif event == "{" or event == "[":
+            if prefix:
+                yield prefix
+            opened = event
+            depth += 1
+        else:
+            yield prefix + format_scalar(event, text)
+
+
+def format_scalar(kind: str, text: str) -> str:
+    """Format one raw JSON scalar the way json.dumps would."""
+    if kind == "string":
+        if text.isascii() and "\\" not in text:
+            return text
+        return json.dumps(json.loads(text))
+    if kind == "number":
+        if "." in text or "e" in text or "E" in text:
+            value = float(text)
+            return repr(value) if math.isfinite(value) else json.dumps(value)
+        return "0" if text == "-0" else text
+    return text
+
+
+def batched_text(pieces: Iterable[str], size: int = OUTPUT_BATCH_SIZE) -> Iterator[str]:
+    """Join small output pieces into larger strings, size pieces at a time."""
+    batch: list[str] = []
+    append = batch.append
+    for piece in pieces:
+        append(piece)
+        if len(batch) >= size:
+            yield "".join(batch)
+            batch.clear()
+    if batch:
+        yield "".join(batch)
+
+
+PATH_STEP = re.compile(
+    r"""\.\*|\[\*\]                       # wildcard
+      | \.([^.\[\]"*][^.\[\]"]*)          # .name
+      | \[([0-9]+)\]                      # [3]
+      | \[("(?:[^"\\]|\\.)*")\]           # ["any key"]
+    """,
+    re.VERBOSE,
+)
+WILDCARD = None
+
+
+def parse_path(expr: str) -> list[str | int | None]:
+    """Parse a path like .company.departments[3], ["a key"] or .items[*].id.
+
+    Returns a list of steps: str for object keys, int for array indexes and
+    WILDCARD for .* / [*]. "." alone selects the whole document.
+    """
+    steps: list[str | int | None] = []
+    pos = 1 if expr == "." else 0
+    while pos < len(expr):
+        match = PATH_STEP.match(expr, pos)
+        if match is None:
+            raise ValueError(f"Invalid path {expr!r} at position {pos + 1}")
+        name, index, quoted = match.groups()
+        if name is not None:
+            steps.append(name)
+        elif index is not None:
+            steps.append(int(index))
+        elif quoted is not None:
+            steps.append(json.loads(quoted))
+        else:
+            steps.append(WILDCARD)
+        pos = match.end()
+    return steps
+
+
+def iter_path(
+    events: Iterable[tuple[str, str]],
+    steps: list[str | int | None],
+    skip: Callable[[], None] | None = None,
+) -> Iterator[Iterator[tuple[str, str]]]:
+    """Yield the event stream of each node selected by steps, in order.
+
+    Unselected subtrees are skipped without building any Python objects.
+    With skip (JSONTokenizer.skip_container of the tokenizer behind events)
+    they are skipped on the raw text instead of event by event. Reading
+    stops as soon as no later node can match: after the single match of a
+    path without wildcards, or once the container enclosing the first
+    wildcard has ended. Each yielded stream must be consumed before asking
+    for the next one.
+    """
+    it = iter(events)
+    first = next(it, None)
+    if first is None:
+        return
+    finished = yield from PathSelector(it, steps, skip).select(first, 0)
+    if not finished:
+        # Let the parser check for trailing data.
+        next(it, None)
+
+
+class PathSelector:
+    """Walks an event stream along a parsed path; see iter_path."""
+
+    def __init__(self, it, steps: list[str | int | None], skip=None):
+        self.it = it
+        self.steps = steps
+        self.skip = skip
+        wildcards = [i for i, step in enumerate(steps) if step is WILDCARD]
+        # Above the first wildcard every step can match at most once.
+        self.first_wildcard = min(wildcards, default=len(steps))
+
+    def select(self, event: tuple[str, str], i: int):
+        """Select within the value starting with event; True means stop reading."""
+        if i == len(self.steps):
+            subtree = self.subtree(event)
+            yield subtree
+            for _ in subtree:
+                pass
+            return i <= self.first_wildcard
+
+        step = self.steps[i]
+        if event[0] == "{" and not isinstance(step, int):
+            children = self.members(step)
+        elif event[0] == "[" and not isinstance(step, str):
+            children = self.items(step)
+        else:
+            self.skip_value(event)
+            return i < self.first_wildcard
+
+        for selected, value in children:
+            if not selected:
+                self.skip_value(value)
+                continue
+            if (yield from self.select(value, i + 1)):
+                return True
+            if step is not WILDCARD:
+                # Keys and indexes match once, so the rest of this container
+                # (and, above the first wildcard, the whole document) is done.
+                if i < self.first_wildcard:
+                    return True
+                self.skip_rest()
+                return False
+        return i < self.first_wildcard
+
+    def members(self, step: str | None) -> Iterator[tuple[bool, tuple[str, str]]]:
+        """Yield (selected, first event of value) for each member of an object."""
+        key = next(self.it)
+        while key[0] != "}":
+            value = next(self.it)
+            yield step is WILDCARD or _key_equals(key[1], step), value
+            key = next(self.it)
+
+    def items(self, step: int | None) -> Iterator[tuple[bool, tuple[str, str]]]:
+        """Yield (selected, first event of value) for each item of an array."""
+        index = 0
+        value = next(self.it)
+        while value[0] != "]":
+            yield step is WILDCARD or index == step, value
+            index += 1
+            value = next(self.it)
+
+    def skip_value(self, event: tuple[str, str]) -> None:
+        if event[0] == "{" or event[0] == "[":
+            self.skip_rest()
+
+    def skip_rest(self) -> None:
+        """Consume events up to the end of the container we are inside."""
+        if self.skip is not None:
+            self.skip()
+        depth = 1
+        for event, _ in self.it:
+            if event == "{" or event == "[":
+                depth += 1
+            elif event == "}" or event == "]":
+                depth -= 1
+                if not depth:
+                    return
+
+    def subtree(self, event: tuple[str, str]) -> Iterator[tuple[str, str]]:
+        yield event
+        if event[0] != "{" and event[0] != "[":
+            return
+        depth = 1
+        for event in self.it:
+            yield event
+            if event[0] == "{" or event[0] == "[":
+                depth += 1
+            elif event[0] == "}" or event[0] == "]":
+                depth -= 1
+                if not depth:
+                    return
+
+
+def _key_equals(raw: str, key: str) -> bool:
+    if "\\" not in raw:
+        return raw[1:-1] == key
+    return json.loads(raw) == key
@@ -0,0 +1,214 @@
+import os
+import re
+import threading
+import time
+from typing import Iterator
+from walker import RACY_WINDOW_NS
+
+try:
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
+
+# Only a prefix is inspected when deciding whether a file is binary.
+BINARY_SAMPLE_SIZE = 8192
+TEXT_CHARS = bytes({7, 8, 9, 10, 12, 13, 27} | set(range(0x20, 0x100)))
+REPEAT_OPS = {
+    sre_parse.MAX_REPEAT,
+    sre_parse.MIN_REPEAT,
+    getattr(sre_parse, "POSSESSIVE_REPEAT", sre_parse.MAX_REPEAT),
+}
+
+
+class Matcher:
+    """Line matcher for one or more patterns, compiled once per run.
+
+    Matching runs on the raw UTF-8 bytes. Literal patterns are found with
+    bytes.find, keeping the next hit of each so the earliest is always at
+    hand. Each regex is compiled on its own, so inline flags, group names
+    and backreferences stay local to their pattern. A literal that every
+    match of a regex must contain is extracted where possible and searched
+    first, so the regexes only run on candidate lines.
+    """
+
+    def __init__(self, patterns: list[str], regex: bool = False):
+        if not patterns:
+            raise ValueError("At least one pattern is required")
+
+        encoded = list(dict.fromkeys(p.encode("utf-8") for p in patterns))
+        self.regexes = None
+
+        if regex:
+            try:
+                self.regexes = [re.compile(p, re.MULTILINE) for p in encoded]
+            except re.error as e:
+                raise ValueError(f"Invalid regular expression: {e}") from None
+            literals = [required_literal(p) for p in encoded]
+            self.literals = None if None in literals else list(dict.fromkeys(literals))
+        else:
+            self.literals = encoded
+
+        # A line holding a literal also holds any literal contained in it,
+        # so only the shortest ones need to be searched for.
+        self._needles = None
+        if self.literals is not None:
+            self._needles = [
+                literal
+                for literal in self.literals
+                if not any(
+                    other != literal and other in literal for other in self.literals
+                )
+            ]
+
+    def iter_hits(self, data: bytes) -> Iterator[int]:
+        """Yield the offsets of possible matches in order, one per line at most.
+
+        After each hit, searching resumes at the start of the next line.
+        """
+        if self._needles is not None and len(self._needles) == 1:
+            needle = self._needles[0]
+            pos = data.find(needle)
+            while pos != -1:
+                yield pos
+                end = data.find(b"\n", pos)
+                if end == -1:
+                    return
+                pos = data.find(needle, end + 1)
+            return
+
+        if self._needles is None:
+            finders = [regex.search for regex in self.regexes]
+        else:
+            finders = [
+                lambda data, pos, needle=needle: data.find(needle, pos)
+                for needle in self._needles
+            ]
+        # Next hit of each finder at or after pos; -1 once exhausted.
+        pending = [-2] * len(finders)
+        pos = 0
+        while pos <= len(data):
+            best = -1
+            for i, finder in enumerate(finders):
+                hit = pending[i]
+                if -1 < hit < pos or hit == -2:
+                    hit = pending[i] = _offset(finder(data, pos))
+                if hit != -1 and (best == -1 or hit < best):
+                    best = hit
+            if best == -1:
+                return
+            yield best
+            end = data.find(b"\n", best)
+            if end == -1:
+                return
+            pos = end + 1
+
+    def iter_lines(self, data: bytes) -> Iterator[tuple[int, bytes]]:
+        """Yield (line number, line) for each line of data that matches.
+
+        Lines are located around each candidate hit, so non-matching lines
+        are never split out or decoded.
+        """
+        line_number = 1
+        counted_to = 0
+
+        for pos in self.iter_hits(data):
+            start = data.rfind(b"\n", 0, pos) + 1
+            end = data.find(b"\n", pos)
+            if end == -1:
+                end = len(data)
+
+            # Every regex hit is checked against its own line: a required
+            # literal is only a candidate, and a regex may match across a
+            # newline (e.g. [^x] or \s matching the newline itself).
+            if self.regexes is None or any(
+                regex.search(data, start, end) for regex in self.regexes
+            ):
+                line_number += data.count(b"\n", counted_to, start)
+                counted_to = start
+
+                line = data[start:end]
+                yield line_number, line[:-1] if line.endswith(b"\r") else line
+
+
+def _offset(found) -> int:
+    """Turn a bytes.find result or a regex match into an offset or -1."""
+    if isinstance(found, int):
+        return found
+    return found.start() if found else -1
+
+
+def required_literal(pattern: bytes) -> bytes | None:
+    """Return the longest literal every match of pattern must contain."""
+    try:
+        parsed = sre_parse.parse(pattern)
+    except (re.error, RecursionError):
+        return None
+
+    if parsed.state.flags & re.IGNORECASE:
+        return None
+
+    runs = []
+    _collect_runs(parsed, runs, [])
+    longest = max(runs, key=len, default=b"")
+    return longest or None
+
+
+def _collect_runs(items, runs: list[bytes], current: list[int]) -> None:
+    for op, av in items:
+        if op is sre_parse.LITERAL:
+            current.append(av)
+            continue
+
+        if op is sre_parse.SUBPATTERN and not av[1] & re.IGNORECASE:
+            _collect_runs(av[3], runs, current)
+            continue
+
+        _flush(runs, current)
+        if op in REPEAT_OPS and av[0] >= 1:
+            inner = []
+            _collect_runs(av[2], runs, inner)
+            _flush(runs, inner)
+
+    _flush(runs, current)
+
+
+def _flush(runs: list[bytes], current: list[int]) -> None:
+    if current:
+        runs.append(bytes(current))
+        current.clear()
+
+
+def is_binary(data: bytes) -> bool:
+    return bool(data[:BINARY_SAMPLE_SIZE].translate(None, TEXT_CHARS))
+
+
+class BinaryCache:
+    """Files found to be binary, remembered while their lstat is unchanged.
+
+    Lets a long-lived process skip a binary file without reading it again.
+    Files modified within the timestamp granularity are never remembered.
+    """
+
+    def __init__(self):
+        self._files: dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(stat: os.stat_result) -> tuple:
+        return (
+            stat.st_dev,
+            stat.st_ino,
+            stat.st_size,
+            stat.st_mtime_ns,
+            stat.st_ctime_ns,
+        )
+
+    def is_binary(self, path: str, stat: os.stat_result) -> bool:
+        return self._files.get(path) == self.key(stat)
+
+    def add(self, path: str, stat: os.stat_result) -> None:
+        """Remember that path was binary when it had this stat."""
+        if time.time_ns() - max(stat.st_mtime_ns, stat.st_ctime_ns) < RACY_WINDOW_NS:
+            return
+        with self._lock:
+            self._files[path] = self.key(stat)
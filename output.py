@@ -0,0 +1,35 @@
+from typing import Iterable, Iterator, TextIO
+from instrumentation import phase
+
+# What a command hands back: the whole text, or chunks of it as produced.
+# Bytes-like chunks are passed to the stream's binary buffer undecoded.
+Output = str | Iterable[str] | Iterable[bytes | memoryview]
+
+
+def lines_output(lines: Iterable[str]) -> Iterator[str]:
+    """Turn lines into newline-terminated output chunks."""
+    for line in lines:
+        yield line + "\n"
+
+
+def write_output(output: Output, stream: TextIO) -> None:
+    """Write output chunk by chunk as it is produced, ending with a newline.
+
+    Nothing at all is written for empty output.
+    """
+    if isinstance(output, str):
+        output = (output,)
+    ended = True
+    for chunk in output:
+        if not chunk:
+            continue
+        with phase("output"):
+            if isinstance(chunk, str):
+                stream.write(chunk)
+                ended = chunk.endswith("\n")
+            else:
+                stream.flush()
+                stream.buffer.write(chunk)
+                ended = chunk[-1:] == b"\n"
+    if not ended:
+        stream.write("\n")
@@ -0,0 +1,61 @@
+import os
+from collections import deque
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator, TypeVar
+
+if TYPE_CHECKING:
+    from concurrent.futures import Executor
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+EXECUTOR_KINDS = ["auto", "thread", "process"]
+
+
+def worker_count(jobs: int | None) -> int:
+    """Map a --jobs value to a worker count; None or 0 means one per CPU."""
+    if not jobs:
+        return os.cpu_count() or 1
+    return max(1, jobs)
+
+
+def make_executor(kind: str, workers: int) -> "Executor":
+    # Imported here: concurrent.futures pulls in multiprocessing, which
+    # single-worker runs never need.
+    if kind == "process":
+        from concurrent.futures import ProcessPoolExecutor
+
+        return ProcessPoolExecutor(max_workers=workers)
+    if kind == "thread":
+        from concurrent.futures import ThreadPoolExecutor
+
+        return ThreadPoolExecutor(max_workers=workers)
+    raise ValueError(f"Unsupported executor: {kind}")
+
+
+def ordered_map(
+    func: Callable[[T], R],
+    items: Iterable[T],
+    workers: int,
+    kind: str = "thread",
+    window: int | None = None,
+) -> Iterator[R]:
+    """Like Executor.map, but with a bounded number of tasks in flight.
+
+    Results come back in input order, and each one is yielded as soon as it
+    and every earlier result are done. With a single worker the items are
+    processed inline.
+    """
+    if workers <= 1:
+        for item in items:
+            yield func(item)
+        return
+
+    window = window or workers * 4
+    with make_executor(kind, workers) as executor:
+        pending = deque()
+        for item in items:
+            pending.append(executor.submit(func, item))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
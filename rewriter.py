@@ -0,0 +1,140 @@
+import re
+from typing import Iterator
+
+from matcher import required_literal, sre_parse
+
+
+class Rewriter:
+    """Search/replace rules compiled once per run and applied in one pass.
+
+    Rules are matched leftmost-first: at each position the earliest match of
+    any rule wins, ties going to the rule listed first, exactly like a single
+    alternation of all the rules. Text a rule has replaced is never matched
+    again by a later rule.
+    """
+
+    def __init__(
+        self,
+        rules: list[tuple[str, str]],
+        regex: bool = False,
+        word: bool = False,
+        ignore_case: bool = False,
+    ):
+        if not rules:
+            raise ValueError("At least one rule is required")
+        if any(not search for search, _ in rules):
+            raise ValueError("Search text must not be empty")
+
+        # One literal rule without flags keeps the str.find / bytes fast paths.
+        self.plain = None
+        if len(rules) == 1 and not (regex or word or ignore_case):
+            self.plain = rules[0]
+        self.regex = regex
+
+        flags = re.MULTILINE | (re.IGNORECASE if ignore_case else 0)
+        self.patterns = []
+        self.templates = []
+        for search, replace in rules:
+            source = search if regex else re.escape(search)
+            if word:
+                source = rf"\b(?:{source})\b"
+            try:
+                pattern = re.compile(source, flags)
+                if regex:
+                    sre_parse.parse_template(replace, pattern)
+            except re.error as e:
+                raise ValueError(f"Invalid regular expression: {e}") from None
+            self.patterns.append(pattern)
+            self.templates.append(replace)
+
+        if ignore_case:
+            self.literals = None
+        elif regex:
+            literals = [required_literal(s.encode("utf-8")) for s, _ in rules]
+            self.literals = None if None in literals else literals
+        else:
+            self.literals = [s.encode("utf-8") for s, _ in rules]
+
+    def may_match(self, data: bytes) -> bool:
+        """Cheap check on the raw bytes; False means no rule can match."""
+        if self.literals is None:
+            return True
+        return any(literal in data for literal in self.literals)
+
+    def matches(self, text: str) -> Iterator[tuple[int, int, str]]:
+        """Yield (start, end, replacement) for each match, left to right."""
+        if self.plain is not None:
+            search, replace = self.plain
+            pos = text.find(search)
+            while pos != -1:
+                yield pos, pos + len(search), replace
+                pos = text.find(search, pos + len(search))
+            return
+
+        # Next match of each rule at or after pos; False once exhausted.
+        pending: list = [None] * len(self.patterns)
+        pos = 0
+        empty_at = -1
+
+        while pos <= len(text):
+            best = rule = None
+            for i, pattern in enumerate(self.patterns):
+                match = pending[i]
+                if match is None or (
+                    match and (match.start() < pos or match.end() == empty_at)
+                ):
+                    match = pending[i] = self._search(pattern, text, pos, empty_at)
+                if match and (best is None or match.start() < best.start()):
+                    best, rule = match, i
+            if best is None:
+                return
+
+            if self.regex:
+                yield best.start(), best.end(), best.expand(self.templates[rule])
+            else:
+                yield best.start(), best.end(), self.templates[rule]
+            pos = best.end()
+            empty_at = pos if best.start() == pos else -1
+            pending[rule] = None
+
+    @staticmethod
+    def _search(pattern: re.Pattern, text: str, pos: int, empty_at: int):
+        match = pattern.search(text, pos)
+        # No second empty match where the previous one was, as in re.sub, but
+        # a non-empty match may still start there. A scanner's second search
+        # from pos rules out only that empty match, as re.sub's own loop does.
+        if match and match.start() == match.end() == empty_at:
+            scanner = pattern.scanner(text, pos)
+            scanner.search()
+            match = scanner.search()
+        return match or False
+
+    def sub(self, text: str) -> tuple[str, int]:
+        """Return text with every match replaced, and the number of matches."""
+        pieces = []
+        pos = count = 0
+        for start, end, replacement in self.matches(text):
+            pieces.append(text[pos:start])
+            pieces.append(replacement)
+            pos = end
+            count += 1
+        pieces.append(text[pos:])
+        return "".join(pieces), count
+
+
+def parse_rules(text: str) -> list[tuple[str, str]]:
+    """Parse a rules file: one SEARCH<TAB>REPLACE pair per line.
+
+    Blank lines and lines starting with '#' are ignored.
+    """
+    rules = []
+    for number, line in enumerate(text.splitlines(), 1):
+        if not line.strip() or line.startswith("#"):
+            continue
+        search, tab, replace = line.partition("\t")
+        if not tab:
+            raise ValueError(f"Rules file line {number}: expected SEARCH<TAB>REPLACE")
+        rules.append((search, replace))
+    if not rules:
+        raise ValueError("Rules file contains no rules")
+    return rules
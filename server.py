@@ -0,0 +1,251 @@
+import asyncio
+import json
+import os
+import signal
+import socket
+import stat as stat_module
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from arguments import JOB_COMMANDS, JobArgumentParser, build_parser, parse_args
+from checksum_cache import ChecksumCache, open_cache
+from client import WRONG_ROOT
+from command_router import dispatch_command, text_chunks
+from exceptions import ServeError, WrongRootError
+from filesystem import SafeFileSystem
+from parallel import worker_count
+
+# Default socket, in the workspace's state directory.
+SOCKET_FILE = "serve.sock"
+# Output goes to the client in frames of about this many characters, or
+# whatever was produced in this many seconds if that is less.
+FRAME_SIZE = 64 * 1024
+FRAME_INTERVAL = 0.05
+
+
+def serve(fs: SafeFileSystem, socket_path: str | None, jobs: int) -> str:
+    """Answer --connect clients on a Unix socket until SIGINT or SIGTERM.
+
+    Requests run concurrently in a thread pool against one filesystem, so
+    directory fds, listings, binary-file results and the checksum cache
+    stay warm between them. Requests already running when the daemon is
+    stopped are finished first.
+    """
+    if not hasattr(socket, "AF_UNIX"):
+        raise ServeError("serve needs Unix domain sockets")
+    if socket_path is None:
+        # Relative, since socket paths are limited to about 100 bytes.
+        socket_path = os.path.relpath(fs.state_path(SOCKET_FILE))
+    remove_stale_socket(socket_path)
+
+    cache = open_cache(fs)
+    try:
+        with ThreadPoolExecutor(worker_count(jobs)) as executor:
+            asyncio.run(Server(fs, cache, executor).run(socket_path))
+    finally:
+        if cache is not None:
+            cache.close()
+        try:
+            os.unlink(socket_path)
+        except FileNotFoundError:
+            pass
+    return ""
+
+
+def remove_stale_socket(path: str) -> None:
+    """Remove a socket left behind by a daemon that is no longer running."""
+    try:
+        mode = os.stat(path, follow_symlinks=False).st_mode
+    except FileNotFoundError:
+        return
+    if not stat_module.S_ISSOCK(mode):
+        raise ServeError(f"Not a socket: {path}")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(path)
+        except ConnectionRefusedError:
+            os.unlink(path)
+            return
+    raise ServeError(f"A daemon is already listening on {path}")
+
+
+class Server:
+    def __init__(
+        self,
+        fs: SafeFileSystem,
+        cache: ChecksumCache | None,
+        executor: ThreadPoolExecutor,
+    ):
+        self.fs = fs
+        self.cache = cache
+        self.executor = executor
+        # Only used on the event loop thread.
+        self.parser = build_parser(JobArgumentParser)
+        self.running: set[asyncio.Future] = set()
+
+    async def run(self, socket_path: str) -> None:
+        loop = asyncio.get_running_loop()
+        stop = asyncio.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, stop.set)
+
+        # Only this user may connect.
+        umask = os.umask(0o077)
+        try:
+            server = await asyncio.start_unix_server(self.handle, socket_path)
+        finally:
+            os.umask(umask)
+        print(f"Serving {self.fs.root} on {socket_path}", file=sys.stderr)
+
+        await stop.wait()
+        server.close()
+        # Clients still waiting to send a request are dropped when the loop
+        # shuts down; commands already running in a worker finish first.
+        await asyncio.gather(*self.running, return_exceptions=True)
+
+    async def handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Answer one request: a JSON line {"root": ..., "argv": [...]}.
+
+        The reply is {"output": ...} lines as the command produces them, then
+        one {"status": "ok"} or {"status": "error", ...} line. A request for
+        another root gets only a {"status": "wrong-root", ...} line, so the
+        client can run the command itself.
+        """
+        try:
+            line = await reader.readline()
+            if line:
+                await send(writer, await self.answer(line, writer))
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def answer(self, line: bytes, writer: asyncio.StreamWriter) -> dict:
+        start = time.perf_counter()
+        try:
+            args = self.parse_request(line)
+        except WrongRootError as e:
+            return {"status": WRONG_ROOT, "error": str(e), "root": str(self.fs.root)}
+        except ValueError as e:
+            error = e
+        else:
+            # Directories renamed since an earlier request are reopened.
+            self.fs.refresh()
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(
+                self.executor, self.run_command, args, writer, loop
+            )
+            self.running.add(future)
+            try:
+                error = await future
+            finally:
+                self.running.discard(future)
+
+        result = {
+            "status": "ok" if error is None else "error",
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 3),
+        }
+        if error is not None:
+            result["error"] = str(error)
+            result["error_type"] = type(error).__name__
+        return result
+
+    def parse_request(self, line: bytes):
+        request = json.loads(line)
+        if not isinstance(request, dict):
+            raise ValueError("Invalid request: expected a JSON object")
+        argv = request.get("argv")
+        if not isinstance(argv, list) or not all(isinstance(a, str) for a in argv):
+            raise ValueError("Invalid request: argv must be a list of strings")
+        if request.get("root") != str(self.fs.root):
+            raise WrongRootError(f"This daemon serves {self.fs.root}")
+
+        args = parse_args(self.parser, argv)
+        if args.command not in JOB_COMMANDS:
+            raise ValueError(f"{args.command} cannot be run by the daemon")
+        if getattr(args, "exclude", None) or getattr(args, "gitignore", False):
+            raise ValueError("pass --exclude and --gitignore to serve itself")
+        return args
+
+    def run_command(
+        self, args, writer: asyncio.StreamWriter, loop: asyncio.AbstractEventLoop
+    ) -> Exception | None:
+        """Run one command in a worker thread, streaming its output to writer.
+
+        Returns the exception the command failed with, if any. A client that
+        went away raises ConnectionError instead.
+        """
+        frames = FrameSender(writer, loop)
+        error = None
+        try:
+            for chunk in text_chunks(dispatch_command(self.fs, args, self.cache)):
+                frames.add(chunk)
+        except Exception as e:
+            if frames.disconnected:
+                raise
+            error = e
+        finally:
+            if args.command == "checksum" and self.cache is not None:
+                self.cache.commit()
+        frames.flush()
+        return error
+
+
+class FrameSender:
+    """Sends output from a worker thread to a client in frames.
+
+    Chunks are joined until FRAME_SIZE characters or FRAME_INTERVAL seconds
+    have built up, since handing each small chunk to the event loop costs
+    more than producing it. One frame is in flight at a time, so a slow
+    client slows the command down instead of growing its buffer.
+    """
+
+    def __init__(self, writer: asyncio.StreamWriter, loop: asyncio.AbstractEventLoop):
+        self.writer = writer
+        self.loop = loop
+        self.pending = None
+        self.frame: list[str] = []
+        self.size = 0
+        self.deadline = time.monotonic() + FRAME_INTERVAL
+        self.disconnected = False
+
+    def add(self, text: str) -> None:
+        if not text:
+            return
+        self.frame.append(text)
+        self.size += len(text)
+        if self.size >= FRAME_SIZE or time.monotonic() >= self.deadline:
+            self.send_frame()
+
+    def flush(self) -> None:
+        """Send whatever is left and wait until the client has it."""
+        self.send_frame()
+        self.wait()
+
+    def send_frame(self) -> None:
+        self.wait()
+        if not self.frame:
+            return
+        message = {"output": "".join(self.frame)}
+        self.frame, self.size = [], 0
+        self.deadline = time.monotonic() + FRAME_INTERVAL
+        self.pending = asyncio.run_coroutine_threadsafe(
+            send(self.writer, message), self.loop
+        )
+
+    def wait(self) -> None:
+        pending, self.pending = self.pending, None
+        if pending is None:
+            return
+        try:
+            pending.result()
+        except ConnectionError:
+            self.disconnected = True
+            raise
+
+
+async def send(writer: asyncio.StreamWriter, message: dict) -> None:
+    writer.write(json.dumps(message).encode("utf-8") + b"\n")
+    await writer.drain()
@@ -0,0 +1,109 @@
+import os
+import subprocess
+import sys
+import pytest
+from pathlib import Path
+from benchmark import Case, compare_results, run_case, run_cli, summarize
+
+
+def report(**cases):
+    return {
+        "sizes": {"file_mb": 1},
+        "cases": [{"name": name, **fields} for name, fields in cases.items()],
+    }
+
+
+def test_summarize_reports_median_p95_and_stddev():
+    stats = summarize([5.0, 1.0, 3.0, 2.0, 4.0])
+
+    assert stats["median_ms"] == 3.0
+    assert stats["p95_ms"] == 5.0
+    assert stats["min_ms"] == 1.0
+    assert stats["stddev_ms"] == pytest.approx(1.581, abs=1e-3)
+    assert summarize([2.0])["stddev_ms"] == 0.0
+
+
+def test_run_case_excludes_warmup_and_reset_and_records_failures(tmp_path):
+    calls = []
+    case = Case(
+        "ok", "", lambda fs: calls.append("run"), lambda _: calls.append("reset")
+    )
+
+    result = run_case(case, tmp_path, warmup=2, iterations=3)
+
+    assert result["status"] == "ok"
+    assert len(result["times_ms"]) == 3
+    assert calls == ["reset", "run"] * 5
+
+    def fail(fs):
+        raise OSError("disk full")
+
+    result = run_case(Case("bad", "", fail), tmp_path, warmup=0, iterations=3)
+
+    assert result["status"] == "error"
+    assert result["error"] == "OSError: disk full"
+    assert result["times_ms"] == []
+
+
+def test_compare_results_flags_slowdowns_memory_growth_and_failures():
+    baseline = report(
+        fast={"status": "ok", "median_ms": 10.0, "peak_rss_mb": 20.0},
+        lean={"status": "ok", "median_ms": 10.0, "peak_rss_mb": 20.0},
+        broken={"status": "ok", "median_ms": 10.0, "peak_rss_mb": 20.0},
+    )
+    current = report(
+        fast={"status": "ok", "median_ms": 10.5, "peak_rss_mb": 20.0},
+        lean={"status": "ok", "median_ms": 9.0, "peak_rss_mb": 40.0},
+        broken={"status": "error", "error": "boom"},
+        new={"status": "ok", "median_ms": 99.0, "peak_rss_mb": 99.0},
+    )
+
+    regressions = compare_results(current, baseline, threshold=0.1)
+
+    assert regressions == [
+        "lean: peak_rss_mb 20.00MB -> 40.00MB (+100%)",
+        "broken: failed (boom)",
+    ]
+
+
+def test_compare_results_rejects_baselines_with_other_sizes():
+    baseline = report()
+    baseline["sizes"] = {"file_mb": 1024}
+
+    with pytest.raises(ValueError):
+        compare_results(report(), baseline, threshold=0.1)
+
+
+def test_run_cli_reports_wall_and_import_time(tmp_path):
+    (tmp_path / "a.txt").write_text("hello\n")
+
+    elapsed, import_ms, _ = run_cli(["read", "a.txt"], tmp_path)
+
+    assert 0 < import_ms < elapsed
+    with pytest.raises(RuntimeError, match="Not found"):
+        run_cli(["read", "missing.txt"], tmp_path)
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/status"), reason="needs /proc")
+def test_peak_rss_excludes_the_parent_process():
+    ballast = b"x" * (200 * 1024 * 1024)
+
+    child = subprocess.run(
+        [sys.executable, "-c", "import benchmark; print(benchmark.peak_rss_mb())"],
+        cwd=Path(__file__).parent.parent,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    assert len(ballast) and 0 < float(child.stdout) < 100
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/status"), reason="needs /proc")
+def test_run_cli_peak_rss_excludes_the_parent_process(tmp_path):
+    (tmp_path / "a.txt").write_text("hello\n")
+    ballast = b"x" * (200 * 1024 * 1024)
+
+    _, _, rss = run_cli(["read", "a.txt"], tmp_path)
+
+    assert len(ballast) and 0 < rss < 100
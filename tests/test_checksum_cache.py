@@ -0,0 +1,166 @@
+import hashlib
+import os
+import checksum_cache
+from filesystem import SafeFileSystem
+from checksum_cache import ChecksumCache, open_cache
+from commands.checksum import checksum_command
+
+OLD_MTIME_NS = 1_600_000_000 * 10**9
+
+
+def write_old_file(path, content):
+    path.write_bytes(content)
+    os.utime(path, ns=(OLD_MTIME_NS, OLD_MTIME_NS))
+
+
+def test_cache_serves_unchanged_files_without_rehashing(tmp_path):
+    fs = SafeFileSystem(tmp_path)
+    write_old_file(tmp_path / "file.txt", b"Hello World")
+
+    cache = open_cache(fs)
+    first = checksum_command(fs, "file.txt", cache=cache)
+    cache.close()
+    assert (cache.hits, cache.misses) == (0, 1)
+
+    cache = open_cache(fs)
+    second = checksum_command(fs, "file.txt", cache=cache)
+    cache.close()
+    assert (cache.hits, cache.misses) == (1, 0)
+    assert first == second == f"{hashlib.sha256(b'Hello World').hexdigest()} file.txt"
+
+
+def test_cache_misses_after_file_changes(tmp_path):
+    fs = SafeFileSystem(tmp_path)
+    target = tmp_path / "file.txt"
+    write_old_file(target, b"before")
+
+    cache = open_cache(fs)
+    checksum_command(fs, "file.txt", cache=cache)
+    cache.close()
+
+    target.write_bytes(b"after!")
+    os.utime(target, ns=(OLD_MTIME_NS + 1, OLD_MTIME_NS + 1))
+
+    cache = open_cache(fs)
+    result = checksum_command(fs, "file.txt", cache=cache)
+    cache.close()
+    assert cache.misses == 1
+    assert result == f"{hashlib.sha256(b'after!').hexdigest()} file.txt"
+
+
+def test_cache_skips_recently_modified_files(tmp_path):
+    fs = SafeFileSystem(tmp_path)
+    (tmp_path / "fresh.txt").write_text("still being written")
+
+    for _ in range(2):
+        cache = open_cache(fs)
+        checksum_command(fs, "fresh.txt", cache=cache)
+        cache.close()
+
+    assert cache.hits == 0
+
+
+def test_verify_rehashes_and_refreshes_cache(tmp_path):
+    fs = SafeFileSystem(tmp_path)
+    write_old_file(tmp_path / "file.txt", b"content")
+
+    cache = open_cache(fs)
+    checksum_command(fs, "file.txt", cache=cache, verify=True)
+    cache.close()
+    assert (cache.hits, cache.misses) == (0, 0)
+
+    cache = open_cache(fs)
+    checksum_command(fs, "file.txt", cache=cache)
+    cache.close()
+    assert cache.hits == 1
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = ChecksumCache(str(tmp_path / "cache.sqlite"), max_entries=2)
+    stats = []
+    for name in ["a", "b", "c"]:
+        write_old_file(tmp_path / name, name.encode())
+        stats.append(os.stat(tmp_path / name))
+        cache.store(stats[-1], "sha256", name)
+    cache.close()
+
+    cache = ChecksumCache(str(tmp_path / "cache.sqlite"), max_entries=2)
+    assert cache.lookup(stats[0], "sha256") is None
+    assert cache.lookup(stats[2], "sha256") == "c"
+    cache.close()
+
+
+def test_cache_directory_is_not_listed(tmp_path):
+    fs = SafeFileSystem(tmp_path)
+    write_old_file(tmp_path / "file.txt", b"data")
+
+    open_cache(fs).close()
+
+    assert fs.list_files("**/*") == ["file.txt"]
+
+
+def test_shared_cache_is_committed_without_closing_across_threads(tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+
+    fs = SafeFileSystem(tmp_path)
+    for i in range(8):
+        write_old_file(tmp_path / f"{i}.txt", b"x" * i)
+
+    cache = open_cache(fs)
+    with ThreadPoolExecutor(4) as pool:
+        jobs = [
+            pool.submit(checksum_command, fs, f"{i}.txt", cache=cache) for i in range(8)
+        ]
+    for job in jobs:
+        job.result()
+    cache.commit()
+
+    other = open_cache(fs)
+    checksum_command(fs, "*.txt", cache=other)
+    other.close()
+    assert (other.hits, other.misses) == (8, 0)
+
+    checksum_command(fs, "0.txt", cache=cache)
+    cache.close()
+    assert cache.hits == 1
+
+
+def test_overlapping_runs_degrade_to_cache_misses(tmp_path, monkeypatch):
+    monkeypatch.setattr(checksum_cache, "COMMIT_BATCH", 2)
+    monkeypatch.setattr(checksum_cache, "BUSY_TIMEOUT", 0.05)
+    fs = SafeFileSystem(tmp_path)
+    stats = []
+    for name in ["a", "b", "c"]:
+        write_old_file(tmp_path / name, name.encode())
+        stats.append(os.stat(tmp_path / name))
+
+    first = open_cache(fs)
+    second = open_cache(fs)
+    first.store(stats[0], "sha256", "a")
+    first.store(stats[1], "sha256", "b")
+    # A full batch is visible to other runs without closing.
+    assert second.lookup(stats[1], "sha256") == "b"
+
+    # The first run now holds the write lock for an uncommitted store.
+    first.store(stats[2], "sha256", "c")
+    second.store(stats[2], "sha256", "c")
+    second.close()
+    first.close()
+
+    cache = open_cache(fs)
+    assert cache.lookup(stats[2], "sha256") == "c"
+    cache.close()
+
+
+def test_commit_evicts_without_closing(tmp_path):
+    cache = ChecksumCache(str(tmp_path / "cache.sqlite"), max_entries=2)
+    stats = []
+    for name in ["a", "b", "c"]:
+        write_old_file(tmp_path / name, name.encode())
+        stats.append(os.stat(tmp_path / name))
+        cache.store(stats[-1], "sha256", name)
+        cache.commit()
+
+    assert cache.lookup(stats[0], "sha256") is None
+    assert cache.lookup(stats[2], "sha256") == "c"
+    cache.close()
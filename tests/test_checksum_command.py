@@ -31,3 +31,53 @@ def test_checksum_invalid_algorithm_raises_attribute_error(tmp_path):
 
     with pytest.raises(ValueError):
         checksum_command(fs, "file3.txt", algorithm="invalid_algo")
+
+
+def test_checksum_streams_multi_chunk_file(tmp_path):
+    fs = SafeFileSystem(tmp_path)
+    content = bytes(range(256)) * 10000
+
+    (tmp_path / "large.bin").write_bytes(content)
+
+    expected = hashlib.sha512(content).hexdigest()
+    assert checksum_command(fs, "large.bin", "sha512") == f"{expected} large.bin"
+    assert (
+        checksum_command(fs, "large.bin", "sha512", use_mmap=True)
+        == f"{expected} large.bin"
+    )
+
+
+def test_checksum_multiple_algorithms_single_read(tmp_path):
+    fs = SafeFileSystem(tmp_path)
+
+    (tmp_path / "file.txt").write_text("Hello World")
+
+    result = checksum_command(fs, "file.txt", algorithm=["md5", "sha256"])
+
+    md5 = hashlib.md5(b"Hello World").hexdigest()
+    sha256 = hashlib.sha256(b"Hello World").hexdigest()
+    assert result == f"MD5 (file.txt) = {md5}\nSHA256 (file.txt) = {sha256}"
+
+
+def test_checksum_glob_hashes_files_in_sorted_order(tmp_path):
+    fs = SafeFileSystem(tmp_path)
+
+    (tmp_path / "docs").mkdir()
+    for name in ["b.txt", "a.txt", "docs/c.txt"]:
+        (tmp_path / name).write_text(name)
+    (tmp_path / "skip.log").write_text("not matched")
+
+    result = checksum_command(fs, "**/*.txt", jobs=4)
+
+    expected = "\n".join(
+        f"{hashlib.sha256(name.encode()).hexdigest()} {name}"
+        for name in ["a.txt", "b.txt", "docs/c.txt"]
+    )
+    assert result == expected
+
+
+def test_checksum_glob_without_matches_raises(tmp_path):
+    fs = SafeFileSystem(tmp_path)
+
+    with pytest.raises(FileNotFoundError):
+        checksum_command(fs, "*.iso")
@@ -0,0 +1,125 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+from exceptions import BatchError
+
+ROOT = Path(__file__).parent.parent
+
+
+def test_cli_import_does_not_load_commands_or_heavy_modules():
+    heavy = [
+        "commands",
+        "sqlite3",
+        "concurrent.futures",
+        "hashlib",
+        "json",
+        "difflib",
+        "asyncio",
+        "socket",
+    ]
+    script = (
+        "import sys, cli\n"
+        f"print([m for m in {heavy!r} if any(k == m or k.startswith(m + '.') "
+        "for k in sys.modules)])"
+    )
+
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    assert result.stdout.strip() == "[]"
+
+
+def test_commands_do_not_skip_gitignored_files_by_default(tmp_path, monkeypatch):
+    from arguments import build_parser, parse_args
+    from command_router import execute_command
+
+    (tmp_path / ".gitignore").write_text("dist/\n")
+    (tmp_path / "dist").mkdir()
+    (tmp_path / "dist" / "a.tar").write_text("data\n")
+    monkeypatch.chdir(tmp_path)
+
+    def run(*argv):
+        return "".join(execute_command(parse_args(build_parser(), list(argv))))
+
+    assert run("checksum", "dist/*.tar", "--no-cache").endswith(" dist/a.tar\n")
+    assert run("grep", "data", "dist/*") == "dist/a.tar: data\n"
+    assert run("grep", "data", "**/*", "--gitignore") == ""
+
+
+def run_batch(tmp_path, monkeypatch, jobs, *options):
+    from arguments import build_parser, parse_args
+    from command_router import execute_command
+
+    (tmp_path / "jobs.jsonl").write_text("\n".join(json.dumps(job) for job in jobs))
+    monkeypatch.chdir(tmp_path)
+    args = parse_args(build_parser(), ["batch", "jobs.jsonl", *options])
+    results = []
+    try:
+        for chunk in execute_command(args):
+            results.append(json.loads(chunk))
+    except BatchError as e:
+        return results, e
+    return results, None
+
+
+def test_batch_runs_jobs_concurrently_and_keeps_their_order(tmp_path, monkeypatch):
+    (tmp_path / "a.txt").write_text("one TODO\ntwo\n")
+    jobs = [
+        {"id": "read", "command": "read", "args": ["a.txt", "--tail", "1"]},
+        {"command": "grep", "args": ["TODO", "*.txt"]},
+        {"id": "sum", "command": "checksum", "args": ["a.txt", "--no-cache"]},
+    ] * 5
+
+    results, error = run_batch(tmp_path, monkeypatch, jobs, "-j", "4")
+
+    assert error is None
+    ids = [r["id"] for r in results]
+    assert ids[0::3] == ["read"] * 5 and ids[2::3] == ["sum"] * 5
+    assert ids[1::3] == [2, 5, 8, 11, 14]
+    assert all(r["status"] == "ok" and r["elapsed_ms"] >= 0 for r in results)
+    assert results[0]["output"] == "two\n"
+    assert results[1]["output"] == "a.txt: one TODO\n"
+
+
+def test_batch_records_failed_jobs_and_raises_at_the_end(tmp_path, monkeypatch):
+    jobs = [
+        {"id": 1, "command": "read", "args": ["missing.txt"]},
+        {"id": 2, "command": "rm", "args": ["-rf"]},
+        {"id": 3, "command": "grep", "args": ["TODO", "*", "--exclude", "x"]},
+        {"id": 4, "command": "grep", "args": ["--bogus"]},
+    ]
+
+    results, error = run_batch(tmp_path, monkeypatch, jobs)
+
+    assert [r["status"] for r in results] == ["error"] * 4
+    assert results[0]["error_type"] == "FileNotFoundError"
+    assert "Unsupported batch command" in results[1]["error"]
+    assert "batch itself" in results[2]["error"]
+    assert str(error) == "4 of 4 job(s) failed"
+
+
+def test_batch_checksum_jobs_share_one_cache(tmp_path, monkeypatch):
+    import checksum_cache
+
+    opened = []
+
+    def open_cache(fs):
+        opened.append(checksum_cache.ChecksumCache(str(tmp_path / "cache.sqlite")))
+        return opened[-1]
+
+    monkeypatch.setattr(checksum_cache, "open_cache", open_cache)
+    (tmp_path / "a.txt").write_text("data\n")
+    jobs = [{"command": "checksum", "args": ["a.txt"]}] * 6
+
+    results, error = run_batch(tmp_path, monkeypatch, jobs, "-j", "3")
+
+    assert error is None
+    assert len({r["output"] for r in results}) == 1
+    assert len(opened) == 1
+    assert opened[0].misses == 6
@@ -164,3 +164,290 @@ def test_write_file_requires_parent_directories(tmp_path):
 
     with pytest.raises(FileNotFoundError):
         fs.write_file("subdir/nested/file.txt", b"content")
+
+
+def test_iter_chunks_streams_file_in_pieces(tmp_path):
+    fs = SafeFileSystem(tmp_path)
+    (tmp_path / "big.bin").write_bytes(b"abcdefghij" * 10)
+
+    chunks = [bytes(chunk) for chunk in fs.iter_chunks("big.bin", chunk_size=16)]
+
+    assert len(chunks) == 7
+    assert b"".join(chunks) == b"abcdefghij" * 10
+
+
+def test_iter_chunks_with_mmap(tmp_path):
+    fs = SafeFileSystem(tmp_path)
+    (tmp_path / "big.bin").write_bytes(b"abcdefghij" * 10)
+
+    chunks = [bytes(chunk) for chunk in fs.iter_chunks("big.bin", 16, use_mmap=True)]
+
+    assert b"".join(chunks) == b"abcdefghij" * 10
+
+
+def test_iter_chunks_empty_file(tmp_path):
+    fs = SafeFileSystem(tmp_path)
+    (tmp_path / "empty.bin").write_bytes(b"")
+
+    assert list(fs.iter_chunks("empty.bin")) == []
+    assert list(fs.iter_chunks("empty.bin", use_mmap=True)) == []
+
+
+def test_iter_chunks_blocks_symlinks(tmp_path):
+    fs = SafeFileSystem(tmp_path)
+    real_file = tmp_path / "real_file.txt"
+    real_file.write_text("data")
+    (tmp_path / "link.txt").symlink_to(real_file)
+
+    with pytest.raises(SymLinkNotAllowedError):
+        list(fs.iter_chunks("link.txt"))
+
+
+def test_read_range_returns_slice(tmp_path):
+    fs = SafeFileSystem(tmp_path)
+    (tmp_path / "data.txt").write_bytes(b"0123456789")
+
+    assert fs.read_range("data.txt", 3, 4) == b"3456"
+    assert fs.read_range("data.txt", 8, 100) == b"89"
+    assert fs.read_range("data.txt", 20, 5) == b""
+
+
+def test_read_range_blocks_path_traversal(tmp_path):
+    fs = SafeFileSystem(tmp_path)
+
+    with pytest.raises(PathTraversalError):
+        fs.read_range("../outside.txt", 0, 10)
+
+
+def test_list_files_skips_symlinks(tmp_path):
+    fs = SafeFileSystem(tmp_path)
+    (tmp_path / "real.txt").write_text("real")
+    (tmp_path / "link.txt").symlink_to(tmp_path / "real.txt")
+    (tmp_path / "linkdir").symlink_to(tmp_path.parent)
+
+    assert sorted(fs.list_files("**/*")) == ["real.txt"]
+
+
+def test_list_files_character_class_and_dotfiles(tmp_path):
+    fs = SafeFileSystem(tmp_path)
+    for name in ["file1.txt", "file2.txt", "fileA.txt", ".hidden.txt"]:
+        (tmp_path / name).write_text(name)
+
+    assert sorted(fs.list_files("file[0-9].txt")) == ["file1.txt", "file2.txt"]
+    assert ".hidden.txt" in fs.list_files("*.txt")
+
+
+def test_list_files_exclude_prunes_directories(tmp_path):
+    fs = SafeFileSystem(tmp_path, exclude=["node_modules/", "*.min.js"])
+    (tmp_path / "node_modules" / "pkg").mkdir(parents=True)
+    (tmp_path / "node_modules" / "pkg" / "index.js").write_text("x")
+    (tmp_path / "app.js").write_text("x")
+    (tmp_path / "app.min.js").write_text("x")
+
+    assert fs.list_files("**/*.js") == ["app.js"]
+
+
+def test_list_files_respects_gitignore_files(tmp_path):
+    fs = SafeFileSystem(tmp_path, use_ignore_files=True)
+    (tmp_path / ".gitignore").write_text("build/\n*.log\n!keep.log\n")
+    (tmp_path / "build").mkdir()
+    (tmp_path / "build" / "out.txt").write_text("x")
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / ".gitignore").write_text("/generated.txt\n")
+    (tmp_path / "src" / "generated.txt").write_text("x")
+    (tmp_path / "src" / "main.txt").write_text("x")
+    (tmp_path / "debug.log").write_text("x")
+    (tmp_path / "keep.log").write_text("x")
+    (tmp_path / ".git").mkdir()
+    (tmp_path / ".git" / "HEAD").write_text("x")
+
+    result = sorted(fs.list_files("**/*"))
+
+    assert result == [".gitignore", "keep.log", "src/.gitignore", "src/main.txt"]
+    assert SafeFileSystem(tmp_path).list_files("build/*") == ["build/out.txt"]
+
+
+def test_gitignore_rules_skip_nothing_the_glob_names_literally(tmp_path):
+    fs = SafeFileSystem(tmp_path, use_ignore_files=True)
+    (tmp_path / ".gitignore").write_text("dist/\n*.log\n")
+    (tmp_path / "dist").mkdir()
+    (tmp_path / "dist" / "a.tar").write_text("x")
+    (tmp_path / "dist" / "a.log").write_text("x")
+    (tmp_path / "debug.log").write_text("x")
+    (tmp_path / ".git").mkdir()
+    (tmp_path / ".git" / "config").write_text("x")
+
+    assert fs.list_files("dist/*") == ["dist/a.tar"]
+    assert fs.list_files("debug.log") == ["debug.log"]
+    assert fs.list_files(".git/config") == [".git/config"]
+    assert fs.list_files("**/*.tar") == []
+
+
+def test_read_file_rejects_symlinked_parent_directory(tmp_path):
+    fs = SafeFileSystem(tmp_path)
+    (tmp_path / "real").mkdir()
+    (tmp_path / "real" / "file.txt").write_text("data")
+    (tmp_path / "alias").symlink_to(tmp_path / "real")
+
+    with pytest.raises(SymLinkNotAllowedError):
+        fs.read_file("alias/file.txt")
+
+
+def test_read_file_resolves_dot_dot_inside_root(tmp_path):
+    fs = SafeFileSystem(tmp_path)
+    (tmp_path / "docs").mkdir()
+    (tmp_path / "file.txt").write_text("top")
+
+    assert fs.read_file("docs/../file.txt") == b"top"
+    with pytest.raises(PathTraversalError):
+        fs.read_file("docs/../../file.txt")
+
+
+def test_read_file_accepts_absolute_path_inside_root(tmp_path):
+    fs = SafeFileSystem(tmp_path)
+    (tmp_path / "file.txt").write_text("data")
+
+    assert fs.read_file(str(tmp_path / "file.txt")) == b"data"
+    with pytest.raises(PathTraversalError):
+        fs.read_file("/etc/passwd")
+
+
+def test_open_fd_caches_directory_fds(tmp_path):
+    (tmp_path / "a" / "b").mkdir(parents=True)
+    (tmp_path / "a" / "b" / "one.txt").write_text("1")
+    (tmp_path / "a" / "b" / "two.txt").write_text("2")
+
+    with SafeFileSystem(tmp_path) as fs:
+        assert fs.read_file("a/b/one.txt") == b"1"
+        cached = dict(fs._dir_fds)
+        assert fs.read_file("a/b/two.txt") == b"2"
+        assert fs._dir_fds == cached
+
+    assert fs._dir_fds == {}
+
+
+def test_stat_rejects_symlinks(tmp_path):
+    fs = SafeFileSystem(tmp_path)
+    (tmp_path / "real.txt").write_text("data")
+    (tmp_path / "link.txt").symlink_to(tmp_path / "real.txt")
+
+    assert fs.stat("real.txt").st_size == 4
+    with pytest.raises(SymLinkNotAllowedError):
+        fs.stat("link.txt")
+    with pytest.raises(FileNotFoundError):
+        fs.stat("missing.txt")
+
+
+def test_filesystem_pickles_without_open_fds(tmp_path):
+    import pickle
+
+    fs = SafeFileSystem(tmp_path)
+    (tmp_path / "file.txt").write_text("data")
+    fs.read_file("file.txt")
+
+    clone = pickle.loads(pickle.dumps(fs))
+
+    assert clone._dir_fds == {}
+    assert clone.read_file("file.txt") == b"data"
+
+
+def test_atomic_writer_abort_keeps_original(tmp_path):
+    fs = SafeFileSystem(tmp_path)
+    target = tmp_path / "file.txt"
+    target.write_text("original")
+
+    with pytest.raises(RuntimeError):
+        with fs.atomic_writer("file.txt") as writer:
+            writer.write(b"partial")
+            raise RuntimeError("crash mid-write")
+
+    assert target.read_text() == "original"
+    assert [p.name for p in tmp_path.iterdir()] == ["file.txt"]
+
+
+def test_write_file_rejects_symlink_target(tmp_path):
+    fs = SafeFileSystem(tmp_path)
+    (tmp_path / "real.txt").write_text("real")
+    (tmp_path / "link.txt").symlink_to(tmp_path / "real.txt")
+
+    with pytest.raises(SymLinkNotAllowedError):
+        fs.write_file("link.txt", b"new")
+
+
+def test_refresh_reopens_directories_replaced_since_cached(tmp_path):
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "a.txt").write_text("old")
+    fs = SafeFileSystem(tmp_path)
+    assert fs.read_file("sub/a.txt") == b"old"
+
+    (tmp_path / "sub").rename(tmp_path / "moved")
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "a.txt").write_text("new")
+
+    assert fs.read_file("sub/a.txt") == b"old"
+    fs.refresh()
+    assert fs.read_file("sub/a.txt") == b"new"
+    fs.close()
+
+
+def test_refresh_rejects_directory_replaced_by_symlink(tmp_path):
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "a.txt").write_text("inside")
+    (tmp_path / "outside").mkdir()
+    (tmp_path / "outside" / "a.txt").write_text("outside")
+    fs = SafeFileSystem(tmp_path)
+    fs.read_file("sub/a.txt")
+
+    (tmp_path / "sub").rename(tmp_path / "moved")
+    (tmp_path / "sub").symlink_to(tmp_path / "outside")
+    fs.refresh()
+
+    with pytest.raises(SymLinkNotAllowedError):
+        fs.read_file("sub/a.txt")
+    fs.close()
+
+
+def test_directory_fds_stay_bounded_below_the_open_file_limit(tmp_path):
+    import subprocess
+    import sys
+    from pathlib import Path
+
+    pytest.importorskip("resource")
+    for i in range(200):
+        (tmp_path / "a" / f"d{i}").mkdir(parents=True)
+        (tmp_path / "a" / f"d{i}" / "f.txt").write_text(str(i))
+    script = (
+        "import resource, sys\n"
+        "resource.setrlimit(resource.RLIMIT_NOFILE, (64, 64))\n"
+        "from filesystem import SafeFileSystem\n"
+        "fs = SafeFileSystem(sys.argv[1])\n"
+        "data = [fs.read_file(f'a/d{i}/f.txt') for i in range(200)]\n"
+        "assert data == [str(i).encode() for i in range(200)]\n"
+        "assert len(fs._dir_fds) == 8 and ('a',) in fs._dir_fds\n"
+    )
+
+    subprocess.run(
+        [sys.executable, "-c", script, str(tmp_path)],
+        cwd=Path(__file__).parent.parent,
+        check=True,
+    )
+
+
+def test_evicted_directory_fd_stays_open_while_in_use(tmp_path, monkeypatch):
+    import filesystem
+
+    monkeypatch.setattr(filesystem, "MAX_DIR_FDS", 4)
+    for i in range(10):
+        (tmp_path / f"d{i}").mkdir()
+        (tmp_path / f"d{i}" / "f.txt").write_text(str(i))
+    fs = SafeFileSystem(tmp_path)
+
+    with fs.atomic_writer("d0/f.txt") as writer:
+        writer.write(b"new")
+        for i in range(1, 10):
+            fs.read_file(f"d{i}/f.txt")
+        assert ("d0",) not in fs._dir_fds
+
+    assert (tmp_path / "d0" / "f.txt").read_text() == "new"
+    assert len(fs._dir_fds) == 4 and not fs._retired_fds and not fs._pins
+    fs.close()
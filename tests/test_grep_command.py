@@ -53,3 +53,183 @@ def test_grep_searches_content_not_filename(tmp_path):
     expected = "file.txt: This line has TODO"
 
     assert result == expected
+
+
+def test_grep_matches_bytes_across_line_endings(tmp_path):
+    fs = SafeFileSystem(tmp_path)
+
+    (tmp_path / "dos.txt").write_bytes(b"first TODO\r\nsecond\r\nTODO TODO third\r\n")
+
+    result = grep_command(fs, "TODO", "*.txt")
+
+    assert result == "dos.txt: first TODO\ndos.txt: TODO TODO third"
+
+
+def test_grep_decodes_only_matching_lines(tmp_path):
+    fs = SafeFileSystem(tmp_path)
+
+    (tmp_path / "mixed.txt").write_bytes(
+        "café TODO\n".encode("utf-8") + b"latin1 \xe9 line\n"
+    )
+
+    result = grep_command(fs, "TODO", "*.txt")
+
+    assert result == "mixed.txt: café TODO"
+
+
+def test_grep_binary_detection_samples_prefix(tmp_path):
+    fs = SafeFileSystem(tmp_path)
+
+    (tmp_path / "late_nul.txt").write_bytes(b"TODO here\n" * 1000 + b"\x00")
+
+    result = grep_command(fs, "TODO", "*.txt")
+
+    assert len(result.splitlines()) == 1000
+
+
+@pytest.mark.parametrize("executor", ["thread", "process"])
+def test_grep_parallel_keeps_sorted_file_order(tmp_path, executor):
+    fs = SafeFileSystem(tmp_path)
+
+    for i in range(40):
+        (tmp_path / f"file{i:02d}.txt").write_text(f"TODO {i}\nother\nTODO again {i}")
+    (tmp_path / "file05.bin").write_bytes(b"\x00TODO")
+
+    result = grep_command(fs, "TODO", "file*", jobs=4, executor=executor)
+
+    expected = "\n".join(
+        f"file{i:02d}.txt: {line}"
+        for i in range(40)
+        for line in (f"TODO {i}", f"TODO again {i}")
+    )
+    assert result == expected
+
+
+def test_grep_line_numbers(tmp_path):
+    fs = SafeFileSystem(tmp_path)
+
+    (tmp_path / "file.txt").write_text("one\nTODO two\nthree\n\nTODO five")
+
+    result = grep_command(fs, "TODO", "*.txt", line_numbers=True)
+
+    assert result == "file.txt:2: TODO two\nfile.txt:5: TODO five"
+
+
+@pytest.mark.parametrize("executor", ["thread", "process"])
+def test_grep_splits_large_file_into_ranges(tmp_path, executor):
+    fs = SafeFileSystem(tmp_path)
+
+    lines = [f"line {i} {'ERROR' if i % 7 == 0 else 'ok'}" for i in range(1, 2000)]
+    (tmp_path / "big.log").write_text("\n".join(lines))
+    (tmp_path / "small.log").write_text("ERROR in small file")
+
+    expected = grep_command(fs, "ERROR", "*.log", line_numbers=True)
+    result = grep_command(
+        fs,
+        "ERROR",
+        "*.log",
+        jobs=4,
+        executor=executor,
+        line_numbers=True,
+        split_size=1000,
+    )
+
+    assert result == expected
+    assert "big.log:7: line 7 ERROR" in result.splitlines()
+    assert result.splitlines()[-1] == "small.log:1: ERROR in small file"
+
+
+def test_grep_split_file_detects_binary(tmp_path):
+    fs = SafeFileSystem(tmp_path)
+
+    (tmp_path / "big.bin").write_bytes(b"\x00" + b"TODO\n" * 1000)
+
+    assert grep_command(fs, "TODO", "*.bin", jobs=2, split_size=100) == ""
+
+
+def test_grep_regex_mode(tmp_path):
+    fs = SafeFileSystem(tmp_path)
+
+    (tmp_path / "app.log").write_text("GET /a 200\nGET /b 503\nPOST /c 500\n")
+
+    result = grep_command(fs, r" 5\d\d$", "*.log", regex=True)
+
+    assert result == "app.log: GET /b 503\napp.log: POST /c 500"
+
+
+def test_grep_regex_does_not_match_across_lines(tmp_path):
+    fs = SafeFileSystem(tmp_path)
+
+    (tmp_path / "a.txt").write_text("xxx\nxxx\nfoo\nbar\n")
+
+    result = grep_command(fs, "[^x]", "a.txt", regex=True)
+
+    assert result == "a.txt: foo\na.txt: bar"
+
+
+def test_grep_regex_accepts_inline_flags(tmp_path):
+    fs = SafeFileSystem(tmp_path)
+
+    (tmp_path / "a.txt").write_text("FOO bar\nbaz\n")
+
+    assert grep_command(fs, "(?i)foo", "*.txt", regex=True) == "a.txt: FOO bar"
+
+
+def test_grep_streams_a_file_in_chunks(tmp_path, monkeypatch):
+    from commands import grep
+    from commands.grep import iter_grep
+
+    monkeypatch.setattr(grep, "STREAM_CHUNK_SIZE", 16)
+    lines = [f"line {i} {'TODO' if i % 3 == 0 else 'done'}" for i in range(1000)]
+    (tmp_path / "big.log").write_text("\n".join(lines))
+    fs = SafeFileSystem(tmp_path)
+    read = []
+    iter_chunks = fs.iter_chunks
+
+    def recording_chunks(path, *args):
+        for chunk in iter_chunks(path, *args):
+            read.append(len(chunk))
+            yield chunk
+
+    fs.iter_chunks = recording_chunks
+    results = iter_grep(fs, "TODO", "*.log", line_numbers=True)
+
+    assert next(results) == "big.log:1: line 0 TODO"
+    assert sum(read) < 100
+    assert (
+        list(results)
+        == [f"big.log:{i + 1}: {line}" for i, line in enumerate(lines) if i % 3 == 0][
+            1:
+        ]
+    )
+
+
+def test_grep_multiple_patterns(tmp_path):
+    fs = SafeFileSystem(tmp_path)
+
+    (tmp_path / "app.log").write_text("disk full\nall good\nconnection reset\n")
+    (tmp_path / "other.log").write_text("nothing to see")
+
+    result = grep_command(fs, ["reset", "disk full"], "*.log")
+
+    assert result == "app.log: disk full\napp.log: connection reset"
+
+
+def test_grep_binary_cache_skips_known_binary_files_unread(tmp_path, monkeypatch):
+    import matcher
+
+    monkeypatch.setattr(matcher, "RACY_WINDOW_NS", 0)
+    (tmp_path / "text.txt").write_text("TODO")
+    (tmp_path / "data.bin").write_bytes(b"TODO\x00")
+    fs = SafeFileSystem(tmp_path, binary_cache=matcher.BinaryCache())
+    assert grep_command(fs, "TODO", "*") == "text.txt: TODO"
+
+    reads = []
+    iter_chunks = fs.iter_chunks
+    fs.iter_chunks = lambda path, *args: reads.append(path) or iter_chunks(path, *args)
+
+    assert grep_command(fs, "TODO", "*") == "text.txt: TODO"
+    assert reads == ["text.txt"]
+
+    (tmp_path / "data.bin").write_text("TODO again")
+    assert grep_command(fs, "TODO", "*") == "data.bin: TODO again\ntext.txt: TODO"
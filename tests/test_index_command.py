@@ -0,0 +1,115 @@
+import os
+from filesystem import SafeFileSystem
+from commands.grep import grep_command
+from commands.index import index_command
+from trigram_index import TrigramIndex, decode_postings, encode_postings
+
+OLD_MTIME_NS = 1_600_000_000 * 10**9
+
+
+def write_old_file(path, content):
+    path.write_text(content)
+    os.utime(path, ns=(OLD_MTIME_NS, OLD_MTIME_NS))
+
+
+def make_tree(tmp_path):
+    (tmp_path / "src").mkdir()
+    write_old_file(tmp_path / "src" / "app.py", "def handler():\n    raise Timeout\n")
+    write_old_file(tmp_path / "src" / "util.py", "def helper():\n    return 1\n")
+    write_old_file(tmp_path / "README.md", "Handles Timeout errors\n")
+
+
+def test_index_command_reports_indexed_files(tmp_path):
+    fs = SafeFileSystem(tmp_path)
+    make_tree(tmp_path)
+
+    result = index_command(fs)
+
+    assert result.startswith("Indexed 3 file(s): 3 read")
+
+
+def test_index_narrows_grep_candidates(tmp_path):
+    fs = SafeFileSystem(tmp_path)
+    make_tree(tmp_path)
+    index_command(fs)
+
+    index = TrigramIndex.open(fs)
+    candidates = index.filter_files(
+        fs, ["README.md", "src/app.py", "src/util.py"], [b"Timeout"]
+    )
+    index.close()
+
+    assert candidates == ["README.md", "src/app.py"]
+    assert grep_command(fs, "Timeout", "**/*.py") == "src/app.py:     raise Timeout"
+
+
+def test_index_keeps_changed_files_as_candidates(tmp_path):
+    fs = SafeFileSystem(tmp_path)
+    make_tree(tmp_path)
+    index_command(fs)
+
+    (tmp_path / "src" / "util.py").write_text("raise Timeout\n")
+
+    assert grep_command(fs, "Timeout", "src/*.py") == (
+        "src/app.py:     raise Timeout\nsrc/util.py: raise Timeout"
+    )
+
+
+def test_index_update_only_reads_changed_files(tmp_path):
+    fs = SafeFileSystem(tmp_path)
+    make_tree(tmp_path)
+    index_command(fs)
+
+    write_old_file(tmp_path / "src" / "util.py", "def helper():\n    return Timeout\n")
+    os.utime(tmp_path / "src" / "util.py", ns=(OLD_MTIME_NS + 1, OLD_MTIME_NS + 1))
+    (tmp_path / "README.md").unlink()
+
+    result = index_command(fs)
+
+    assert result.startswith("Indexed 2 file(s): 1 read")
+    index = TrigramIndex.open(fs)
+    candidates = index.filter_files(fs, ["src/app.py", "src/util.py"], [b"Timeout"])
+    index.close()
+    assert candidates == ["src/app.py", "src/util.py"]
+
+
+def test_index_without_usable_literal_keeps_all_files(tmp_path):
+    fs = SafeFileSystem(tmp_path)
+    make_tree(tmp_path)
+    index_command(fs)
+
+    result = grep_command(fs, r"\d", "**/*", regex=True)
+
+    assert result == "src/util.py:     return 1"
+
+
+def test_postings_round_trip():
+    ids = [0, 3, 4, 200, 70000]
+
+    encoded = encode_postings(ids)
+
+    assert decode_postings(encoded, 0, len(ids)) == ids
+    assert len(encoded) < len(ids) * 4
+
+
+def test_candidates_decode_shortest_postings_first(tmp_path, monkeypatch):
+    import trigram_index
+
+    fs = SafeFileSystem(tmp_path)
+    make_tree(tmp_path)
+    index_command(fs)
+    decoded = []
+
+    def recording_decode(data, offset, count):
+        decoded.append(count)
+        return decode_postings(data, offset, count)
+
+    monkeypatch.setattr(trigram_index, "decode_postings", recording_decode)
+    index = TrigramIndex.open(fs)
+
+    assert index.candidates([b"def handler"]) == {index.files["src/app.py"][0]}
+    assert decoded == sorted(decoded) and decoded[0] == 1
+    decoded.clear()
+    assert index.candidates([b"Timeout zzz"]) == set()
+    assert decoded == []
+    index.close()
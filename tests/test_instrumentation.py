@@ -0,0 +1,62 @@
+import time
+import pytest
+import instrumentation
+from instrumentation import chrome_trace, count, phase, stats_json, timed_iter
+from filesystem import SafeFileSystem
+from commands.replace import replace_command
+
+
+@pytest.fixture
+def recorder():
+    recorder = instrumentation.enable(trace=True)
+    yield recorder
+    instrumentation.disable()
+
+
+def test_disabled_instrumentation_is_a_no_op():
+    items = [1, 2]
+
+    assert phase("read") is instrumentation.NO_PHASE
+    assert timed_iter("parse", items) is items
+    count("bytes_read", 10)
+
+
+def test_nested_phases_are_charged_their_own_time(recorder):
+    with phase("parse"):
+        time.sleep(0.02)
+        with phase("read"):
+            time.sleep(0.02)
+
+    parse_calls, parse_time = recorder.phases["parse"]
+    read_calls, read_time = recorder.phases["read"]
+    spans = {name: end - start for name, start, end, _ in recorder.events}
+    assert parse_calls == read_calls == 1
+    assert read_time == pytest.approx(spans["read"])
+    assert parse_time == pytest.approx(spans["parse"] - spans["read"])
+    assert parse_time >= 0.02
+
+
+def test_commands_record_phases_and_counters(tmp_path, recorder):
+    (tmp_path / "a.txt").write_text("old\n")
+    (tmp_path / "b.bin").write_bytes(b"\x00old")
+    fs = SafeFileSystem(tmp_path)
+
+    replace_command(fs, "old", "new", "*", dry_run=False)
+
+    assert {"enumerate", "validate", "open", "write"} <= set(recorder.phases)
+    assert recorder.counters["bytes_written"] == 4
+    assert recorder.counters["files_skipped_binary"] == 1
+    assert stats_json(recorder, 1.0)["counters"]["bytes_read"] > 0
+
+
+def test_chrome_trace_has_complete_events_and_counters(recorder):
+    list(timed_iter("parse", iter([1, 2])))
+    count("cache_hits", 3)
+
+    events = chrome_trace(recorder)["traceEvents"]
+
+    spans = [event for event in events if event["ph"] == "X"]
+    assert [event["name"] for event in spans] == ["parse"] * 3
+    assert all(event["dur"] >= 0 and event["tid"] == 0 for event in spans)
+    assert events[-1]["ph"] == "C"
+    assert events[-1]["args"] == {"cache_hits": 3}
@@ -50,3 +50,86 @@ def test_json_pretty_handles_nested_json(tmp_path):
     expected = json.dumps(expected_data, indent=2)
 
     assert result == expected
+
+
+def test_json_pretty_streams_in_small_chunks(tmp_path):
+    data = {"items": [{"id": i, "name": f"né{i}", "tags": []} for i in range(50)]}
+    (tmp_path / "data.json").write_text(json.dumps(data))
+    fs = SafeFileSystem(tmp_path)
+
+    original = fs.iter_chunks
+    fs.iter_chunks = lambda path: original(path, chunk_size=7)
+
+    assert json_pretty_command(fs, "data.json") == json.dumps(data, indent=2)
+
+
+def test_json_pretty_error_reports_line_and_column(tmp_path):
+    (tmp_path / "bad.json").write_text('{\n  "a": 1,\n  "b" 2\n}')
+    fs = SafeFileSystem(tmp_path)
+
+    with pytest.raises(InvalidJSONError) as excinfo:
+        json_pretty_command(fs, "bad.json")
+
+    assert str(excinfo.value) == (
+        "Invalid JSON: Expecting ':' delimiter at line 3, column 7"
+    )
+
+
+def test_json_pretty_lines_formats_each_record(tmp_path):
+    records = [{"id": i, "tags": ["a"] * (i % 3)} for i in range(20)]
+    (tmp_path / "events.ndjson").write_text(
+        "".join(json.dumps(r) + "\n" for r in records) + "\n"
+    )
+    fs = SafeFileSystem(tmp_path)
+
+    result = json_pretty_command(fs, "events.ndjson", lines=True, jobs=2)
+
+    assert result == "\n".join(json.dumps(r, indent=2) for r in records)
+
+
+def test_json_pretty_lines_reports_invalid_records(tmp_path, capsys):
+    (tmp_path / "events.ndjson").write_text('{"a": 1}\n{"b": \n[1, 2]\n')
+    fs = SafeFileSystem(tmp_path)
+
+    with pytest.raises(InvalidJSONError, match="1 of 3 record"):
+        json_pretty_command(fs, "events.ndjson", lines=True)
+
+    assert "events.ndjson:2: Invalid JSON: Expecting value" in capsys.readouterr().err
+
+
+def test_json_pretty_path_selects_subtrees(tmp_path):
+    data = {
+        "company": {
+            "departments": [{"id": i, "staff": ["a", "b"]} for i in range(5)],
+            "odd key": True,
+        }
+    }
+    (tmp_path / "data.json").write_text(json.dumps(data))
+    fs = SafeFileSystem(tmp_path)
+
+    assert json_pretty_command(
+        fs, "data.json", path=".company.departments[3]"
+    ) == json.dumps(data["company"]["departments"][3], indent=2)
+    assert json_pretty_command(fs, "data.json", path=".company.departments[*].id") == (
+        "0\n1\n2\n3\n4"
+    )
+    assert json_pretty_command(fs, "data.json", path='.company["odd key"]') == "true"
+    assert json_pretty_command(fs, "data.json", path=".company.missing") == ""
+
+
+def test_json_pretty_path_stops_reading_after_the_match(tmp_path):
+    # Everything after the selected node is invalid, so reading it would fail.
+    (tmp_path / "data.json").write_text('{"a": {"b": [1, 2]}, "c": oops')
+    fs = SafeFileSystem(tmp_path)
+
+    assert json_pretty_command(fs, "data.json", path=".a.b[1]") == "2"
+    with pytest.raises(InvalidJSONError):
+        json_pretty_command(fs, "data.json", path=".c")
+
+
+def test_json_pretty_path_rejects_bad_expressions(tmp_path):
+    (tmp_path / "data.json").write_text("{}")
+    fs = SafeFileSystem(tmp_path)
+
+    with pytest.raises(ValueError, match="Invalid path"):
+        json_pretty_command(fs, "data.json", path=".a[x]")
@@ -0,0 +1,81 @@
+import hashlib
+import pytest
+from filesystem import SafeFileSystem
+from commands.manifest import (
+    check_manifest_command,
+    merkle_root,
+    write_manifest_command,
+)
+from exceptions import ChecksumMismatchError
+
+
+def make_tree(tmp_path):
+    (tmp_path / "dist").mkdir()
+    (tmp_path / "dist" / "app.tar").write_bytes(b"application")
+    (tmp_path / "dist" / "lib.tar").write_bytes(b"library")
+    (tmp_path / "notes.txt").write_text("release notes")
+
+
+def test_write_manifest_records_digests_sizes_and_root(tmp_path):
+    fs = SafeFileSystem(tmp_path)
+    make_tree(tmp_path)
+
+    result = write_manifest_command(fs, "**/*.tar", "MANIFEST")
+
+    lines = (tmp_path / "MANIFEST").read_text().splitlines()
+    app_digest = hashlib.sha256(b"application").hexdigest()
+    assert lines[0] == "# safe-toolkit manifest v1 algorithm=sha256"
+    assert lines[1] == f"{app_digest}  11  dist/app.tar"
+    assert lines[-1].startswith("# root ")
+    assert result.startswith("Wrote 2 entries to MANIFEST")
+
+
+def test_check_manifest_passes_for_unchanged_tree(tmp_path):
+    fs = SafeFileSystem(tmp_path)
+    make_tree(tmp_path)
+    written = write_manifest_command(fs, "**/*", "MANIFEST")
+
+    result = check_manifest_command(fs, "MANIFEST", jobs=2)
+
+    assert result.splitlines() == ["3 file(s) OK", written.splitlines()[1]]
+
+
+def test_check_manifest_reports_changed_and_missing_files(tmp_path):
+    fs = SafeFileSystem(tmp_path)
+    make_tree(tmp_path)
+    write_manifest_command(fs, "**/*", "MANIFEST")
+
+    (tmp_path / "dist" / "app.tar").write_bytes(b"APPLICATION")
+    (tmp_path / "dist" / "lib.tar").write_bytes(b"a longer library")
+    (tmp_path / "notes.txt").unlink()
+
+    with pytest.raises(ChecksumMismatchError) as excinfo:
+        check_manifest_command(fs, "MANIFEST")
+
+    report = str(excinfo.value).splitlines()
+    assert set(report[:3]) == {
+        "FAILED: dist/app.tar",
+        "FAILED: dist/lib.tar (size 16 != 7)",
+        "MISSING: notes.txt",
+    }
+    assert report[3] == "3 of 3 file(s) did not match MANIFEST"
+
+
+def test_check_manifest_detects_edited_manifest(tmp_path):
+    fs = SafeFileSystem(tmp_path)
+    make_tree(tmp_path)
+    write_manifest_command(fs, "**/*.tar", "MANIFEST")
+
+    manifest = tmp_path / "MANIFEST"
+    lines = manifest.read_text().splitlines()
+    manifest.write_text("\n".join(line for line in lines if "lib.tar" not in line))
+
+    with pytest.raises(ChecksumMismatchError):
+        check_manifest_command(fs, "MANIFEST")
+
+
+def test_merkle_root_is_order_independent():
+    entries = [("b", "00" * 32), ("a", "11" * 32), ("c", "22" * 32)]
+
+    assert merkle_root("sha256", entries) == merkle_root("sha256", entries[::-1])
+    assert merkle_root("sha256", entries) != merkle_root("sha256", entries[:2])
@@ -0,0 +1,102 @@
+import pytest
+from matcher import Matcher, required_literal
+
+
+def matching_lines(matcher, data):
+    return [(number, line) for number, line in matcher.iter_lines(data)]
+
+
+def test_literal_matcher_finds_lines():
+    matcher = Matcher(["TODO"])
+
+    data = b"a TODO\nb\nTODO c\n"
+
+    assert matching_lines(matcher, data) == [(1, b"a TODO"), (3, b"TODO c")]
+
+
+def test_multiple_literals_use_one_pass():
+    matcher = Matcher(["timeout", "refused", "reset"])
+
+    data = b"ok\nconnection reset\nfine\nrequest timeout\nconnection refused\n"
+
+    assert [n for n, _ in matcher.iter_lines(data)] == [2, 4, 5]
+
+
+def test_regex_matcher_verifies_candidate_lines():
+    matcher = Matcher([r"took \d+ms"], regex=True)
+
+    data = b"took many ms\ntook 15ms\nnothing\n"
+
+    assert matcher.literals == [b"took "]
+    assert matching_lines(matcher, data) == [(2, b"took 15ms")]
+
+
+def test_regex_anchors_apply_per_line():
+    matcher = Matcher([r"^ERROR", r"failed$"], regex=True)
+
+    data = b"ERROR one\nnot ERROR\njob failed\nfailed job\n"
+
+    assert [n for n, _ in matcher.iter_lines(data)] == [1, 3]
+
+
+def test_regex_without_required_literal_scans_directly():
+    matcher = Matcher([r"\d{3}.\d{4}"], regex=True)
+
+    assert matcher.literals is None
+    assert matching_lines(matcher, b"call 555-1234\nno number\n") == [
+        (1, b"call 555-1234")
+    ]
+
+
+def test_regex_matching_a_newline_only_reports_matching_lines():
+    matcher = Matcher([r"[^x]", r"o\s+b"], regex=True)
+
+    assert matching_lines(matcher, b"xxx\nxxx\nfoo\nbar\nxo\nbx\n") == [
+        (3, b"foo"),
+        (4, b"bar"),
+        (5, b"xo"),
+        (6, b"bx"),
+    ]
+    assert matching_lines(Matcher([r"o\s+b"], regex=True), b"foo\nbar\n") == []
+
+
+def test_each_regex_keeps_its_own_flags_groups_and_backreferences():
+    data = b"FOO\nbb\naa\nxyx\nnone\n"
+
+    assert [n for n, _ in Matcher([r"(?i)foo"], regex=True).iter_lines(data)] == [1]
+    assert [
+        n for n, _ in Matcher([r"(a)\1", r"(b)\1"], regex=True).iter_lines(data)
+    ] == [2, 3]
+    assert [
+        n
+        for n, _ in Matcher([r"(?P<c>x)y(?P=c)", r"(?P<c>n)o"], regex=True).iter_lines(
+            data
+        )
+    ] == [4, 5]
+
+
+def test_many_literals_find_each_matching_line_once():
+    matcher = Matcher([f"word{i}" for i in range(50)] + ["word1", "rd4"])
+
+    data = b"word10 word1\nnothing\nxword49\nword\nrd4\n"
+
+    assert [n for n, _ in matcher.iter_lines(data)] == [1, 3, 5]
+
+
+def test_invalid_regex_raises_value_error():
+    with pytest.raises(ValueError):
+        Matcher(["(unclosed"], regex=True)
+
+
+@pytest.mark.parametrize(
+    "pattern, expected",
+    [
+        (rb"foo\d+barbaz", b"barbaz"),
+        (rb"(?:abc)+x", b"abc"),
+        (rb"error|warning", None),
+        (rb"(?i)error", None),
+        (rb"colou?r", b"colo"),
+    ],
+)
+def test_required_literal(pattern, expected):
+    assert required_literal(pattern) == expected
@@ -0,0 +1,37 @@
+import io
+from output import lines_output, write_output
+
+
+def test_write_output_streams_chunks_and_ends_with_newline():
+    stream = io.StringIO()
+
+    write_output(iter(["a", "", "b"]), stream)
+
+    assert stream.getvalue() == "ab\n"
+
+
+def test_write_output_keeps_existing_newline_and_skips_empty_output():
+    stream = io.StringIO()
+
+    write_output(lines_output(["one", "two"]), stream)
+    write_output("", stream)
+    write_output(iter([]), stream)
+
+    assert stream.getvalue() == "one\ntwo\n"
+
+
+def test_lines_output_is_lazy():
+    def lines():
+        yield "first"
+        raise AssertionError("read too far")
+
+    assert next(lines_output(lines())) == "first\n"
+
+
+def test_write_output_sends_bytes_to_the_binary_buffer():
+    stream = io.TextIOWrapper(io.BytesIO(), encoding="utf-8")
+
+    write_output(iter(["a", memoryview(b"b\xc3\xa9")]), stream)
+    stream.flush()
+
+    assert stream.buffer.getvalue() == "abé\n".encode("utf-8")
@@ -0,0 +1,37 @@
+import time
+from parallel import ordered_map, worker_count
+
+
+def slow_square(value):
+    time.sleep(0.001 * (10 - value))
+    return value * value
+
+
+def test_ordered_map_preserves_input_order():
+    result = list(ordered_map(slow_square, range(10), workers=4))
+
+    assert result == [value * value for value in range(10)]
+
+
+def test_ordered_map_runs_inline_with_one_worker():
+    assert list(ordered_map(slow_square, [3, 1], workers=1)) == [9, 1]
+
+
+def test_ordered_map_bounds_tasks_in_flight():
+    submitted = []
+
+    def items():
+        for value in range(100):
+            submitted.append(value)
+            yield value
+
+    results = ordered_map(slow_square, items(), workers=2, window=4)
+    next(results)
+
+    assert len(submitted) <= 5
+
+
+def test_worker_count_defaults_to_cpu_count():
+    assert worker_count(3) == 3
+    assert worker_count(0) >= 1
+    assert worker_count(None) == worker_count(0)
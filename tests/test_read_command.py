@@ -20,3 +20,53 @@ def test_read_command_rejects_binary_file(tmp_path):
 
     with pytest.raises(BinaryFileError):
         read_command(fs, "image.png")
+
+
+def write_lines(tmp_path, count):
+    path = tmp_path / "log.txt"
+    path.write_text("".join(f"line {i}\n" for i in range(count)))
+    return path
+
+
+def test_read_command_head_and_tail_cross_scan_blocks(tmp_path, monkeypatch):
+    monkeypatch.setattr("commands.read.LINE_SCAN_SIZE", 16)
+    write_lines(tmp_path, 100)
+    fs = SafeFileSystem(tmp_path)
+
+    assert read_command(fs, "log.txt", head=3) == "line 0\nline 1\nline 2\n"
+    assert read_command(fs, "log.txt", tail=2) == "line 98\nline 99\n"
+    assert read_command(fs, "log.txt", tail=500).startswith("line 0\n")
+    assert read_command(fs, "log.txt", head=0) == ""
+
+
+def test_read_command_tail_without_final_newline(tmp_path):
+    (tmp_path / "a.txt").write_text("a\nb\nc")
+    fs = SafeFileSystem(tmp_path)
+
+    assert read_command(fs, "a.txt", tail=2) == "b\nc"
+
+
+def test_read_command_byte_range(tmp_path):
+    (tmp_path / "a.txt").write_text("0123456789")
+    fs = SafeFileSystem(tmp_path)
+
+    assert read_command(fs, "a.txt", offset=3, length=4) == "3456"
+    assert read_command(fs, "a.txt", offset=8) == "89"
+    assert read_command(fs, "a.txt", offset=20) == ""
+
+
+def test_read_command_range_may_split_a_character(tmp_path):
+    (tmp_path / "a.txt").write_text("aé b")
+    fs = SafeFileSystem(tmp_path)
+
+    assert read_command(fs, "a.txt", offset=2) == "� b"
+    assert read_command(fs, "a.txt", length=2) == "a�"
+
+
+def test_read_command_rejects_invalid_bytes_after_text(tmp_path):
+    (tmp_path / "a.txt").write_bytes(b"text\n" * 20000 + b"\xff")
+    fs = SafeFileSystem(tmp_path)
+
+    with pytest.raises(BinaryFileError):
+        read_command(fs, "a.txt")
+    assert read_command(fs, "a.txt", head=1) == "text\n"
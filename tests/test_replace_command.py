@@ -1,5 +1,17 @@
+import pytest
+import shutil
 from filesystem import SafeFileSystem
-from commands.replace import replace_command
+import difflib
+from commands.replace import (
+    iter_hunks,
+    iter_preview,
+    replace_chunks,
+    replace_command,
+    rollback_command,
+    stream_contains,
+)
+from exceptions import TransactionError
+from rewriter import Rewriter
 
 
 def test_replace_command_dry_run_shows_preview(tmp_path):
@@ -43,3 +55,299 @@ def test_replace_command_no_matches(tmp_path):
     result = replace_command(fs, "nonexistent", "new", "*.py", dry_run=True)
 
     assert "No matches" in result or "0 files" in result
+
+
+def test_replace_chunks_handles_matches_across_boundaries():
+    chunks = [b"aaold_", b"te", b"xt bb old_text", b"old_tex", b"t"]
+    out = []
+
+    count = replace_chunks(chunks, b"old_text", b"NEW", out.append)
+
+    assert b"".join(out) == b"aaNEW bb NEWNEW"
+    assert count == 3
+
+
+def test_replace_chunks_matches_str_replace_semantics():
+    data = b"aaaa aaa aa"
+    out = []
+
+    chunks = [data[i : i + 3] for i in range(0, len(data), 3)]
+    replace_chunks(chunks, b"aa", b"b", out.append)
+
+    assert b"".join(out) == data.replace(b"aa", b"b")
+
+
+def test_stream_contains_chunks_shorter_than_search():
+    data = b"xxold_textyy"
+    chunks = [data[i : i + 2] for i in range(0, len(data), 2)]
+
+    assert stream_contains(chunks, b"old_text")
+    assert not stream_contains([b"ol", b"d_", b"tex", b"!"], b"old_text")
+
+
+def test_replace_apply_is_atomic_and_preserves_mode(tmp_path):
+    fs = SafeFileSystem(tmp_path)
+
+    script = tmp_path / "run.sh"
+    script.write_text("echo old_text\n")
+    script.chmod(0o755)
+
+    replace_command(fs, "old_text", "new_text", "*.sh", dry_run=False)
+
+    assert script.read_text() == "echo new_text\n"
+    assert script.stat().st_mode & 0o777 == 0o755
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["run.sh"]
+
+
+def test_replace_apply_leaves_unmatched_files_untouched(tmp_path):
+    fs = SafeFileSystem(tmp_path)
+
+    untouched = tmp_path / "other.txt"
+    untouched.write_text("nothing here")
+    inode = untouched.stat().st_ino
+
+    result = replace_command(fs, "old_text", "new_text", "*.txt", dry_run=False)
+
+    assert "No matches" in result
+    assert untouched.stat().st_ino == inode
+
+
+def test_replace_skips_binary_files(tmp_path):
+    fs = SafeFileSystem(tmp_path)
+
+    blob = tmp_path / "data.bin"
+    blob.write_bytes(b"\x00\x01old_text")
+
+    result = replace_command(fs, "old_text", "new_text", "*", dry_run=False)
+
+    assert "No matches" in result
+    assert blob.read_bytes() == b"\x00\x01old_text"
+
+
+def make_files(tmp_path, count=5):
+    for i in range(count):
+        (tmp_path / f"f{i}.txt").write_text(f"old_text {i}\n")
+
+
+def test_replace_transaction_applies_all_files(tmp_path):
+    fs = SafeFileSystem(tmp_path)
+    make_files(tmp_path)
+
+    result = replace_command(
+        fs, "old_text", "new_text", "*.txt", dry_run=False, transaction=True, jobs=3
+    )
+
+    assert "5 file(s) updated." in result
+    for i in range(5):
+        assert (tmp_path / f"f{i}.txt").read_text() == f"new_text {i}\n"
+
+
+def test_replace_rollback_restores_last_transaction(tmp_path):
+    fs = SafeFileSystem(tmp_path)
+    make_files(tmp_path)
+    replace_command(
+        fs, "old_text", "new_text", "*.txt", dry_run=False, transaction=True
+    )
+
+    result = rollback_command(fs)
+
+    assert result.endswith("5 file(s) restored.")
+    for i in range(5):
+        assert (tmp_path / f"f{i}.txt").read_text() == f"old_text {i}\n"
+    with pytest.raises(TransactionError):
+        rollback_command(fs)
+
+
+def test_replace_transaction_failure_leaves_tree_untouched(tmp_path, monkeypatch):
+    fs = SafeFileSystem(tmp_path)
+    make_files(tmp_path)
+    real_link = fs.link
+    calls = []
+
+    def failing_link(source, target):
+        calls.append(source)
+        if len(calls) == 3:
+            raise OSError("disk full")
+        real_link(source, target)
+
+    monkeypatch.setattr(fs, "link", failing_link)
+
+    with pytest.raises(OSError):
+        replace_command(
+            fs, "old_text", "new_text", "*.txt", dry_run=False, transaction=True
+        )
+
+    for i in range(5):
+        assert (tmp_path / f"f{i}.txt").read_text() == f"old_text {i}\n"
+    leftovers = sorted(p.name for p in tmp_path.iterdir() if p.is_file())
+    assert leftovers == [f"f{i}.txt" for i in range(5)]
+
+
+def test_replace_transaction_refuses_pending_journal(tmp_path):
+    fs = SafeFileSystem(tmp_path)
+    make_files(tmp_path, 1)
+    replace_command(fs, "old_text", "mid", "*.txt", dry_run=False, transaction=True)
+    journal = tmp_path / ".safe-toolkit" / "journal" / "journal.json"
+    journal.write_text(journal.read_text().replace("committed", "staged"))
+
+    with pytest.raises(TransactionError):
+        replace_command(fs, "mid", "new", "*.txt", dry_run=False, transaction=True)
+
+    assert (tmp_path / "f0.txt").read_text() == "mid 0\n"
+    assert rollback_command(fs).endswith("1 file(s) restored.")
+    assert (tmp_path / "f0.txt").read_text() == "old_text 0\n"
+
+
+def test_replace_transaction_stays_below_the_open_file_limit(tmp_path):
+    import subprocess
+    import sys
+    from pathlib import Path
+
+    pytest.importorskip("resource")
+    for i in range(200):
+        (tmp_path / f"d{i}").mkdir()
+        (tmp_path / f"d{i}" / "f.txt").write_text(f"old_text {i}\n")
+    script = (
+        "import resource, sys\n"
+        "resource.setrlimit(resource.RLIMIT_NOFILE, (64, 64))\n"
+        "from filesystem import SafeFileSystem\n"
+        "from commands.replace import replace_command\n"
+        "fs = SafeFileSystem(sys.argv[1])\n"
+        "out = replace_command(\n"
+        "    fs, 'old_text', 'new', '*/f.txt', dry_run=False, transaction=True\n"
+        ")\n"
+        "assert out.endswith('200 file(s) updated.'), out\n"
+    )
+
+    subprocess.run(
+        [sys.executable, "-c", script, str(tmp_path)],
+        cwd=Path(__file__).parent.parent,
+        check=True,
+    )
+
+    assert (tmp_path / "d199" / "f.txt").read_text() == "new 199\n"
+
+
+def test_iter_hunks_matches_difflib():
+    lines = [f"line {i}\n" for i in range(40)]
+    lines[2] = "old_text here\n"
+    lines[3] = "old_text old_text\n"
+    lines[9] = "more old_text\n"
+    lines[30] = "old_text\n"
+    text = "".join(lines)
+    new_text = text.replace("old_text", "new\ntext")
+
+    expected = difflib.unified_diff(
+        text.splitlines(keepends=True), new_text.splitlines(keepends=True)
+    )
+    hunks = list(iter_hunks(text, Rewriter([("old_text", "new\ntext")]).matches))
+
+    assert len(hunks) == 2
+    assert "".join(hunks) == "".join(list(expected)[2:])
+
+
+def test_iter_hunks_marks_missing_final_newline():
+    hunks = "".join(iter_hunks("a\nb old", Rewriter([("old", "new")]).matches))
+
+    assert hunks == (
+        "@@ -1,2 +1,2 @@\n a\n-b old\n\\ No newline at end of file\n"
+        "+b new\n\\ No newline at end of file\n"
+    )
+
+
+@pytest.mark.parametrize(
+    "text, pattern, replacement",
+    [
+        ("a\nc\nxa\nb\n", r"\s*c\n", ":"),
+        ("a\nc\nd\n", r"^c\n", ""),
+        ("a\nc\nd\n", r"c\n", "e\n"),
+        ("a\nc\nd\n", r"c\n", "-"),
+        ("a\nb\nc\nd\n", r"\n(?=.)", " "),
+    ],
+)
+def test_iter_hunks_joins_lines_after_matches_ending_in_newline(
+    text, pattern, replacement
+):
+    import re
+
+    new_text = re.sub(pattern, replacement, text, flags=re.MULTILINE)
+    expected = difflib.unified_diff(
+        text.splitlines(keepends=True), new_text.splitlines(keepends=True)
+    )
+    rewriter = Rewriter([(pattern, replacement)], regex=True)
+
+    hunks = "".join(iter_hunks(text, rewriter.matches))
+
+    assert hunks == "".join(list(expected)[2:])
+
+
+@pytest.mark.skipif(shutil.which("patch") is None, reason="needs patch")
+def test_preview_applies_cleanly_with_patch(tmp_path):
+    import subprocess
+
+    (tmp_path / "f.txt").write_text("a\nc\nxa\nb\n")
+    fs = SafeFileSystem(tmp_path)
+    diff = replace_command(fs, r"\s*c\n", ":", "f.txt", regex=True)
+    (tmp_path / "f.diff").write_text(diff.split("\n\nWould modify")[0] + "\n")
+
+    subprocess.run(
+        ["patch", "-p0", "-i", "f.diff"], cwd=tmp_path, check=True, capture_output=True
+    )
+
+    assert (tmp_path / "f.txt").read_text() == "a:xa\nb\n"
+
+
+def test_iter_preview_skips_files_without_match_before_decoding(tmp_path):
+    (tmp_path / "latin1.txt").write_bytes(b"caf\xe9\n")
+    (tmp_path / "match.txt").write_text("old_text\n")
+    fs = SafeFileSystem(tmp_path)
+
+    pieces = list(
+        iter_preview(
+            fs, ["latin1.txt", "match.txt"], Rewriter([("old_text", "new")]), "x"
+        )
+    )
+
+    assert pieces[0] == "--- match.txt\n+++ match.txt\n"
+    assert pieces[1] == "@@ -1 +1 @@\n-old_text\n+new\n"
+    assert pieces[-1].endswith("Would modify 1 file(s). Use --apply to make changes.")
+
+
+def test_replace_command_regex_with_backreferences(tmp_path):
+    (tmp_path / "a.txt").write_text("call(foo, bar)\ncall(x, y)\n")
+    fs = SafeFileSystem(tmp_path)
+
+    replace_command(
+        fs, r"call\((\w+), (\w+)\)", r"call(\2, \1)", "*.txt", dry_run=False, regex=True
+    )
+
+    assert (tmp_path / "a.txt").read_text() == "call(bar, foo)\ncall(y, x)\n"
+
+
+def test_replace_command_word_and_ignore_case(tmp_path):
+    (tmp_path / "a.txt").write_text("Cat cat concat CAT\n")
+    fs = SafeFileSystem(tmp_path)
+
+    result = replace_command(
+        fs, "cat", "dog", "*.txt", dry_run=True, word=True, ignore_case=True
+    )
+    assert "+dog dog concat dog" in result
+
+    replace_command(
+        fs, "cat", "dog", "*.txt", dry_run=False, word=True, ignore_case=True, jobs=2
+    )
+    assert (tmp_path / "a.txt").read_text() == "dog dog concat dog\n"
+
+
+def test_replace_command_rules_apply_in_one_pass(tmp_path):
+    (tmp_path / "a.txt").write_text("foo bar\n")
+    (tmp_path / "b.txt").write_text("nothing here\n")
+    fs = SafeFileSystem(tmp_path)
+
+    result = replace_command(
+        fs, None, None, "*.txt", dry_run=False, rules=[("foo", "bar"), ("bar", "foo")]
+    )
+
+    assert (tmp_path / "a.txt").read_text() == "bar foo\n"
+    assert "Modified: a.txt" in result
+    assert "b.txt" not in result
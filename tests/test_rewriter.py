@@ -0,0 +1,72 @@
+import pytest
+from rewriter import Rewriter, parse_rules
+
+
+def test_rewriter_prefers_leftmost_then_first_rule():
+    rewriter = Rewriter([("b", "1"), ("ab", "2"), ("a", "3")])
+
+    assert rewriter.sub("abab") == ("22", 2)
+
+
+def test_rewriter_regex_expands_templates():
+    rewriter = Rewriter([(r"(?P<user>\w+)@(\w+)", r"\2:\g<user>")], regex=True)
+
+    assert rewriter.sub("bob@host, amy@box")[0] == "host:bob, box:amy"
+
+
+def test_rewriter_empty_matches_follow_re_sub():
+    rewriter = Rewriter([("x*", "-")], regex=True)
+
+    assert rewriter.sub("abxd")[0] == "-a-b--d-"
+
+
+@pytest.mark.parametrize(
+    "pattern", ["a*?", "a*", "a|", "|a", "(?=a)|a", r"\b", "^|b*?", "x*", "a??b?"]
+)
+@pytest.mark.parametrize("text", ["", "aab", "abxd", "baac\nab", "bb\naab b"])
+def test_rewriter_regex_matches_re_sub(pattern, text):
+    import re
+
+    rewriter = Rewriter([(pattern, "<\\g<0>>")], regex=True)
+
+    assert rewriter.sub(text)[0] == re.sub(pattern, "<\\g<0>>", text, flags=re.M)
+
+
+@pytest.mark.parametrize("rules", [("a*?", "b"), ("x*", "a|b"), ("b*?", "^|a+")])
+@pytest.mark.parametrize("text", ["aab", "abba\nba", "xbxa"])
+def test_rewriter_rules_match_one_alternation(rules, text):
+    import re
+
+    rewriter = Rewriter([(rule, "<\\g<0>>") for rule in rules], regex=True)
+    alternation = "|".join(f"(?:{rule})" for rule in rules)
+
+    assert rewriter.sub(text)[0] == re.sub(alternation, "<\\g<0>>", text, flags=re.M)
+
+
+def test_rewriter_literal_replacement_is_not_a_template():
+    rewriter = Rewriter([("a", r"\1")], ignore_case=True)
+
+    assert rewriter.sub("A")[0] == r"\1"
+
+
+def test_rewriter_prefilter_uses_required_literals():
+    assert Rewriter([(r"foo\d+", "x")], regex=True).literals == [b"foo"]
+    assert Rewriter([(r"\d+", "x")], regex=True).literals is None
+    assert not Rewriter([("foo", "x"), ("bar", "y")]).may_match(b"baz")
+
+
+def test_rewriter_rejects_invalid_patterns():
+    with pytest.raises(ValueError):
+        Rewriter([("(", "x")], regex=True)
+    with pytest.raises(ValueError):
+        Rewriter([("a", r"\2")], regex=True)
+    with pytest.raises(ValueError):
+        Rewriter([("", "x")])
+
+
+def test_parse_rules():
+    text = "# renames\nold_api\tnew_api\n\nfoo\t\n"
+
+    assert parse_rules(text) == [("old_api", "new_api"), ("foo", "")]
+    with pytest.raises(ValueError):
+        parse_rules("no tab here\n")
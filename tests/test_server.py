@@ -0,0 +1,125 @@
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import pytest
+from pathlib import Path
+from client import connect, iter_remote
+from exceptions import ServeError, WrongRootError
+
+CLI = Path(__file__).parent.parent / "cli.py"
+SOCKET = ".safe-toolkit/serve.sock"
+
+pytestmark = pytest.mark.skipif(
+    not hasattr(socket, "AF_UNIX"), reason="needs Unix sockets"
+)
+
+
+@pytest.fixture
+def daemon(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    process = subprocess.Popen(
+        [sys.executable, str(CLI), "serve", "-j", "2"],
+        cwd=tmp_path,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    deadline = time.monotonic() + 10
+    while not os.path.exists(SOCKET):
+        assert process.poll() is None, process.stderr.read()
+        assert time.monotonic() < deadline, "daemon did not start"
+        time.sleep(0.01)
+    yield process
+    process.send_signal(signal.SIGTERM)
+    process.wait(timeout=10)
+    process.stderr.close()
+
+
+def run(*argv):
+    sock = connect(SOCKET)
+    assert sock is not None
+    return "".join(iter_remote(sock, list(argv)))
+
+
+def test_daemon_answers_commands_like_the_cli(tmp_path, daemon):
+    (tmp_path / "a.txt").write_text("one TODO\ntwo\n")
+
+    assert run("grep", "TODO", "*.txt") == "a.txt: one TODO\n"
+    assert run("read", "a.txt", "--head", "1") == "one TODO\n"
+    local = subprocess.run(
+        [sys.executable, str(CLI), "checksum", "a.txt"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert run("checksum", "a.txt") == local.stdout
+
+
+def test_daemon_sees_changes_between_requests(tmp_path, daemon):
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "a.txt").write_text("TODO old\n")
+    assert run("grep", "TODO", "**/*.txt") == "sub/a.txt: TODO old\n"
+
+    (tmp_path / "sub").rename(tmp_path / "moved")
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "b.txt").write_text("TODO new\n")
+
+    assert run("grep", "TODO", "sub/*.txt") == "sub/b.txt: TODO new\n"
+
+
+def test_daemon_reports_errors_and_keeps_serving(tmp_path, daemon):
+    with pytest.raises(ServeError, match="Not found: missing.txt"):
+        run("read", "missing.txt")
+    with pytest.raises(ServeError, match="to serve itself"):
+        run("grep", "TODO", "*", "--exclude", "x")
+    with pytest.raises(ServeError, match="cannot be run by the daemon"):
+        run("batch", "jobs.jsonl")
+
+    (tmp_path / "a.txt").write_text("ok\n")
+    assert run("read", "a.txt") == "ok\n"
+
+
+def test_daemon_streams_large_output_in_order(tmp_path, daemon):
+    lines = [f"line {i} TODO" for i in range(20000)]
+    (tmp_path / "big.txt").write_text("\n".join(lines) + "\n")
+
+    output = run("grep", "TODO", "big.txt")
+
+    assert output.splitlines() == [f"big.txt: {line}" for line in lines]
+
+
+def test_cli_runs_locally_when_no_daemon_listens(tmp_path):
+    (tmp_path / "a.txt").write_text("TODO\n")
+
+    result = subprocess.run(
+        [sys.executable, str(CLI), "--connect", "missing.sock", "grep", "TODO", "*"],
+        cwd=tmp_path,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    assert result.stdout == "a.txt: TODO\n"
+
+
+def test_cli_runs_locally_when_the_daemon_serves_another_root(
+    tmp_path, daemon, monkeypatch
+):
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "a.txt").write_text("TODO\n")
+
+    result = subprocess.run(
+        [sys.executable, str(CLI), "--connect", f"../{SOCKET}", "grep", "TODO", "*"],
+        cwd=tmp_path / "sub",
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert result.stdout == "a.txt: TODO\n"
+
+    sock = connect(SOCKET)
+    monkeypatch.chdir(tmp_path / "sub")
+    with pytest.raises(WrongRootError, match="This daemon serves"):
+        "".join(iter_remote(sock, ["grep", "TODO", "*"]))
@@ -0,0 +1,79 @@
+import os
+import pytest
+import walker
+from walker import IgnoreRules, ScanCache, translate_ignore_glob, walk
+
+
+@pytest.mark.parametrize(
+    "pattern, path, expected",
+    [
+        ("*.log", "app.log", True),
+        ("*.log", "logs/app.log", False),
+        ("**/*.log", "logs/app.log", True),
+        ("logs/**", "logs/a/b.txt", True),
+        ("a/**/z", "a/z", True),
+        ("a/**/z", "a/b/c/z", True),
+        ("file[0-9]", "file7", True),
+    ],
+)
+def test_translate_ignore_glob(pattern, path, expected):
+    assert bool(translate_ignore_glob(pattern).fullmatch(path)) is expected
+
+
+def test_unanchored_rule_matches_at_any_depth():
+    rules = IgnoreRules().extend("", ["*.pyc"])
+
+    assert rules.ignored("pkg/sub/mod.pyc", is_dir=False)
+    assert not rules.ignored("pkg/sub/mod.py", is_dir=False)
+
+
+def test_anchored_rule_is_relative_to_its_directory():
+    rules = IgnoreRules().extend("src", ["/gen.txt"])
+
+    assert rules.ignored("src/gen.txt", is_dir=False)
+    assert not rules.ignored("gen.txt", is_dir=False)
+    assert not rules.ignored("src/deep/gen.txt", is_dir=False)
+
+
+def test_directory_only_rule_and_negation():
+    rules = IgnoreRules().extend("", ["out/", "*.tmp", "!keep.tmp"])
+
+    assert rules.ignored("out", is_dir=True)
+    assert not rules.ignored("out", is_dir=False)
+    assert rules.ignored("x.tmp", is_dir=False)
+    assert not rules.ignored("keep.tmp", is_dir=False)
+
+
+def test_scan_cache_reuses_listings_until_the_directory_changes(tmp_path, monkeypatch):
+    monkeypatch.setattr(walker, "RACY_WINDOW_NS", 0)
+    (tmp_path / "a.txt").write_text("a")
+    cache = ScanCache()
+    scans = []
+    real_scandir = os.scandir
+    monkeypatch.setattr(
+        walker.os, "scandir", lambda path: scans.append(path) or real_scandir(path)
+    )
+
+    assert [p for p, _ in walk(str(tmp_path), "*.txt", cache=cache)] == ["a.txt"]
+    assert [p for p, _ in walk(str(tmp_path), "*.txt", cache=cache)] == ["a.txt"]
+    assert len(scans) == 1
+
+    (tmp_path / "b.txt").write_text("b")
+    mtime = tmp_path.stat().st_mtime_ns + 1_000_000
+    os.utime(tmp_path, ns=(mtime, mtime))
+    paths = sorted(p for p, _ in walk(str(tmp_path), "*.txt", cache=cache))
+
+    assert paths == ["a.txt", "b.txt"]
+    assert len(scans) == 2
+
+
+def test_scan_cache_entries_stat_the_file_again(tmp_path, monkeypatch):
+    monkeypatch.setattr(walker, "RACY_WINDOW_NS", 0)
+    (tmp_path / "a.txt").write_text("a")
+    cache = ScanCache()
+    list(walk(str(tmp_path), "*.txt", cache=cache))
+
+    (tmp_path / "a.txt").write_text("longer")
+    [(_, entry)] = walk(str(tmp_path), "*.txt", cache=cache)
+
+    assert entry.stat(follow_symlinks=False).st_size == 6
@@ -0,0 +1,257 @@
+import json
+import mmap
+import os
+import struct
+import time
+from bisect import bisect_left
+from filesystem import SafeFileSystem
+from instrumentation import count, phase
+from matcher import is_binary
+from walker import RACY_WINDOW_NS
+
+INDEX_DIR = "index"
+FILES_NAME = "files.json"
+MAGIC = b"STX1"
+HEADER = struct.Struct("<4sI")
+ENTRY = struct.Struct("<IQI")
+# Larger files are never indexed and are always searched.
+MAX_INDEXED_SIZE = 64 * 1024 * 1024
+
+
+class TrigramIndex:
+    """Read-only view of a trigram index written by build_index().
+
+    files.json maps each path to its id and the stat fields it was indexed
+    with, and names the postings file. That file holds a sorted table of
+    (trigram, offset, count) entries followed by delta-encoded varint
+    posting lists, and is memory-mapped so a query only touches the pages
+    it needs.
+    """
+
+    def __init__(self, files: dict[str, list], postings_path: str):
+        self.files = files
+        with open(postings_path, "rb") as f:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self._count = HEADER.unpack_from(self._data, 0)
+        if magic != MAGIC:
+            raise ValueError(f"Not a trigram index: {postings_path}")
+        self._table_end = HEADER.size + self._count * ENTRY.size
+
+    @classmethod
+    def open(cls, fs: SafeFileSystem) -> "TrigramIndex | None":
+        index_dir = fs.state_path(INDEX_DIR, create=False)
+        try:
+            with open(index_dir / FILES_NAME, encoding="utf-8") as f:
+                manifest = json.load(f)
+            return cls(manifest["files"], str(index_dir / manifest["postings"]))
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def close(self) -> None:
+        self._data.close()
+
+    def keys(self) -> list[int]:
+        return [self._key_at(i) for i in range(self._count)]
+
+    def _key_at(self, i: int) -> int:
+        return ENTRY.unpack_from(self._data, HEADER.size + i * ENTRY.size)[0]
+
+    def postings(self, key: int) -> list[int]:
+        entry = self._entry(key)
+        if entry is None:
+            return []
+        return self._decode(entry)
+
+    def _entry(self, key: int) -> tuple[int, int] | None:
+        """Return the (offset, count) table entry for a trigram, if any."""
+        i = bisect_left(range(self._count), key, key=self._key_at)
+        if i == self._count:
+            return None
+
+        found, offset, count = ENTRY.unpack_from(
+            self._data, HEADER.size + i * ENTRY.size
+        )
+        return (offset, count) if found == key else None
+
+    def _decode(self, entry: tuple[int, int]) -> list[int]:
+        return decode_postings(self._data, self._table_end + entry[0], entry[1])
+
+    def candidates(self, literals: list[bytes] | None) -> set[int] | None:
+        """Return ids of indexed files that may contain any of the literals.
+
+        None means the index cannot narrow the search (no literal, or one
+        shorter than a trigram).
+        """
+        if not literals:
+            return None
+
+        result = set()
+        for literal in literals:
+            keys = {trigram_key(*gram) for gram in line_trigrams(literal)}
+            if not keys:
+                return None
+
+            entries = [self._entry(key) for key in keys]
+            if None in entries:
+                # Some trigram occurs in no indexed file.
+                continue
+
+            # Shortest lists first, by the counts stored in the table, so
+            # the intersection shrinks fast and longer lists may never be
+            # decoded at all.
+            ids = None
+            for entry in sorted(entries, key=lambda e: e[1]):
+                postings = self._decode(entry)
+                ids = set(postings) if ids is None else ids.intersection(postings)
+                if not ids:
+                    break
+            result |= ids
+        return result
+
+    def filter_files(
+        self, fs: SafeFileSystem, files: list[str], literals: list[bytes] | None
+    ) -> list[str]:
+        """Drop files the index proves cannot match; keep anything stale."""
+        candidates = self.candidates(literals)
+        if candidates is None:
+            return files
+
+        kept = []
+        for file in files:
+            entry = self.files.get(file)
+            if entry is None or not entry[5] or entry[0] in candidates:
+                kept.append(file)
+            elif stat_fields(fs.stat(file)) != entry[1:5]:
+                kept.append(file)
+        return kept
+
+
+def trigram_key(a: int, b: int, c: int) -> int:
+    return (a << 16) | (b << 8) | c
+
+
+def line_trigrams(data: bytes) -> set[tuple[int, int, int]]:
+    """Collect the trigrams within lines; grep never matches across newlines."""
+    grams = set()
+    for line in set(data.split(b"\n")):
+        if len(line) >= 3:
+            grams.update(zip(line, line[1:], line[2:]))
+    return grams
+
+
+def stat_fields(stat: os.stat_result) -> list[int]:
+    return [stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns]
+
+
+def encode_postings(ids: list[int]) -> bytes:
+    """Varint-encode the gaps between sorted ids."""
+    out = bytearray()
+    previous = 0
+    for value in ids:
+        delta = value - previous
+        previous = value
+        while delta >= 0x80:
+            out.append((delta & 0x7F) | 0x80)
+            delta >>= 7
+        out.append(delta)
+    return bytes(out)
+
+
+def decode_postings(data, offset: int, count: int) -> list[int]:
+    ids = []
+    value = 0
+    for _ in range(count):
+        delta = 0
+        shift = 0
+        while True:
+            byte = data[offset]
+            offset += 1
+            delta |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                break
+            shift += 7
+        value += delta
+        ids.append(value)
+    return ids
+
+
+def build_index(fs: SafeFileSystem, file_pattern: str = "**/*") -> dict[str, int]:
+    """Create or incrementally update the index for files matching the glob.
+
+    Files whose (device, inode, size, mtime_ns) are unchanged keep their
+    trigrams from the previous index; only new or changed files are read.
+    """
+    previous = TrigramIndex.open(fs)
+    entries_by_path = dict(fs.walk_files(file_pattern))
+    files = sorted(entries_by_path)
+    now = time.time_ns()
+
+    old_to_new = {}
+    entries = {}
+    postings: dict[int, list[int]] = {}
+    reindex = []
+
+    for new_id, file in enumerate(files):
+        fields = stat_fields(entries_by_path[file].stat(follow_symlinks=False))
+        old = previous.files.get(file) if previous else None
+        if old is not None and old[5] and old[1:5] == fields:
+            old_to_new[old[0]] = new_id
+            entries[file] = [new_id, *fields, True]
+        else:
+            reindex.append((new_id, file, fields))
+
+    if previous is not None:
+        for key in previous.keys():
+            ids = [old_to_new[i] for i in previous.postings(key) if i in old_to_new]
+            if ids:
+                postings[key] = ids
+        previous.close()
+
+    for new_id, file, fields in reindex:
+        indexed = fields[2] <= MAX_INDEXED_SIZE and now - fields[3] >= RACY_WINDOW_NS
+        if indexed:
+            data = fs.read_file(file)
+            if is_binary(data):
+                count("files_skipped_binary")
+            else:
+                with phase("index"):
+                    for gram in line_trigrams(data):
+                        postings.setdefault(trigram_key(*gram), []).append(new_id)
+        entries[file] = [new_id, *fields, indexed]
+
+    write_index(fs, entries, postings)
+    return {
+        "files": len(files),
+        "updated": len(reindex),
+        "trigrams": len(postings),
+    }
+
+
+def write_index(
+    fs: SafeFileSystem, entries: dict[str, list], postings: dict[int, list[int]]
+) -> None:
+    index_dir = fs.state_path(INDEX_DIR)
+    index_dir.mkdir(exist_ok=True)
+
+    table = bytearray(HEADER.pack(MAGIC, len(postings)))
+    blob = bytearray()
+    for key in sorted(postings):
+        ids = sorted(postings[key])
+        table += ENTRY.pack(key, len(blob), len(ids))
+        blob += encode_postings(ids)
+
+    # The postings file gets a fresh name and files.json is swapped in last,
+    # so readers always see a files table and postings from the same build.
+    postings_name = f"trigrams-{time.time_ns()}.bin"
+    (index_dir / postings_name).write_bytes(bytes(table + blob))
+    files_tmp = index_dir / f"{FILES_NAME}.tmp"
+    files_tmp.write_text(
+        json.dumps({"version": 1, "postings": postings_name, "files": entries}),
+        "utf-8",
+    )
+    os.replace(files_tmp, index_dir / FILES_NAME)
+
+    for stale in index_dir.glob("trigrams-*.bin"):
+        if stale.name != postings_name:
+            stale.unlink()
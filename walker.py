@@ -0,0 +1,288 @@
+import fnmatch
+import os
+import re
+import stat as stat_module
+import threading
+import time
+from typing import Iterator
+
+IGNORE_FILE = ".gitignore"
+VCS_DIR = ".git"
+GLOB_MAGIC = re.compile(r"[*?\[]")
+# Anything modified this recently may change again within the same timestamp
+# tick without its mtime changing (the "racy git" problem), so directory
+# listings, binary checks, digests and index entries are not cached for it.
+RACY_WINDOW_NS = 2_000_000_000
+
+
+class IgnoreRules:
+    """A stack of .gitignore-style rules, each anchored at a directory.
+
+    Later rules override earlier ones, so a "!pattern" re-includes paths a
+    previous rule excluded. Paths are relative to the workspace root and
+    use "/" separators.
+    """
+
+    def __init__(self, rules: list[tuple[str, re.Pattern, bool, bool]] = None):
+        self.rules = rules or []
+
+    def extend(self, base: str, lines: list[str]) -> "IgnoreRules":
+        rules = list(self.rules)
+        for line in lines:
+            line = line.rstrip("\n").rstrip("\r")
+            if not line.strip() or line.startswith("#"):
+                continue
+
+            negate = line.startswith("!")
+            if negate:
+                line = line[1:]
+            dir_only = line.endswith("/")
+            line = line.strip("/") if dir_only else line
+            anchored = "/" in line
+            line = line.lstrip("/")
+
+            regex = translate_ignore_glob(line if anchored else f"**/{line}")
+            rules.append((base, regex, negate, dir_only))
+        return IgnoreRules(rules)
+
+    def ignored(self, rel_path: str, is_dir: bool) -> bool:
+        result = False
+        for base, regex, negate, dir_only in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if base:
+                if not rel_path.startswith(base + "/"):
+                    continue
+                sub_path = rel_path[len(base) + 1 :]
+            else:
+                sub_path = rel_path
+            if regex.fullmatch(sub_path):
+                result = not negate
+        return result
+
+
+def translate_ignore_glob(pattern: str) -> re.Pattern:
+    """Translate a gitignore glob, where "**" may span directories."""
+    out = []
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+        elif pattern[i] == "*":
+            out.append("[^/]*")
+            i += 1
+        elif pattern[i] == "?":
+            out.append("[^/]")
+            i += 1
+        elif pattern[i] == "[" and "]" in pattern[i + 1 :]:
+            end = pattern.index("]", i + 1)
+            out.append(fnmatch.translate(pattern[i : end + 1])[4:-3])
+            i = end + 1
+        else:
+            out.append(re.escape(pattern[i]))
+            i += 1
+    return re.compile("".join(out))
+
+
+class ScannedEntry:
+    """The parts of os.DirEntry the walker and its callers use.
+
+    The type comes from the directory listing; stat() always asks the
+    filesystem again, so a cached listing never serves stale sizes.
+    """
+
+    __slots__ = ("name", "path", "_is_dir", "_is_file", "_is_symlink")
+
+    def __init__(self, entry: os.DirEntry):
+        self.name = entry.name
+        self.path = entry.path
+        self._is_symlink = entry.is_symlink()
+        self._is_dir = entry.is_dir(follow_symlinks=False)
+        self._is_file = entry.is_file(follow_symlinks=False)
+
+    def is_symlink(self) -> bool:
+        return self._is_symlink
+
+    def is_dir(self, follow_symlinks: bool = True) -> bool:
+        return self._is_dir
+
+    def is_file(self, follow_symlinks: bool = True) -> bool:
+        return self._is_file
+
+    def stat(self, follow_symlinks: bool = True) -> os.stat_result:
+        return os.stat(self.path, follow_symlinks=False)
+
+
+class ScanCache:
+    """Directory listings shared between walks, e.g. across a batch of jobs.
+
+    A listing is reused while the directory's inode, mtime and ctime are
+    unchanged, which costs one stat per directory instead of a scandir.
+    Symlinks are never followed, so the cached types are exactly what
+    scandir would report.
+    """
+
+    def __init__(self):
+        self._listings: dict[str, tuple[tuple, list[ScannedEntry]]] = {}
+        self._lock = threading.Lock()
+
+    def scandir(self, path: str) -> list[ScannedEntry]:
+        stat = os.stat(path, follow_symlinks=False)
+        if not stat_module.S_ISDIR(stat.st_mode):
+            raise NotADirectoryError(path)
+        key = (stat.st_dev, stat.st_ino, stat.st_mtime_ns, stat.st_ctime_ns)
+        cached = self._listings.get(path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        with os.scandir(path) as it:
+            entries = [ScannedEntry(entry) for entry in it]
+        if time.time_ns() - max(stat.st_mtime_ns, stat.st_ctime_ns) >= RACY_WINDOW_NS:
+            with self._lock:
+                self._listings[path] = (key, entries)
+        return entries
+
+
+def compile_segment(segment: str):
+    if segment == "**":
+        return "**"
+    if not GLOB_MAGIC.search(segment):
+        return segment
+    return re.compile(fnmatch.translate(segment))
+
+
+def segment_matches(segment, name: str) -> bool:
+    if isinstance(segment, str):
+        return segment == name
+    return segment.match(name) is not None
+
+
+def walk(
+    root: str,
+    pattern: str,
+    rules: IgnoreRules | None = None,
+    use_ignore_files: bool = False,
+    pruned: frozenset[str] = frozenset(),
+    cache: ScanCache | None = None,
+) -> Iterator[tuple[str, os.DirEntry]]:
+    """Lazily yield (relative path, DirEntry) for files matching a glob.
+
+    The tree is walked with os.scandir from root. Symlinks are never
+    followed or yielded, so every result stays inside root. Directories
+    are only entered when some remaining glob segment could match inside
+    them and they are not excluded by rules. With use_ignore_files,
+    .gitignore files are read and .git directories skipped, except for
+    entries the glob names literally. With a cache,
+    unchanged directories are not scanned again and ScannedEntry objects
+    are yielded instead of DirEntry.
+    """
+    if pattern.startswith("/"):
+        return
+    segments = [s for s in pattern.split("/") if s not in ("", ".")]
+    if not segments or ".." in segments:
+        return
+
+    compiled = [compile_segment(s) for s in segments]
+    rules = rules or IgnoreRules()
+    yield from _walk_dir(
+        root,
+        "",
+        _closure(compiled, {0}),
+        compiled,
+        rules,
+        IgnoreRules() if use_ignore_files else None,
+        pruned,
+        cache,
+    )
+
+
+def _closure(segments: list, states: set[int]) -> set[int]:
+    """Add the states reachable by letting each "**" match zero directories."""
+    pending = list(states)
+    while pending:
+        state = pending.pop()
+        if state >= len(segments) or segments[state] != "**":
+            continue
+        if state + 1 not in states:
+            states.add(state + 1)
+            pending.append(state + 1)
+    return states
+
+
+def _walk_dir(
+    path: str,
+    rel_dir: str,
+    states: set[int],
+    segments: list,
+    rules: IgnoreRules,
+    ignores: IgnoreRules | None,
+    pruned: frozenset[str],
+    cache: ScanCache | None,
+) -> Iterator[tuple[str, os.DirEntry]]:
+    try:
+        if cache is not None:
+            entries = cache.scandir(path)
+        else:
+            with os.scandir(path) as it:
+                entries = list(it)
+    except (NotADirectoryError, FileNotFoundError, PermissionError):
+        return
+
+    if ignores is not None:
+        for entry in entries:
+            if entry.name == IGNORE_FILE and entry.is_file(follow_symlinks=False):
+                with open(entry.path, encoding="utf-8", errors="replace") as f:
+                    ignores = ignores.extend(rel_dir, f.readlines())
+                break
+
+    last = len(segments) - 1
+    for entry in entries:
+        if entry.is_symlink():
+            continue
+
+        rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+        is_dir = entry.is_dir(follow_symlinks=False)
+        if is_dir and entry.name in pruned:
+            continue
+        if rules.rules and rules.ignored(rel_path, is_dir):
+            continue
+
+        child_states = set()
+        matched = literal = False
+        for state in states:
+            if state > last:
+                continue
+            segment = segments[state]
+            if segment == "**":
+                if is_dir:
+                    child_states.add(state)
+            elif segment_matches(segment, entry.name):
+                literal = literal or isinstance(segment, str)
+                if state == last:
+                    matched = True
+                elif is_dir:
+                    child_states.add(state + 1)
+
+        if ignores is not None and not literal:
+            if is_dir and entry.name == VCS_DIR:
+                continue
+            if ignores.rules and ignores.ignored(rel_path, is_dir):
+                continue
+
+        if matched and entry.is_file(follow_symlinks=False):
+            yield rel_path, entry
+        if is_dir and child_states:
+            yield from _walk_dir(
+                entry.path,
+                rel_path,
+                _closure(segments, child_states),
+                segments,
+                rules,
+                ignores,
+                pruned,
+                cache,
+            )